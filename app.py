@@ -2,8 +2,11 @@ import streamlit as st
 
 from src.auth import require_login
 from src.db import init_db
+from src.instrument import begin_rerun
+from src.startup import startup_report
 
 st.set_page_config(page_title="Bluebeam Review Consolidator", layout="wide")
+begin_rerun("Home")
 
 init_db()
 require_login()
@@ -17,3 +20,7 @@ st.write(
 st.info(
     "Tip: Keep this app private in Streamlit Cloud **and** set an APP_PASSWORD in Streamlit secrets."
 )
+
+
+with st.expander("Startup timings (this server process)"):
+    st.dataframe(startup_report(), use_container_width=True, hide_index=True)
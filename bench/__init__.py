@@ -0,0 +1,12 @@
+"""
+Synthetic-data benchmarks for the import → dashboard → triage → package pipeline.
+
+Runs the same src/ functions the pages call, without a Streamlit server:
+
+    python -m bench --rows 20000
+    python -m bench --rows 20000 --save bench/baselines/local.json
+    python -m bench --rows 20000 --compare bench/baselines/local.json
+
+See bench/runner.py for the scenarios and report format, and bench/load.py
+(python -m bench.load) for the concurrent multi-session load test.
+"""
@@ -0,0 +1,74 @@
+# bench/__main__.py
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+import bench
+from bench.runner import BenchConfig, compare, load_results, run_benchmarks, save_results
+from bench.synth import DATE_FORMATS
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m bench", description=bench.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=BenchConfig.rows, help="rows per synthetic CSV")
+    p.add_argument("--sheets", type=int, default=BenchConfig.sheets)
+    p.add_argument("--authors", type=int, default=BenchConfig.authors)
+    p.add_argument("--date-format", choices=sorted(DATE_FORMATS), default=BenchConfig.date_format)
+    p.add_argument("--duplicate-rate", type=float, default=BenchConfig.duplicate_rate)
+    p.add_argument("--comment-words", type=int, default=BenchConfig.comment_words)
+    p.add_argument("--imports", type=int, default=BenchConfig.imports, help="files to import (timed runs)")
+    p.add_argument("--repeat", type=int, default=BenchConfig.repeat, help="timed runs per query scenario")
+    p.add_argument("--triage-rows", type=int, default=BenchConfig.triage_rows)
+    p.add_argument("--llm-latency-ms", type=float, default=BenchConfig.llm_latency_ms)
+    p.add_argument("--database-url", default="", help="default: a fresh temporary SQLite file")
+    p.add_argument("--save", metavar="PATH", help="write results JSON (e.g. a new baseline)")
+    p.add_argument("--compare", metavar="PATH", help="baseline JSON to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    cfg = BenchConfig(
+        rows=args.rows,
+        sheets=args.sheets,
+        authors=args.authors,
+        date_format=args.date_format,
+        duplicate_rate=args.duplicate_rate,
+        comment_words=args.comment_words,
+        imports=args.imports,
+        repeat=args.repeat,
+        triage_rows=args.triage_rows,
+        llm_latency_ms=args.llm_latency_ms,
+        database_url=args.database_url,
+    )
+    results = run_benchmarks(cfg)
+
+    print(f"{'scenario':<24} {'runs':>5} {'p50 ms':>10} {'p95 ms':>10} {'items/s':>12} {'peak KB':>10}")
+    for name, r in results["scenarios"].items():
+        if "skipped" in r:
+            print(f"{name:<24} skipped: {r['skipped']}")
+            continue
+        print(
+            f"{name:<24} {r['runs']:>5} {r['p50_ms']:>10.1f} {r['p95_ms']:>10.1f} "
+            f"{r['items_per_s']:>12.1f} {r['peak_mem_kb']:>10.0f}"
+        )
+
+    if args.save:
+        save_results(results, args.save)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        rows = compare(results, load_results(args.compare), tolerance=args.tolerance)
+        regressions = [r for r in rows if r["regression"]]
+        print(f"\nCompared with {args.compare}:")
+        for r in rows:
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"  {r['scenario']:<24} {r['metric']:<12} x{r['ratio']:<6}{flag}")
+        if regressions:
+            print(json.dumps(regressions, indent=2), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# bench/fake_llm.py
+"""
+Minimal local stand-in for the OpenAI Chat Completions endpoint.
+Returns a fixed triage JSON after a configurable delay, so triage benchmarks
+measure our overhead (client, caching, DB writes) rather than the network.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TRIAGE = {
+    "tag": "COORD",
+    "risk": "MED",
+    "required_response": "Confirm the coordinated resolution and revise the drawings.",
+    "owner": "Consultant",
+    "status": "Open",
+}
+
+
+def _handler(latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if latency_s:
+                time.sleep(latency_s)
+            payload = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "bench"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps(_TRIAGE)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 180, "completion_tokens": 40, "total_tokens": 220},
+            }
+            raw = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+    return Handler
+
+
+@contextmanager
+def running_fake_llm(latency_ms: float = 0.0):
+    """Serve on an ephemeral localhost port; yields the base_url for the OpenAI client."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(latency_ms / 1000.0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
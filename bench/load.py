@@ -0,0 +1,432 @@
+# bench/load.py
+"""
+Concurrency load test for the data layer: N simulated users hitting one database at once.
+
+Each session loops for `duration` seconds over a weighted mix of what people do during
+review week — dashboard loads, text searches, bulk updates and imports — through the
+same src/ functions the pages call, with exponential think time between actions.
+Sessions run as threads in one process (like one Streamlit server) or as separate
+processes (like several servers or the API next to the app).
+
+Every engine profile runs in a fresh process against its own freshly seeded database
+(a temporary SQLite file unless --database-url is given), so caches and persistent
+settings such as journal_mode do not leak between profiles. Per profile and action the
+report has throughput, p50/p95/p99 latency, error rate by kind ("locked",
+"pool_timeout", ...) and lock wait: time spent in the statements that take the write
+lock, i.e. the first write of each transaction (or an explicit BEGIN IMMEDIATE) and its
+COMMIT. Uncontended that is just the write itself; under contention it is mostly
+waiting.
+
+    python -m bench.load --sessions 8 --duration 30
+    python -m bench.load --sessions 16 --mode process --profiles default,wal --save bench/baselines/load.json
+    python -m bench.load --compare bench/baselines/load.json
+
+Results use the bench/ JSON layout ("<profile>/<action>" scenarios), so --compare flags
+p50/p95 regressions the same way.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from bench.runner import BenchConfig, _percentile, compare, load_results, save_results
+from bench.synth import _WORDS, SynthSpec, generate_markups_csv
+
+ACTIONS = ("dashboard", "search", "bulk_update", "import")
+
+# Engine/pragma configurations per backend. "connect" statements run on every new
+# DBAPI connection, "begin" replaces the driver's implicit BEGIN, "env" is applied
+# before the engine is created (pool sizing, see src/db.py).
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "sqlite": {
+        "default": {},
+        "wal": {"connect": ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]},
+        "wal_busy30": {
+            "connect": ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=30000"]
+        },
+        # Every transaction takes the write lock up front: no failed read->write lock
+        # upgrades, but readers queue behind writers too.
+        "wal_immediate": {
+            "connect": ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=30000"],
+            "begin": "BEGIN IMMEDIATE",
+        },
+    },
+    "postgresql": {
+        "default": {},
+        "pool20": {"env": {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "20"}},
+        "async_commit": {"connect": ["SET synchronous_commit TO off"]},
+    },
+}
+
+_WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+@dataclass
+class LoadConfig:
+    sessions: int = 8
+    duration: float = 20.0  # seconds per profile
+    mode: str = "thread"  # thread | process
+    profiles: Tuple[str, ...] = ()  # default: every profile of the backend
+    mix: Tuple[Tuple[str, float], ...] = (("dashboard", 50), ("search", 25), ("bulk_update", 20), ("import", 5))
+    think_ms: float = 100.0  # mean pause between actions
+    rows: int = 5000  # seeded comments
+    import_rows: int = 300  # rows per imported file
+    bulk_rows: int = 50
+    seed: int = 11
+    database_url: str = ""
+
+
+def _backend(url: str) -> str:
+    from sqlalchemy.engine import make_url
+
+    return make_url(url).get_backend_name() if url else "sqlite"
+
+
+# ---- engine setup -------------------------------------------------------------
+_op = threading.local()  # .lock_ms: write-lock time of the running action
+
+
+def _apply_profile(engine, spec: Dict[str, Any]) -> None:
+    from sqlalchemy import event
+
+    connect = list(spec.get("connect", []))
+    begin = spec.get("begin")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        if begin and engine.dialect.name == "sqlite":
+            dbapi_conn.isolation_level = None  # we emit BEGIN ourselves
+        if connect:
+            cur = dbapi_conn.cursor()
+            for statement in connect:
+                cur.execute(statement)
+            cur.close()
+            if not begin:
+                dbapi_conn.commit()  # keep session-level SETs past the pool's reset rollback
+
+    if begin:
+
+        @event.listens_for(engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql(begin)
+
+
+def _install_lock_timing(engine) -> None:
+    from sqlalchemy import event
+    from sqlmodel import Session
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["_load_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        head = statement.lstrip()[:16].upper()
+        takes_lock = head.startswith("BEGIN") or (head.startswith(_WRITES) and not conn.info.get("_load_locked"))
+        if takes_lock:
+            conn.info["_load_locked"] = True
+            _op.lock_ms = getattr(_op, "lock_ms", 0.0) + (time.perf_counter() - conn.info["_load_t0"]) * 1000.0
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        if conn.info.pop("_load_locked", False):
+            _op.commit_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "rollback")
+    def _rollback(conn):
+        conn.info.pop("_load_locked", None)
+
+    @event.listens_for(Session, "after_commit")
+    def _committed(session):
+        t0 = getattr(_op, "commit_t0", None)
+        if t0 is not None:
+            _op.lock_ms = getattr(_op, "lock_ms", 0.0) + (time.perf_counter() - t0) * 1000.0
+            _op.commit_t0 = None
+
+
+def _prepare(url: str, backend: str, profile: str) -> None:
+    """Configure this process's engine for `profile` (before anything connects)."""
+    spec = PROFILES[backend][profile]
+    os.environ["DATABASE_URL"] = url
+    os.environ["MAINTENANCE_SCHEDULER"] = "false"
+    os.environ.update(spec.get("env", {}))
+
+    from bench.runner import _configure_database
+    from src.db import get_engine
+
+    engine = get_engine()
+    _apply_profile(engine, spec)
+    _install_lock_timing(engine)
+    _configure_database(BenchConfig(database_url=url))
+
+
+# ---- one simulated user --------------------------------------------------------
+def _error_kind(exc: BaseException) -> str:
+    from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+    if isinstance(exc, PoolTimeout):
+        return "pool_timeout"
+    msg = str(exc).lower()
+    if "locked" in msg or "busy" in msg:
+        return "locked"
+    if "deadlock" in msg:
+        return "deadlock"
+    return type(exc).__name__
+
+
+def _session(cfg: LoadConfig, session_no: int, project_id: int, milestone_id: int, ids: List[int]) -> Dict[str, Any]:
+    from src.db import session_scope
+    from src.import_bluebeam import import_files, parse_upload
+    from src.queries import bulk_update, load_comments
+
+    rng = random.Random(f"{cfg.seed}-{project_id}-{session_no}")
+    actions, weights = zip(*cfg.mix)
+    filters = [{}, {"status": "Open"}, {"discipline": "M", "tracked_filter": "Tracked"}]
+    # Files are generated up front (new markups each time) so making CSV text is not timed.
+    expected_imports = int(cfg.duration * 1000 / max(cfg.think_ms, 50) * dict(cfg.mix).get("import", 0) / sum(weights)) + 2
+    files = [
+        generate_markups_csv(SynthSpec(rows=cfg.import_rows, seed=rng.getrandbits(32))) for _ in range(expected_imports)
+    ]
+
+    def run(action: str) -> None:
+        if action == "dashboard":
+            load_comments(project_id, milestone_id, **rng.choice(filters))
+        elif action == "search":
+            load_comments(project_id, None, search=rng.choice(_WORDS))
+        elif action == "bulk_update":
+            bulk_update(
+                rng.sample(ids, min(cfg.bulk_rows, len(ids))),
+                status=rng.choice(["Open", "Needs Response", "In Progress"]),
+                owner=f"Owner {rng.randint(1, 9)}",
+            )
+        elif action == "import":
+            raw = files.pop() if files else generate_markups_csv(SynthSpec(rows=cfg.import_rows, seed=rng.getrandbits(32)))
+            parsed = parse_upload(f"load-{session_no}-{len(files)}.csv", raw)
+            with session_scope() as s:
+                import_files(
+                    s, [parsed], project_id=project_id, milestone_id=milestone_id, discipline="M", default_tracked=True
+                )
+
+    records: List[Tuple[str, float, float, float, str]] = []  # action, start, ms, lock ms, error
+    started = time.time()
+    deadline = time.perf_counter() + cfg.duration
+    while time.perf_counter() < deadline:
+        action = rng.choices(actions, weights)[0]
+        _op.lock_ms, _op.commit_t0 = 0.0, None
+        error = ""
+        t_start = time.time()
+        t0 = time.perf_counter()
+        try:
+            run(action)
+        except Exception as e:
+            error = _error_kind(e)
+        records.append((action, t_start, (time.perf_counter() - t0) * 1000.0, _op.lock_ms, error))
+        if cfg.think_ms:
+            time.sleep(min(rng.expovariate(1.0 / cfg.think_ms), cfg.think_ms * 10) / 1000.0)
+    return {"started": started, "ended": time.time(), "records": records}
+
+
+def _session_process(cfg, url, backend, profile, session_no, project_id, milestone_id, ids) -> Dict[str, Any]:
+    _prepare(url, backend, profile)
+    return _session(cfg, session_no, project_id, milestone_id, ids)
+
+
+# ---- one profile ------------------------------------------------------------------
+def _seed(cfg: LoadConfig) -> Tuple[int, int, List[int]]:
+    from src.db import session_scope
+    from src.import_bluebeam import import_files, parse_upload
+    from src.models import Milestone, Project
+    from src.queries import load_comments
+
+    with session_scope() as s:
+        project = Project(name=f"Load {datetime.utcnow():%Y%m%d-%H%M%S}")
+        s.add(project)
+        s.flush()
+        milestone = Milestone(project_id=project.id, name="Load milestone")
+        s.add(milestone)
+        s.flush()
+        project_id, milestone_id = project.id, milestone.id
+    with session_scope() as s:
+        # Import dedupe is database-wide: every run needs its own markups on a shared --database-url.
+        spec = SynthSpec(rows=cfg.rows, seed=cfg.seed * 100_003 + project_id)
+        parsed = parse_upload("load-seed.csv", generate_markups_csv(spec))
+        import_files(s, [parsed], project_id=project_id, milestone_id=milestone_id, discipline="M", default_tracked=True)
+    ids = load_comments(project_id, None)["id"].astype(int).tolist()
+    return project_id, milestone_id, ids
+
+
+def _run_profile(cfg: LoadConfig, url: str, backend: str, profile: str) -> Dict[str, Any]:
+    _prepare(url, backend, profile)
+    project_id, milestone_id, ids = _seed(cfg)
+
+    if cfg.mode == "process":
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=cfg.sessions, mp_context=ctx) as pool:
+            futures = [
+                pool.submit(_session_process, cfg, url, backend, profile, n, project_id, milestone_id, ids)
+                for n in range(cfg.sessions)
+            ]
+            sessions = [f.result() for f in futures]
+    else:
+        with ThreadPoolExecutor(max_workers=cfg.sessions) as pool:
+            futures = [pool.submit(_session, cfg, n, project_id, milestone_id, ids) for n in range(cfg.sessions)]
+            sessions = [f.result() for f in futures]
+    return _summarize_profile(sessions)
+
+
+def _summarize(records: List[Tuple[str, float, float, float, str]], window: Tuple[float, float]) -> Dict[str, Any]:
+    latencies = [r[2] for r in records if not r[4]]
+    locks = [r[3] for r in records]
+    errors = Counter(r[4] for r in records if r[4])
+    # Throughput only counts actions started while every session was running.
+    span_s = max(window[1] - window[0], 1e-9)
+    in_window = sum(1 for r in records if not r[4] and window[0] <= r[1] < window[1])
+    return {
+        "runs": len(records),
+        "ok": len(latencies),
+        "ops_per_s": round(in_window / span_s, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "lock_wait_ms": round(sum(locks), 1),
+        "lock_wait_p95_ms": round(_percentile(locks, 95), 3),
+        "error_rate": round(sum(errors.values()) / len(records), 4) if records else 0.0,
+        "errors": dict(errors),
+    }
+
+
+def _summarize_profile(sessions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    window = (max(s["started"] for s in sessions), min(s["ended"] for s in sessions))
+    records = [r for s in sessions for r in s["records"]]
+    out = {"all": _summarize(records, window)}
+    for action in ACTIONS:
+        subset = [r for r in records if r[0] == action]
+        if subset:
+            out[action] = _summarize(subset, window)
+    return out
+
+
+def run_load(cfg: LoadConfig) -> Dict[str, Any]:
+    backend = _backend(cfg.database_url)
+    profiles = cfg.profiles or tuple(PROFILES[backend])
+    unknown = [p for p in profiles if p not in PROFILES[backend]]
+    if unknown:
+        raise SystemExit(f"Unknown {backend} profile(s): {', '.join(unknown)} (have {', '.join(PROFILES[backend])})")
+
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    for profile in profiles:
+        url = cfg.database_url
+        if not url:
+            url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bluebeam-load-'), 'load.db')}"
+        # A fresh process per profile: one engine, clean module caches.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(_run_profile, cfg, url, backend, profile).result()
+        for action, summary in result.items():
+            scenarios[f"{profile}/{action}"] = summary
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sqlite": sqlite3.sqlite_version,
+            "database": backend,
+            "config": asdict(cfg),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _print_report(results: Dict[str, Any]) -> None:
+    print(
+        f"{'profile/action':<28} {'ops':>6} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'lock ms':>10} {'lock p95':>9} {'errors':>8}"
+    )
+    for name, r in results["scenarios"].items():
+        kinds = ",".join(f"{k}={v}" for k, v in sorted(r["errors"].items()))
+        print(
+            f"{name:<28} {r['runs']:>6} {r['ops_per_s']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['lock_wait_ms']:>10.0f} {r['lock_wait_p95_ms']:>9.1f} "
+            f"{100 * r['error_rate']:>7.1f}%" + (f"  {kinds}" if kinds else "")
+        )
+
+
+def _parse_mix(text: str) -> Tuple[Tuple[str, float], ...]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r} (have {', '.join(ACTIONS)})")
+        mix.append((name.strip(), float(weight or 1)))
+    return tuple(mix)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m bench.load", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sessions", type=int, default=LoadConfig.sessions, help="concurrent simulated users")
+    p.add_argument("--duration", type=float, default=LoadConfig.duration, help="seconds per profile")
+    p.add_argument("--mode", choices=["thread", "process"], default=LoadConfig.mode)
+    p.add_argument("--profiles", default="", help="comma list (default: all for the backend): " + "; ".join(
+        f"{b}: {', '.join(ps)}" for b, ps in PROFILES.items()
+    ))
+    p.add_argument("--mix", type=_parse_mix, default=LoadConfig.mix, help="e.g. dashboard=50,search=25,bulk_update=20,import=5")
+    p.add_argument("--think-ms", type=float, default=LoadConfig.think_ms)
+    p.add_argument("--rows", type=int, default=LoadConfig.rows, help="comments seeded per profile")
+    p.add_argument("--import-rows", type=int, default=LoadConfig.import_rows)
+    p.add_argument("--bulk-rows", type=int, default=LoadConfig.bulk_rows)
+    p.add_argument("--database-url", default="", help="default: a fresh temporary SQLite file per profile")
+    p.add_argument("--save", metavar="PATH", help="write results JSON")
+    p.add_argument("--compare", metavar="PATH", help="earlier results JSON to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    cfg = LoadConfig(
+        sessions=args.sessions,
+        duration=args.duration,
+        mode=args.mode,
+        profiles=tuple(x.strip() for x in args.profiles.split(",") if x.strip()),
+        mix=args.mix,
+        think_ms=args.think_ms,
+        rows=args.rows,
+        import_rows=args.import_rows,
+        bulk_rows=args.bulk_rows,
+        database_url=args.database_url,
+    )
+    results = run_load(cfg)
+    _print_report(results)
+
+    if args.save:
+        save_results(results, args.save)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        rows = compare(results, load_results(args.compare), tolerance=args.tolerance)
+        regressions = [r for r in rows if r["regression"]]
+        print(f"\nCompared with {args.compare}:")
+        for r in rows:
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"  {r['scenario']:<28} {r['metric']:<12} x{r['ratio']:<6}{flag}")
+        if regressions:
+            print(json.dumps(regressions, indent=2), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
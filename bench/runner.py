@@ -0,0 +1,341 @@
+# bench/runner.py
+"""
+Benchmark driver.
+
+Each scenario is run `repeat` times for latency percentiles; peak Python memory
+(tracemalloc) is taken from one extra, untimed run so tracing overhead does not
+skew the timings. Results are a plain JSON document that can be saved as a
+baseline and compared against later runs.
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from bench.synth import (
+    SynthSpec,
+    generate_markups_csv,
+    generate_markups_xml,
+    generate_rows,
+    rows_to_csv,
+    with_status_changes,
+)
+
+
+@dataclass
+class BenchConfig:
+    rows: int = 5000
+    sheets: int = 200
+    authors: int = 25
+    date_format: str = "us12"
+    duplicate_rate: float = 0.05
+    comment_words: int = 24
+    imports: int = 3  # files imported (each one a timed run)
+    repeat: int = 10  # timed runs for the query scenarios
+    triage_rows: int = 50
+    llm_latency_ms: float = 0.0
+    database_url: str = ""  # default: a fresh temporary SQLite file
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _summarize(latencies_ms: List[float], items_per_run: float, peak_kb: float) -> Dict[str, Any]:
+    mean = statistics.fmean(latencies_ms) if latencies_ms else 0.0
+    return {
+        "runs": len(latencies_ms),
+        "mean_ms": round(mean, 3),
+        "p50_ms": round(_percentile(latencies_ms, 50), 3),
+        "p95_ms": round(_percentile(latencies_ms, 95), 3),
+        "p99_ms": round(_percentile(latencies_ms, 99), 3),
+        "items_per_run": items_per_run,
+        "items_per_s": round(items_per_run / (mean / 1000.0), 1) if mean else 0.0,
+        "peak_mem_kb": round(peak_kb, 1),
+    }
+
+
+def _measure(fn: Callable[[int], float], repeat: int) -> Dict[str, Any]:
+    """`fn(i)` performs run i and returns how many items it processed."""
+    tracemalloc.start()
+    items = fn(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    for i in range(1, repeat + 1):
+        t0 = time.perf_counter()
+        items = fn(i)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    return _summarize(latencies, items, peak / 1024.0)
+
+
+def _configure_database(cfg: BenchConfig) -> str:
+    url = cfg.database_url
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(prefix="bluebeam-bench-"), "bench.db")
+        url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+
+    from sqlalchemy.engine import make_url
+
+    from src.db import get_engine, init_db
+
+    # Secrets win over env vars in src.config; never benchmark against a real database.
+    actual = get_engine().url.render_as_string(hide_password=False)
+    if actual != make_url(url).render_as_string(hide_password=False):
+        raise SystemExit(
+            f"Refusing to run: the app resolves DATABASE_URL to {actual!r} (Streamlit secrets?), "
+            f"not the benchmark database {url!r}."
+        )
+    init_db()
+    return url
+
+
+def run_benchmarks(cfg: BenchConfig) -> Dict[str, Any]:
+    db_url = _configure_database(cfg)
+
+    from src.db import session_scope
+    from src.exporters import build_consultant_package, comments_to_dataframe
+    from src.import_bluebeam import file_digest, find_identical_import, import_files, parse_upload, parse_uploads
+    from src.models import Milestone, Project
+    from src.package_batch import write_package_zip
+    from src.package_cache import package_artifacts
+    from src.queries import apply_triage, bulk_update, load_comments, load_package_items, refresh_comments
+    from src.similarity import similar_comments, update_index
+
+    with session_scope() as s:
+        project = Project(name=f"Bench {datetime.utcnow():%Y%m%d-%H%M%S}")
+        s.add(project)
+        s.flush()
+        milestone = Milestone(project_id=project.id, name="Bench milestone")
+        s.add(milestone)
+        s.flush()
+        project_id, milestone_id = project.id, milestone.id
+
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    rng = random.Random(7)
+
+    # --- import: decode + parse + fingerprint + dedupe + insert, one fresh file per run
+    specs = [
+        SynthSpec(
+            rows=cfg.rows,
+            sheets=cfg.sheets,
+            authors=cfg.authors,
+            date_format=cfg.date_format,
+            duplicate_rate=cfg.duplicate_rate,
+            comment_words=cfg.comment_words,
+            seed=100 + i,
+        )
+        for i in range(cfg.imports + 1)
+    ]
+    files = [generate_markups_csv(spec) for spec in specs]
+
+    def _import(raw: bytes, name: str, *, with_digest: bool = False, delta: bool = False) -> float:
+        # Same path as the Import page: file-level skip, parse_upload(), import_files()
+        with session_scope() as s:
+            if with_digest and find_identical_import(s, project_id, milestone_id, file_digest(raw)) is not None:
+                return 1  # skipped without parsing
+            parsed = parse_upload(name, raw)
+            if not with_digest:
+                parsed.file_sha256 = ""  # row-level dedupe only
+            import_files(
+                s,
+                [parsed],
+                project_id=project_id,
+                milestone_id=milestone_id,
+                discipline="M",
+                default_tracked=True,
+                delta=delta,
+            )
+        return parsed.rows
+
+    scenarios["import"] = _measure(lambda i: _import(files[i], f"bench-{i}.csv", with_digest=True), cfg.imports)
+    scenarios["import"]["file_bytes"] = len(files[0])
+
+    # --- multi-file upload: parallel parse, one merged write (a milestone's discipline CSVs)
+    multi = [
+        [(f"bench-multi-{i}-{j}.csv", generate_markups_csv(replace(specs[0], seed=1000 + 10 * i + j))) for j in range(3)]
+        for i in range(cfg.imports + 1)
+    ]
+
+    def _import_multi(i: int) -> float:
+        parsed = parse_uploads(multi[i])
+        with session_scope() as s:
+            import_files(
+                s, parsed, project_id=project_id, milestone_id=milestone_id, discipline="M", default_tracked=True
+            )
+        return sum(pf.rows for pf in parsed)
+
+    scenarios["import_multi"] = _measure(_import_multi, cfg.imports)
+    scenarios["import_multi"]["files"] = len(multi[0])
+
+    # --- XML export of the same size, parsed by the streaming XML reader
+    xml_files = [generate_markups_xml(replace(spec, seed=2000 + i)) for i, spec in enumerate(specs)]
+    scenarios["import_xml"] = _measure(lambda i: _import(xml_files[i], f"bench-{i}.xml"), cfg.imports)
+    scenarios["import_xml"]["file_bytes"] = len(xml_files[0])
+
+    # --- re-import of an already imported file: row-level dedupe vs. file-level skip
+    scenarios["reimport_duplicate"] = _measure(lambda i: _import(files[0], "bench-0.csv"), max(1, cfg.imports))
+    scenarios["reimport_identical_file"] = _measure(
+        lambda i: _import(files[0], "bench-0.csv", with_digest=True), max(1, cfg.imports)
+    )
+
+    # --- delta re-import: same session re-exported with ~5% status changes each time
+    base_rows = generate_rows(specs[0])
+    deltas = [rows_to_csv(with_status_changes(base_rows, 0.05, seed=i)) for i in range(cfg.imports + 1)]
+    scenarios["reimport_delta"] = _measure(
+        lambda i: _import(deltas[i], f"bench-0-rev{i}.csv", delta=True), cfg.imports
+    )
+
+    # --- dashboard loader with the filter combinations people actually use
+    filters = [
+        {},
+        {"status": "Open"},
+        {"discipline": "M", "tracked_filter": "Tracked"},
+        {"search": "duct"},
+    ]
+
+    def _dashboard(i: int) -> float:
+        df = load_comments(project_id, milestone_id, **filters[i % len(filters)])
+        return len(df)
+
+    scenarios["dashboard_load"] = _measure(_dashboard, cfg.repeat)
+
+    all_ids = load_comments(project_id, None)["id"].astype(int).tolist()
+
+    # --- bulk update of a typical selection
+    def _bulk(i: int) -> float:
+        ids = rng.sample(all_ids, min(200, len(all_ids)))
+        return bulk_update(ids, status="Needs Response", owner="Consultant", tag="COORD")
+
+    scenarios["bulk_update"] = _measure(_bulk, cfg.repeat)
+
+    # --- dashboard after editing 20 rows: the edit plus a change-feed refresh of the cached frame
+    frame = {"df": load_comments(project_id, None)}
+
+    def _edit_refresh(i: int) -> float:
+        ids = rng.sample(all_ids, min(20, len(all_ids)))
+        bulk_update(ids, status="In Progress" if i % 2 else "Needs Response")
+        frame["df"] = refresh_comments(frame["df"], project_id, None)
+        return len(ids)
+
+    scenarios["dashboard_edit_refresh"] = _measure(_edit_refresh, cfg.repeat)
+
+    # --- related comments: top-5 similar for one comment (index built once, then kept up to date)
+    update_index(project_id)
+
+    def _related(i: int) -> float:
+        return len(similar_comments(project_id, comment_id=rng.choice(all_ids), k=5))
+
+    scenarios["related_comments"] = _measure(_related, cfg.repeat)
+
+    # --- package build + CSV export
+    def _package(i: int) -> float:
+        items = load_package_items(project_id, milestone_id, status="Needs Response", group_by=("sheet",))
+        build_consultant_package(items, header="Please respond.", presorted=True)
+        comments_to_dataframe(items).to_csv(index=False)
+        return len(items)
+
+    scenarios["package_build"] = _measure(_package, cfg.repeat)
+
+    # --- package page rerun with nothing changed: served from the rendered-package cache
+    def _package_cached(i: int) -> float:
+        arts = package_artifacts(project_id, milestone_id, status="Needs Response", header="Please respond.")
+        return arts["txt"].rows
+
+    scenarios["package_cached"] = _measure(_package_cached, cfg.repeat)
+
+    # --- batch ZIP: one package per discipline from a single pass
+    def _package_zip(i: int) -> float:
+        manifest = write_package_zip(io.BytesIO(), project_id, milestone_id, partition_by="discipline")
+        return manifest["total_items"]
+
+    scenarios["package_batch_zip"] = _measure(_package_zip, cfg.repeat)
+
+    # --- AI triage against the local fake server
+    scenarios["triage"] = _run_triage(cfg, all_ids, milestone_id, apply_triage, rng)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "database": db_url.split("://", 1)[0],
+            "config": asdict(cfg),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _run_triage(cfg: BenchConfig, all_ids, milestone_id, apply_triage, rng) -> Dict[str, Any]:
+    from bench.fake_llm import running_fake_llm
+    from src.config import get_secret
+
+    with running_fake_llm(cfg.llm_latency_ms) as base_url:
+        os.environ["OPENAI_API_KEY"] = "bench-key"
+        os.environ["OPENAI_BASE_URL"] = base_url
+        if get_secret("OPENAI_BASE_URL") != base_url:
+            return {"skipped": "OPENAI_BASE_URL is set in Streamlit secrets; not calling a real API."}
+
+        from src.llm import triage_comment_cached
+
+        def _triage(i: int) -> float:
+            ids = rng.sample(all_ids, min(cfg.triage_rows, len(all_ids)))
+            return apply_triage(ids, "Bench milestone", triage_comment_cached)
+
+        return _measure(_triage, max(1, cfg.repeat // 2))
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Per-scenario p50/p95 ratios against a baseline. A metric counts as a regression
+    when it is more than `tolerance` (default 20%) slower.
+    """
+    rows = []
+    for name, cur in current.get("scenarios", {}).items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or "p50_ms" not in cur or "p50_ms" not in base:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_mem_kb"):
+            b, c = base.get(metric) or 0.0, cur.get(metric) or 0.0
+            ratio = (c / b) if b else 0.0
+            rows.append(
+                {
+                    "scenario": name,
+                    "metric": metric,
+                    "baseline": b,
+                    "current": c,
+                    "ratio": round(ratio, 3),
+                    "regression": bool(b) and ratio > 1.0 + tolerance,
+                }
+            )
+    return rows
+
+
+def save_results(results: Dict[str, Any], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Optional[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
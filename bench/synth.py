@@ -0,0 +1,128 @@
+# bench/synth.py
+"""Generator for realistic synthetic Bluebeam Markups Summary CSV (and XML) exports."""
+from __future__ import annotations
+
+import csv
+import io
+import random
+from xml.sax.saxutils import escape
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+
+# Column order follows a default Revu Markups Summary export.
+COLUMNS = ["Subject", "Page Label", "Author", "Date", "Status", "Comments", "Layer", "Color", "ID"]
+
+DATE_FORMATS = {
+    "us12": "%m/%d/%Y %I:%M:%S %p",  # Revu default (en-US)
+    "us24": "%m/%d/%Y %H:%M",
+    "iso": "%Y-%m-%d %H:%M:%S",
+}
+
+SHEET_PREFIXES = ["A", "S", "M", "E", "P", "C", "FP", "L"]
+SUBJECTS = ["Text Box", "Cloud+", "Callout", "Note", "Rectangle", "Arrow", "Highlight"]
+STATUSES = ["", "", "", "Accepted", "Rejected", "Completed", "Cancelled"]
+
+_WORDS = (
+    "verify coordinate provide confirm revise clarify dimension detail section elevation "
+    "duct pipe conduit beam column slab footing wall door window ceiling grid level "
+    "clearance access panel fire rating egress code spec note schedule legend keynote "
+    "conflict with structure relocate per RFI response pending owner approval add missing "
+    "tag callout reference sheet typical all locations see also"
+).split()
+
+
+@dataclass
+class SynthSpec:
+    rows: int = 5000
+    sheets: int = 200
+    authors: int = 25
+    date_format: str = "us12"
+    duplicate_rate: float = 0.05  # share of rows that repeat an earlier row verbatim
+    comment_words: int = 24  # mean words per comment
+    seed: int = 1
+    sheet_prefixes: List[str] = field(default_factory=lambda: list(SHEET_PREFIXES))
+
+
+def _sheet_names(rng: random.Random, spec: SynthSpec) -> List[str]:
+    names = []
+    for i in range(spec.sheets):
+        prefix = spec.sheet_prefixes[i % len(spec.sheet_prefixes)]
+        names.append(f"{prefix}{rng.randint(1, 9)}{rng.randint(0, 99):02d}")
+    return names
+
+
+def _comment(rng: random.Random, mean_words: int) -> str:
+    n = max(3, int(rng.gauss(mean_words, mean_words / 3)))
+    text = " ".join(rng.choice(_WORDS) for _ in range(n))
+    return text[0].upper() + text[1:] + "."
+
+
+def generate_rows(spec: SynthSpec) -> List[List[str]]:
+    rng = random.Random(spec.seed)
+    fmt = DATE_FORMATS[spec.date_format]
+    sheets = _sheet_names(rng, spec)
+    authors = [f"Reviewer {i:02d}" for i in range(spec.authors)]
+    start = datetime(2024, 1, 8, 8, 0, 0)
+
+    rows: List[List[str]] = []
+    for i in range(spec.rows):
+        if rows and rng.random() < spec.duplicate_rate:
+            rows.append(list(rng.choice(rows)))
+            continue
+        created = start + timedelta(seconds=rng.randint(0, 90 * 24 * 3600))
+        rows.append(
+            [
+                rng.choice(SUBJECTS),
+                rng.choice(sheets),
+                rng.choice(authors),
+                created.strftime(fmt),
+                rng.choice(STATUSES),
+                _comment(rng, spec.comment_words),
+                "Markups",
+                "#FF0000",
+                f"{spec.seed:04d}{i:08X}",
+            ]
+        )
+    return rows
+
+
+def with_status_changes(rows: List[List[str]], rate: float, seed: int = 0) -> List[List[str]]:
+    """Copy of `rows` where a share of markups moved to a different Status (a consultant re-export)."""
+    rng = random.Random(seed)
+    status_col = COLUMNS.index("Status")
+    out = []
+    for row in rows:
+        row = list(row)
+        if rng.random() < rate:
+            row[status_col] = rng.choice([s for s in STATUSES if s != row[status_col]])
+        out.append(row)
+    return out
+
+
+def rows_to_csv(rows: List[List[str]], encoding: str = "utf-8") -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\r\n")
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buf.getvalue().encode(encoding)
+
+
+def generate_markups_csv(spec: SynthSpec, encoding: str = "utf-8") -> bytes:
+    """Render the synthetic export to CSV bytes, like an uploaded file."""
+    return rows_to_csv(generate_rows(spec), encoding=encoding)
+
+
+def rows_to_xml(rows: List[List[str]]) -> bytes:
+    """The same markups as an XML export: one <Markup> per row, columns as child elements."""
+    tags = [c.replace(" ", "_") for c in COLUMNS]
+    parts = ['<?xml version="1.0" encoding="utf-8"?>\n<MarkupSummary>\n']
+    for page_index, row in enumerate(rows):
+        cells = "".join(f"<{t}>{escape(v)}</{t}>" for t, v in zip(tags, row))
+        parts.append(f"  <Markup>{cells}<Page_Index>{page_index % 50}</Page_Index></Markup>\n")
+    parts.append("</MarkupSummary>\n")
+    return "".join(parts).encode("utf-8")
+
+
+def generate_markups_xml(spec: SynthSpec) -> bytes:
+    return rows_to_xml(generate_rows(spec))
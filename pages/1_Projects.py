@@ -6,11 +6,15 @@ from datetime import date
 import streamlit as st
 from sqlmodel import select
 
+from src.archive import archive_after_days, archive_closed, archive_counts, archive_project, restore_project
 from src.auth import require_login
 from src.db import init_db, session_scope
+from src.instrument import begin_rerun
 from src.models import Project, Milestone
+from src.similarity import rebuild_index
 
 st.set_page_config(page_title="Projects", layout="wide")
+begin_rerun("Projects")
 init_db()
 require_login()
 
@@ -81,8 +85,28 @@ if st.button("Toggle Active / Archived"):
             st.stop()
         p.is_active = not p.is_active
         s.add(p)
+        # Archived projects move their comments to the cold tables; reactivating brings them back.
+        moved = restore_project(s, project_id) if p.is_active else archive_project(s, project_id)
+    if p.is_active and moved.comments:
+        # Restored comments keep their ids, below what the append-only index has seen.
+        rebuild_index(project_id)
+    st.toast(f"{'Restored' if p.is_active else 'Archived'} {moved.comments} comments.")
     st.rerun()
 
+with st.expander("🗄️ Archive", expanded=False):
+    with session_scope() as s:
+        counts = archive_counts(s, project_id)
+    st.caption(
+        f"{counts['hot']} active comments, {counts['cold']} archived. Archived comments stay searchable on the "
+        "dashboard with **Include archived comments**, and re-imports still recognise them."
+    )
+    days = st.number_input("Archive comments closed more than (days) ago", min_value=0, value=archive_after_days(), step=30)
+    if st.button("Archive closed comments", disabled=not proj.is_active):
+        with session_scope() as s:
+            moved = archive_closed(s, project_id=project_id, older_than_days=int(days))
+        st.success(f"Archived {moved.comments} closed comments.")
+        st.rerun()
+
 st.divider()
 
 # -----------------------------
@@ -1,87 +1,38 @@
 # pages/2_Import_Bluebeam_CSV.py
 from __future__ import annotations
 
-import csv
-import hashlib
-import io
-import json
-from datetime import datetime
-from typing import Any, Dict, Optional
-
 import streamlit as st
 from sqlmodel import select
 
 from src.auth import require_login
 from src.db import init_db, session_scope
-from src.models import Project, Milestone, ImportBatch, CommentItem, Comment
-from src.settings import get_setting, set_setting
+from src.instrument import begin_rerun
+from src.import_bluebeam import file_digest, find_identical_import, import_files, parse_uploads, read_upload_header
+from src.mappings import plan_for, plan_key, reset_plan, save_plan
+from src.models import Project, Milestone
+from src.settings import get_setting, set_settings
+from src.similarity import rebuild_index, update_index
 
 st.set_page_config(page_title="Import Bluebeam CSV", layout="wide")
+begin_rerun("Import")
 init_db()
 require_login()
 
 st.title("Import")
 
-# ------------------------------------------------------------
-# Helpers
-# ------------------------------------------------------------
-def _first_nonempty(d: Dict[str, Any], keys: list[str], default: str = "") -> str:
-    for k in keys:
-        v = d.get(k)
-        if v is None:
-            continue
-        s = str(v).strip()
-        if s:
-            return s
-    return default
-
-
-def _parse_datetime(s: str) -> Optional[datetime]:
-    s = (s or "").strip()
-    if not s:
-        return None
-    # Try a few common Bluebeam-ish formats
-    fmts = [
-        "%m/%d/%Y %I:%M:%S %p",
-        "%m/%d/%Y %I:%M %p",
-        "%m/%d/%Y %H:%M:%S",
-        "%m/%d/%Y %H:%M",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-    ]
-    for f in fmts:
-        try:
-            return datetime.strptime(s, f)
-        except Exception:
-            pass
-    # last resort: try ISO-ish
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
-
-
-def make_row_hash(row: Dict[str, Any]) -> str:
-    """
-    Stable, non-empty fingerprint.
-    Prevents fp="" which causes everything to be treated as duplicate.
-    """
-    payload = {
-        "sheet": _first_nonempty(row, ["sheet", "Sheet", "Page Label", "Page", "PageLabel"]),
-        "author": _first_nonempty(row, ["author", "Author", "Created By", "Creator"]),
-        "subject": _first_nonempty(row, ["subject", "Subject", "Type", "Markup Type"]),
-        "created": _first_nonempty(row, ["created_at", "Created", "Date", "Creation Date", "Timestamp"]),
-        "comment": _first_nonempty(row, ["comment_text", "Comment", "Contents", "Text", "Comments", "Note"]),
-        "markup_id": _first_nonempty(row, ["markup_id", "Markup ID", "ID", "Annotation ID"]),
-    }
-
-    # If everything is blank, hash the whole row to avoid identical hashes
-    if not any(payload.values()):
-        payload = row
-
-    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+DISCIPLINES = ["A", "S", "M", "E", "CIV", "FP", "OTHER"]
 
+# Import fields shown in the mapping editor (keys of src.import_bluebeam.FIELD_KEYS)
+FIELD_LABELS = {
+    "sheet": "Sheet",
+    "author": "Author",
+    "subject": "Subject",
+    "comment_text": "Comment",
+    "markup_id": "Markup ID",
+    "created_at": "Created",
+    "status_raw": "Status",
+    "page_index": "Page index",
+}
 
 # ------------------------------------------------------------
 # UI: Project / Milestone selection
@@ -106,121 +57,226 @@ mile_opts = {"(None)": None} | {f"{m.name} (#{m.id})": m.id for m in miles}
 mile_label = st.selectbox("Milestone (optional)", list(mile_opts.keys()))
 milestone_id = mile_opts[mile_label]
 
-discipline = st.selectbox("Discipline", ["A", "S", "M", "E", "CIV", "FP", "OTHER"], index=3)
-
-default_tracked = st.checkbox("Default imported items to Tracked = True", value=(get_setting("default_tracked", "true") == "true"))
+discipline = st.selectbox("Discipline", DISCIPLINES, index=3)
+
+saved_tracked = get_setting("default_tracked", "true") == "true"
+default_tracked = st.checkbox("Default imported items to Tracked = True", value=saved_tracked)
+
+saved_delta = get_setting("delta_import", "false") == "true"
+delta = st.checkbox(
+    "Delta re-import: update markups already imported (matched by Markup ID) instead of adding them again",
+    value=saved_delta,
+    help="Re-exports of the same Bluebeam session then only change Status/State and edited text.",
+)
+
+saved_infer = get_setting("infer_disciplines", "true") == "true"
+infer_disciplines = st.checkbox(
+    "Assign discipline per row from the sheet prefix (M-101 → M)",
+    value=saved_infer,
+    help="Prefixes this project hasn't seen yet get the discipline selected above (and remember it). "
+    "Discipline corrections on the dashboard are remembered per prefix too.",
+)
+
+# Persist only what the user actually changed (reads are served from the settings cache)
+set_settings(
+    {
+        "default_tracked": "true" if default_tracked else "false",
+        "delta_import": "true" if delta else "false",
+        "infer_disciplines": "true" if infer_disciplines else "false",
+    }
+)
 
-set_setting("default_tracked", "true" if default_tracked else "false")
+# Summary of the last import survives the st.rerun() below
+last = st.session_state.pop("_import_results", None)
+if last:
+    st.success(last["message"])
+    st.dataframe(last["files"], use_container_width=True, hide_index=True)
+    st.caption("If you expected fewer items, your CSV likely contains extra non-comment rows. Use filters next if needed.")
 
-uploaded = st.file_uploader("Upload Bluebeam CSV", type=["csv"])
+uploaded = st.file_uploader("Upload Bluebeam CSV or XML", type=["csv", "xml"], accept_multiple_files=True)
 
 if not uploaded:
-    st.info("Upload a Bluebeam CSV export to import markups/comments.")
+    st.info("Upload one or more Bluebeam markup exports (Markups Summary CSV or XML) to import markups/comments.")
     st.stop()
 
 # ------------------------------------------------------------
-# Read CSV
+# Read CSVs (already imported files are skipped before parsing)
 # ------------------------------------------------------------
-raw_bytes = uploaded.getvalue()
-text = raw_bytes.decode("utf-8", errors="replace")
-
-# Use csv.DictReader to map columns to dict keys.
-reader = csv.DictReader(io.StringIO(text))
-rows = [dict(r) for r in reader]
+raw_by_sha = {}
+new_files = []  # (name, sha256)
+with session_scope() as s:
+    for up in uploaded:
+        raw_bytes = up.getvalue()
+        file_sha256 = file_digest(raw_bytes)
+        previous = find_identical_import(s, project_id, milestone_id, file_sha256)
+        if previous is not None:
+            st.info(
+                f"**{up.name}** was already imported into this project/milestone "
+                f"(batch #{previous.id}, {previous.source_filename or 'unnamed'}, "
+                f"{previous.imported_at:%Y-%m-%d %H:%M} UTC). Skipping it."
+            )
+            continue
+        if any(sha == file_sha256 for _, sha in new_files):
+            st.info(f"**{up.name}** is identical to another uploaded file. Skipping it.")
+            continue
+        raw_by_sha[file_sha256] = raw_bytes
+        new_files.append((up.name, file_sha256))
 
-st.write(f"Rows found in CSV: **{len(rows)}**")
+if not new_files:
+    st.stop()
 
-if len(rows) == 0:
-    st.error("No rows found. Is this a valid CSV export?")
+# ------------------------------------------------------------
+# Column mapping: one stored plan per header layout, editable
+# ------------------------------------------------------------
+layouts = {}  # header hash -> (headers, stored plan, file names)
+file_plans = {}  # sha256 -> stored plan
+with session_scope() as s:
+    for name, sha in new_files:
+        headers = read_upload_header(raw_by_sha[sha])
+        stored = plan_for(s, headers)
+        file_plans[sha] = stored
+        layouts.setdefault(stored.header_hash, (headers, stored, []))[2].append(name)
+
+with st.expander("Column mapping"):
+    for header_hash, (headers, stored, names) in layouts.items():
+        kind = "saved" if stored.source == "user" else "inferred"
+        st.caption(f"{', '.join(names)}: {kind} mapping")
+        current = {f: stored.plan.get(f, []) for f in FIELD_LABELS}
+        edited = st.data_editor(
+            [
+                {
+                    "field": label,
+                    "column": current[f][0] if current[f] else "",
+                    "fallbacks": ", ".join(current[f][1:]),
+                }
+                for f, label in FIELD_LABELS.items()
+            ],
+            column_config={
+                "column": st.column_config.SelectboxColumn("column", options=[""] + headers),
+                "fallbacks": st.column_config.TextColumn(
+                    "fallbacks", help="Used per row when the main column is empty."
+                ),
+            },
+            disabled=["field", "fallbacks"],
+            use_container_width=True,
+            hide_index=True,
+            key=f"mapping_{header_hash}",
+        )
+        c1, c2 = st.columns(2)
+        if c1.button("Save mapping", key=f"mapping_save_{header_hash}"):
+            new_plan = {}
+            for f, row in zip(FIELD_LABELS, edited):
+                col = row["column"] or ""
+                if not col:
+                    new_plan[f] = []
+                elif current[f] and col == current[f][0]:
+                    new_plan[f] = current[f]  # unchanged: keep the fallbacks
+                else:
+                    new_plan[f] = [col]
+            with session_scope() as s:
+                save_plan(s, headers, new_plan)
+            st.rerun()
+        if stored.source == "user" and c2.button("Reset to inferred", key=f"mapping_reset_{header_hash}"):
+            with session_scope() as s:
+                reset_plan(s, headers)
+            st.rerun()
+
+# Parse each upload once per mapping (in parallel); reruns reuse the parsed files
+parsed_cache = st.session_state.setdefault("_parsed_uploads", {})
+wanted = {(sha, plan_key(file_plans[sha].plan)) for _, sha in new_files}
+for key in list(parsed_cache):
+    if key not in wanted:
+        del parsed_cache[key]
+to_parse = [
+    (name, raw_by_sha[sha], file_plans[sha].plan)
+    for name, sha in new_files
+    if (sha, plan_key(file_plans[sha].plan)) not in parsed_cache
+]
+if to_parse:
+    with st.spinner(f"Parsing {len(to_parse)} file(s)…"):
+        for (_, _, plan), pf in zip(to_parse, parse_uploads(to_parse)):
+            parsed_cache[(pf.file_sha256, plan_key(plan))] = pf
+parsed = [parsed_cache[(sha, plan_key(file_plans[sha].plan))] for _, sha in new_files]
+
+empty = [pf.name for pf in parsed if pf.rows == 0]
+if empty:
+    st.error(f"No rows found in {', '.join(empty)}. Is this a valid CSV or XML export?")
+parsed = [pf for pf in parsed if pf.rows > 0]
+if not parsed:
     st.stop()
 
+st.write(f"Rows found: **{sum(pf.rows for pf in parsed)}** in {len(parsed)} file(s)")
+
+if len(parsed) > 1:
+    # One discipline per file (the fallback for unknown sheet prefixes); defaults to the selection above
+    plan = st.data_editor(
+        [{"file": pf.name, "rows": pf.rows, "discipline": pf.discipline or discipline} for pf in parsed],
+        column_config={
+            "discipline": st.column_config.SelectboxColumn("discipline", options=DISCIPLINES, required=True)
+        },
+        disabled=["file", "rows"],
+        use_container_width=True,
+        hide_index=True,
+        key="import_plan",
+    )
+    for pf, row in zip(parsed, plan):
+        pf.discipline = row["discipline"]
+else:
+    parsed[0].discipline = discipline
+
 # Preview first 10 rows
 with st.expander("Preview first 10 rows"):
-    st.dataframe(rows[:10], use_container_width=True, hide_index=True)
+    names = [pf.name for pf in parsed]
+    shown = st.selectbox("File", names) if len(names) > 1 else names[0]
+    pf = parsed[names.index(shown)]
+    st.caption(f"Detected encoding: {pf.encoding}")
+    st.dataframe(pf.preview, use_container_width=True, hide_index=True)
 
 # ------------------------------------------------------------
 # Import
 # ------------------------------------------------------------
 if st.button("Import to database", type="primary"):
-    imported = 0
-    skipped = 0
-
     with session_scope() as s:
-        batch = ImportBatch(
+        results = import_files(
+            s,
+            parsed,
             project_id=project_id,
             milestone_id=milestone_id,
-            source_filename=uploaded.name,
             discipline=discipline,
-            row_count=len(rows),
+            default_tracked=default_tracked,
+            delta=delta,
+            infer_disciplines=infer_disciplines,
         )
-        s.add(batch)
-        s.flush()  # get batch.id without closing session
-        batch_id = batch.id
-
-        for r in rows:
-            # Build the core fields with flexible column names
-            sheet = _first_nonempty(r, ["Page Label", "Page", "Sheet", "sheet"])
-            author = _first_nonempty(r, ["Author", "Created By", "Creator", "author"])
-            subject = _first_nonempty(r, ["Subject", "Type", "Markup Type", "subject"])
-            comment_text = _first_nonempty(r, ["Comment", "Contents", "Text", "Comments", "Note", "comment_text"])
-            markup_id = _first_nonempty(r, ["Markup ID", "ID", "Annotation ID", "markup_id"])
-            created_str = _first_nonempty(r, ["Created", "Date", "Creation Date", "Timestamp", "created_at"])
-            created_at = _parse_datetime(created_str) or datetime.utcnow()
-
-            # Fingerprint for dedupe
-            fp = make_row_hash(
-                {
-                    "sheet": sheet,
-                    "author": author,
-                    "subject": subject,
-                    "comment_text": comment_text,
-                    "markup_id": markup_id,
-                    "created_at": created_str,
-                }
-            )
-
-            # Check duplicates using source_row_hash
-            exists = s.exec(
-                select(CommentItem).where(CommentItem.source_row_hash == fp)
-            ).first()
-
-            if exists:
-                skipped += 1
-                continue
-
-            item = CommentItem(
-                import_batch_id=batch_id,
-                project_id=project_id,
-                milestone_id=milestone_id,
-                discipline=discipline,
-                sheet=sheet,
-                subject=subject,
-                author=author,
-                created_at=created_at,
-                comment_text=comment_text,
-                markup_id=markup_id or None,
-                status_raw=_first_nonempty(r, ["Status", "State", "status_raw"]) or None,
-                source_row_hash=fp,
-            )
-            s.add(item)
-
-            # Also insert into the working Comment table so it appears in the dashboard
-            c = Comment(
-                project_id=project_id,
-                milestone_id=milestone_id,
-                discipline=discipline,
-                sheet=sheet,
-                subject=subject,
-                author=author,
-                created_at=created_at,
-                comment_text=comment_text,
-                status="Open",
-                tracked=bool(default_tracked),
-            )
-            s.add(c)
 
-            imported += 1
-
-    st.success(f"Imported {imported} items. Skipped {skipped} duplicates.")
-    st.caption("If you expected fewer items, your CSV likely contains extra non-comment rows. Use filters next if needed.")
+    # Related comments / carry-forward see the new rows right away. The index is
+    # append-only, so markup text changed in place means re-indexing the project.
+    if any(r.text_changed for r in results):
+        rebuild_index(project_id)
+    elif any(r.imported for r in results):
+        update_index(project_id)
+
+    imported = sum(r.imported for r in results)
+    skipped = sum(r.skipped for r in results)
+    msg = f"Imported {imported} items from {len(results)} file(s). Skipped {skipped} duplicates."
+    if delta:
+        msg += (
+            f" Updated {sum(r.changed for r in results)} changed markups "
+            f"({sum(r.unchanged for r in results)} unchanged)."
+        )
+    st.session_state["_import_results"] = {
+        "message": msg,
+        "files": [
+            {
+                "file": r.source_filename,
+                "batch": r.batch_id,
+                "rows": r.rows,
+                "imported": r.imported,
+                "skipped": r.skipped,
+                "changed": r.changed,
+                "unchanged": r.unchanged,
+            }
+            for r in results
+        ],
+    }
+    st.session_state.pop("_parsed_uploads", None)
     st.rerun()
@@ -4,21 +4,31 @@ from __future__ import annotations
 import datetime as dt
 from typing import Optional, List
 
-import pandas as pd
 import streamlit as st
 from sqlmodel import Session, select
 
-from src.db import get_engine
-from src.models import Project, Milestone, Comment
+from src.config import get_secret
+from src.db import get_engine, init_db
+from src.instrument import begin_rerun
+from src.llm_usage import run_budget
+from src.models import Project, Milestone
+from src.queries import apply_triage, bulk_update, load_comments, load_full_text, refresh_comments
+from src.similarity import apply_carry_forward, carry_forward_suggestions, similar_comments
+from src.startup import module_available
 
 st.set_page_config(page_title="Comments Dashboard", layout="wide")
+begin_rerun("Comments Dashboard")
+init_db()
 
 # -----------------------------
 # Optional AI import (safe)
+# src.llm is cheap to import; openai itself is only imported on the first AI call.
 # -----------------------------
 triage_comment_cached = None
 _ai_import_error = None
 try:
+    if not module_available("openai"):
+        raise ImportError("No module named 'openai'")
     from src.llm import triage_comment_cached  # type: ignore
 except Exception as e:
     triage_comment_cached = None
@@ -45,144 +55,6 @@ def _get_milestones(project_id: Optional[int]) -> list[Milestone]:
         return list(s.exec(stmt))
 
 
-def _load_comments(
-    project_id: Optional[int],
-    milestone_id: Optional[int],
-    discipline: str,
-    status: str,
-    tracked_filter: str,
-    search: str,
-) -> pd.DataFrame:
-    with Session(get_engine()) as s:
-        stmt = select(Comment)
-
-        if project_id:
-            stmt = stmt.where(Comment.project_id == project_id)
-        if milestone_id:
-            stmt = stmt.where(Comment.milestone_id == milestone_id)
-
-        if discipline != "All":
-            stmt = stmt.where(Comment.discipline == discipline)
-
-        if status != "All":
-            stmt = stmt.where(Comment.status == status)
-
-        if tracked_filter != "All":
-            stmt = stmt.where(Comment.tracked == (tracked_filter == "Tracked"))
-
-        if search.strip():
-            q = f"%{search.strip()}%"
-            stmt = stmt.where(
-                (Comment.comment_text.ilike(q))
-                | (Comment.sheet.ilike(q))
-                | (Comment.author.ilike(q))
-                | (Comment.tag.ilike(q))
-                | (Comment.required_response.ilike(q))
-            )
-
-        stmt = stmt.order_by(Comment.created_at.desc())
-
-        rows = list(s.exec(stmt))
-
-    # Build a dataframe with ALL columns we care about, including AI outputs
-    data = []
-    for r in rows:
-        data.append(
-            {
-                "select": False,  # checkbox column for selection
-                "id": r.id,
-                "discipline": r.discipline or "",
-                "sheet": r.sheet or "",
-                "subject": r.subject or "",
-                "author": r.author or "",
-                "created_at": r.created_at.isoformat(sep=" ", timespec="minutes") if r.created_at else "",
-                "status": r.status or "Open",
-                "tracked": bool(r.tracked),
-                "tag": r.tag or "",
-                "risk": r.risk or "",
-                "required_response": r.required_response or "",
-                "owner": r.owner or "",
-                "due_date": r.due_date.isoformat() if r.due_date else "",
-                "comment_text": r.comment_text or "",
-            }
-        )
-    return pd.DataFrame(data)
-
-
-def _bulk_update(
-    ids: list[int],
-    *,
-    status: Optional[str] = None,
-    tracked: Optional[bool] = None,
-    owner: Optional[str] = None,
-    due_date: Optional[dt.date] = None,
-    tag: Optional[str] = None,
-    risk: Optional[str] = None,
-) -> int:
-    if not ids:
-        return 0
-    with Session(get_engine()) as s:
-        stmt = select(Comment).where(Comment.id.in_(ids))
-        rows = list(s.exec(stmt))
-        for r in rows:
-            if status is not None:
-                r.status = status
-            if tracked is not None:
-                r.tracked = tracked
-            if owner is not None:
-                r.owner = owner
-            if due_date is not None:
-                r.due_date = due_date
-            if tag is not None:
-                r.tag = tag
-            if risk is not None:
-                r.risk = risk
-
-        s.add_all(rows)
-        s.commit()
-    return len(ids)
-
-
-def _apply_ai_to_selected(
-    selected_rows: pd.DataFrame,
-    milestone_name: str,
-) -> int:
-    """
-    Calls AI per selected row and saves:
-    tracked, tag, risk, required_response
-    """
-    if triage_comment_cached is None:
-        raise RuntimeError("AI is not available. openai package/key may be missing.")
-
-    updated = 0
-    with Session(get_engine()) as s:
-        for _, row in selected_rows.iterrows():
-            comment_id = int(row["id"])
-            obj = s.get(Comment, comment_id)
-            if not obj:
-                continue
-
-            result = triage_comment_cached(
-                comment_text=obj.comment_text or "",
-                sheet=obj.sheet or "",
-                discipline=obj.discipline or "",
-                milestone=milestone_name or "",
-            )
-
-            # Save results into DB
-            obj.tracked = bool(result.get("track", True))
-            obj.tag = str(result.get("tag", "") or "")
-            obj.risk = str(result.get("risk", "") or "")
-            obj.required_response = str(result.get("required_response", "") or "")
-
-            s.add(obj)
-            updated += 1
-
-        s.commit()
-
-    return updated
-
-
 # -----------------------------
 # UI
 # -----------------------------
@@ -235,25 +107,40 @@ with col_e:
     )
 
 search = st.text_input("Search (sheet, author, text, tag, required response)", value="")
+history = st.checkbox(
+    "Include archived comments",
+    value=False,
+    help="Closed comments past the archive threshold and comments of archived projects. They are read-only here.",
+)
 
-df = _load_comments(
+filters = dict(
     project_id=project_id,
     milestone_id=milestone_id,
     discipline=discipline,
     status=status,
     tracked_filter=tracked_filter,
     search=search,
+    history=history,
 )
+# Same filters as the last run: patch the cached frame from the change feed (bulk actions
+# and triage then cost the rows they touched, not a reload of the whole project).
+cached = st.session_state.get("_dashboard_frame")
+if cached is not None and cached["filters"] == filters:
+    df = refresh_comments(cached["df"], **filters)
+else:
+    df = load_comments(**filters)
+st.session_state["_dashboard_frame"] = {"filters": filters, "df": df}
 
 if df.empty:
     st.info("No comments found for the current filters.")
     st.stop()
 
-# Keep edited table state across reruns
-if "comments_editor" not in st.session_state:
-    st.session_state["comments_editor"] = df
-
-st.caption("Tip: Use the checkbox column to select comments, then use bulk actions or AI triage.")
+# The editor keeps its own edits across reruns under its key; the frame itself is not
+# copied into session_state.
+st.caption(
+    "Tip: Use the checkbox column to select comments, then use bulk actions or AI triage. "
+    "Long comments are shortened here; select rows to read them in full below."
+)
 
 edited_df = st.data_editor(
     df,
@@ -263,8 +150,9 @@ edited_df = st.data_editor(
     column_config={
         "select": st.column_config.CheckboxColumn("Select", help="Select rows for bulk actions / AI triage"),
         "id": st.column_config.NumberColumn("ID", disabled=True, width="small"),
-        "comment_text": st.column_config.TextColumn("Comment", width="large"),
-        "required_response": st.column_config.TextColumn("Required Response", width="large"),
+        "created_at": st.column_config.DatetimeColumn("Created", format="YYYY-MM-DD HH:mm"),
+        "comment_text": st.column_config.TextColumn("Comment (preview)", width="large"),
+        "required_response": st.column_config.TextColumn("Required Response (preview)", width="large"),
         "tracked": st.column_config.CheckboxColumn("Tracked"),
     },
     disabled=["id"],  # allow editing most fields directly if you want
@@ -272,12 +160,58 @@ edited_df = st.data_editor(
 
 selected_rows = edited_df[edited_df["select"] == True].copy()
 
+FULL_TEXT_ROWS = 50
+if not selected_rows.empty:
+    with st.expander(f"Full text of selected comments ({len(selected_rows)})", expanded=False):
+        shown = selected_rows.head(FULL_TEXT_ROWS)
+        full = load_full_text(shown["id"].astype(int).tolist())
+        for row in shown.itertuples():
+            text = full.get(int(row.id), {})
+            st.markdown(f"**#{row.id}** · {row.sheet} · {row.author}")
+            st.text(text.get("comment_text", ""))
+            if text.get("required_response"):
+                st.caption(f"Required response: {text['required_response']}")
+        if len(selected_rows) > FULL_TEXT_ROWS:
+            st.caption(f"Showing the first {FULL_TEXT_ROWS}.")
+
+    with st.expander("Related comments (first selected)", expanded=False):
+        first_id = int(selected_rows["id"].iloc[0])
+        # The expander body runs on every rerun, open or not: look the neighbours up once
+        # per comment and data version.
+        related_key = (project_id, first_id, df.attrs.get("data_version"))
+        cached_related = st.session_state.get("_related_comments")
+        if cached_related is None or cached_related["key"] != related_key or related_key[2] is None:
+            cached_related = {"key": related_key, "rows": similar_comments(project_id, comment_id=first_id, k=5)}
+            st.session_state["_related_comments"] = cached_related
+        related = cached_related["rows"]
+        if not related:
+            st.caption(f"No similar comments found for #{first_id}.")
+        else:
+            full = load_full_text([r["comment_id"] for r in related])
+            milestone_names = {m.id: m.name for m in milestones}
+            st.dataframe(
+                [
+                    {
+                        "ID": r["comment_id"],
+                        "Milestone": milestone_names.get(r["milestone_id"], ""),
+                        "Score": r["score"],
+                        "Comment": full.get(r["comment_id"], {}).get("comment_text", ""),
+                        "Owner": r["owner"],
+                        "Tag": r["tag"],
+                        "Required Response": r["required_response"],
+                    }
+                    for r in related
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
 # -----------------------------
 # Bulk actions panel
 # -----------------------------
 st.subheader("Bulk Actions")
 
-b1, b2, b3, b4, b5, b6 = st.columns([1.2, 1.2, 1.2, 1.2, 1.2, 2])
+b1, b2, b3, b4, b5, b6, b7 = st.columns([1.2, 1.2, 1.2, 1.2, 1.2, 1.2, 1.2])
 
 with b1:
     new_status = st.selectbox("Set Status", ["(no change)", "Open", "Needs Response", "In Progress", "Implemented", "Closed"])
@@ -291,6 +225,12 @@ with b5:
     new_tag = st.selectbox("Set Tag", ["(no change)", "RFI", "DECISION", "COORD", "CODE", "COST", "SCHED", "QA", "OTHER"])
 with b6:
     new_risk = st.selectbox("Set Risk", ["(no change)", "LOW", "MED", "HIGH"])
+with b7:
+    new_discipline = st.selectbox(
+        "Set Discipline",
+        ["(no change)", "A", "S", "M", "E", "CIV", "FP", "OTHER"],
+        help="Also remembered for these sheets' prefixes on future imports.",
+    )
 
 apply_bulk = st.button("Apply Bulk Changes", type="primary", use_container_width=True)
 
@@ -314,8 +254,9 @@ if apply_bulk:
 
         _tag = None if new_tag == "(no change)" else new_tag
         _risk = None if new_risk == "(no change)" else new_risk
+        _discipline = None if new_discipline == "(no change)" else new_discipline
 
-        count = _bulk_update(
+        count = bulk_update(
             ids,
             status=_status,
             tracked=_tracked,
@@ -323,10 +264,46 @@ if apply_bulk:
             due_date=_due,
             tag=_tag,
             risk=_risk,
+            discipline=_discipline,
         )
         st.success(f"Updated {count} comments.")
         st.rerun()
 
+# -----------------------------
+# Carry forward from earlier milestones
+# -----------------------------
+if milestone_id is not None and not history:
+    with st.expander("🔁 Carry forward from earlier milestones", expanded=False):
+        st.caption(
+            f"For comments in **{milestone_name}** without a required response, owner or tag, find the most similar "
+            "comment of the project's earlier milestones and reuse its values."
+        )
+        min_score = st.slider("Minimum similarity", 0.3, 1.0, 0.6, 0.05)
+        if st.button("Find suggestions"):
+            with st.spinner("Matching comments…"):
+                st.session_state["_carry_forward"] = {
+                    "milestone_id": milestone_id,
+                    "rows": carry_forward_suggestions(project_id, milestone_id, min_score=min_score),
+                }
+        found = st.session_state.get("_carry_forward")
+        if found is not None and found["milestone_id"] == milestone_id:
+            if not found["rows"]:
+                st.info("No suggestions above the threshold.")
+            else:
+                picked = st.data_editor(
+                    [{"apply": True, **r} for r in found["rows"]],
+                    column_config={"apply": st.column_config.CheckboxColumn("Apply")},
+                    disabled=["comment_id", "source_id", "score", "required_response", "owner", "tag"],
+                    use_container_width=True,
+                    hide_index=True,
+                    key="carry_forward_editor",
+                )
+                if st.button("Apply selected suggestions", type="primary"):
+                    changed = apply_carry_forward([r for r in picked if r["apply"]])
+                    st.session_state.pop("_carry_forward", None)
+                    st.success(f"Carried forward to {changed} comments.")
+                    st.rerun()
+
 # -----------------------------
 # AI Triage panel
 # -----------------------------
@@ -342,7 +319,7 @@ if triage_comment_cached is None:
         with st.expander("AI import error (for troubleshooting)"):
             st.code(_ai_import_error)
 else:
-    if "OPENAI_API_KEY" not in st.secrets:
+    if not get_secret("OPENAI_API_KEY"):
         st.warning("OPENAI_API_KEY is missing in Streamlit Secrets. Add it to enable AI calls.")
     else:
         ai_col1, ai_col2 = st.columns([1.5, 3])
@@ -360,8 +337,23 @@ else:
                 else:
                     milestone_for_ai = milestone_name
 
+                budget = run_budget()
                 with st.spinner("Running AI triage on selected comments..."):
-                    updated = _apply_ai_to_selected(selected_rows, milestone_for_ai)
-
+                    updated = apply_triage(
+                        selected_rows["id"].astype(int).tolist(),
+                        milestone_for_ai,
+                        triage_comment_cached,
+                        budget=budget,
+                    )
+
+                if budget is not None and budget.stopped:
+                    st.session_state["_triage_notice"] = (
+                        f"AI triage stopped at the token budget ({budget.used:,} of {budget.max_tokens:,} tokens): "
+                        f"{updated} comments triaged, {budget.skipped} left. Raise TRIAGE_TOKEN_BUDGET to triage more per run."
+                    )
                 st.success(f"AI triage applied to {updated} comments.")
                 st.rerun()
+
+        notice = st.session_state.pop("_triage_notice", None)
+        if notice:
+            st.warning(notice)
@@ -1,12 +1,20 @@
+import io
+
+import pandas as pd
 import streamlit as st
 from sqlmodel import select
 
 from src.auth import require_login
 from src.db import init_db, session_scope
-from src.exporters import build_consultant_package, comments_to_dataframe
-from src.models import Project, Milestone, CommentItem
+from src.instrument import begin_rerun
+from src.exporters import DEFAULT_GROUPING, PACKAGE_GROUPS
+from src.models import Project, Milestone
+from src.package_batch import BATCH_PARTITIONS, write_package_zip
+from src.package_cache import package_artifacts
+from src.queries import package_filter_options
 
 st.set_page_config(page_title="Consultant Package", layout="wide")
+begin_rerun("Consultant Package")
 init_db()
 require_login()
 
@@ -32,39 +40,30 @@ if miles:
     mile_label = st.selectbox("Milestone", list(mile_map.keys()))
     milestone_id = mile_map[mile_label]
 
-with session_scope() as s:
-    q = select(CommentItem).where(CommentItem.project_id == project_id)
-    if milestone_id:
-        q = q.where(CommentItem.milestone_id == milestone_id)
-    items = s.exec(q).all()
-
-if not items:
+options = package_filter_options(project_id, milestone_id)
+if not options["discipline"] and not options["status"]:
     st.info("No items yet.")
     st.stop()
 
 # Filters
 st.subheader("Filter")
 
-def uniq(vals):
-    return sorted({v for v in vals if v not in (None, "")})
-
-disciplines = ["(All)"] + uniq([i.discipline for i in items])
-statuses = ["(All)"] + uniq([i.status for i in items])
+disciplines = ["(All)"] + options["discipline"]
+statuses = ["(All)"] + options["status"]
 
 c1, c2, c3 = st.columns([1.2,1.2,1.2])
 f_disc = c1.selectbox("Discipline", disciplines)
 f_status = c2.selectbox("Status", statuses, index=statuses.index("Needs Response") if "Needs Response" in statuses else 0)
 tracked_only = c3.checkbox("Tracked only", value=True)
+group_by = st.multiselect(
+    "Group by",
+    list(PACKAGE_GROUPS),
+    default=list(DEFAULT_GROUPING),
+    format_func=lambda g: PACKAGE_GROUPS[g][0],
+    help="Nested in the order chosen.",
+)
 
-filtered = items
-if f_disc != "(All)":
-    filtered = [i for i in filtered if i.discipline == f_disc]
-if f_status != "(All)":
-    filtered = [i for i in filtered if i.status == f_status]
-if tracked_only:
-    filtered = [i for i in filtered if i.tracked]
-
-st.write(f"Items in package: **{len(filtered)}**")
+count_slot = st.empty()
 
 header = st.text_area(
     "Header / intro (optional)",
@@ -72,27 +71,70 @@ header = st.text_area(
     height=90,
 )
 
-package_text = build_consultant_package(filtered, header=header)
+# Rendered text/CSV are cached per filters + header + data version (src/package_cache.py).
+artifacts = package_artifacts(
+    project_id,
+    milestone_id,
+    discipline=None if f_disc == "(All)" else f_disc,
+    status=None if f_status == "(All)" else f_status,
+    tracked_only=tracked_only,
+    group_by=group_by,
+    header=header,
+)
+package_txt, package_csv = artifacts["txt"], artifacts["csv"]
+
+count_slot.write(f"Items in package: **{package_txt.rows}**")
 
 st.subheader("Package text")
-st.code(package_text, language="text")
+st.code(package_txt.data.decode("utf-8"), language="text")
 
 st.download_button(
     "Download package as .txt",
-    data=package_text.encode("utf-8"),
+    data=package_txt.data,
     file_name="consultant_response_package.txt",
     mime="text/plain",
 )
 
 st.subheader("Export as CSV")
-import pandas as pd
-
-df = comments_to_dataframe(filtered)
-st.dataframe(df, use_container_width=True)
+st.dataframe(pd.read_csv(io.BytesIO(package_csv.data), keep_default_na=False), use_container_width=True)
 
 st.download_button(
     "Download CSV",
-    data=df.to_csv(index=False).encode("utf-8"),
+    data=package_csv.data,
     file_name="consultant_package.csv",
     mime="text/csv",
 )
+
+st.subheader("Batch export")
+st.caption("One ZIP with a text + CSV package per discipline or owner, using the status, tracked and grouping options above.")
+b1, b2 = st.columns([1.2, 2.4])
+partition_by = b1.radio(
+    "One package per", list(BATCH_PARTITIONS), format_func=lambda g: PACKAGE_GROUPS[g][0], horizontal=True
+)
+if b2.button("Build ZIP"):
+    buf = io.BytesIO()
+    manifest = write_package_zip(
+        buf,
+        project_id,
+        milestone_id,
+        partition_by=partition_by,
+        discipline=None if f_disc == "(All)" or partition_by == "discipline" else f_disc,
+        status=None if f_status == "(All)" else f_status,
+        tracked_only=tracked_only,
+        group_by=group_by,
+        header=header,
+    )
+    st.session_state["_package_zip"] = (partition_by, buf.getvalue(), manifest)
+
+if "_package_zip" in st.session_state:
+    zipped_by, zip_bytes, manifest = st.session_state["_package_zip"]
+    st.dataframe(
+        [{PACKAGE_GROUPS[zipped_by][0]: p["name"], "Items": p["items"]} for p in manifest["packages"]],
+        hide_index=True,
+    )
+    st.download_button(
+        f"Download {len(manifest['packages'])} packages (.zip)",
+        data=zip_bytes,
+        file_name=f"consultant_packages_by_{zipped_by}.zip",
+        mime="application/zip",
+    )
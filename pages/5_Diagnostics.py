@@ -0,0 +1,135 @@
+# pages/5_Diagnostics.py
+from __future__ import annotations
+
+import pandas as pd
+import streamlit as st
+
+from src.auth import require_login
+from src.config import get_secret
+from src.db import init_db
+from src.instrument import begin_rerun, clear_spans, export_spans, process_spans, session_spans
+from src.llm_usage import triage_usage
+from src.querylog import get_threshold_ms, reset_query_log, set_threshold_ms, slow_queries, statement_stats
+from src.startup import startup_report
+
+st.set_page_config(page_title="Diagnostics", layout="wide")
+begin_rerun("Diagnostics")
+init_db()
+require_login()
+
+st.title("Diagnostics")
+st.caption(
+    "Timing spans recorded on the hot paths: SQL statements, DB sessions, import stages, "
+    "dashboard query/frame build, AI triage and exporters. Newest reruns first."
+)
+
+source = st.radio(
+    "Spans from",
+    ["This session", "Background / scripts (process-wide)"],
+    horizontal=True,
+)
+spans = session_spans() if source == "This session" else process_spans()
+
+# -----------------------------
+# SQL: slow-query log + per-statement aggregates (process-wide)
+# -----------------------------
+st.subheader("SQL statements (this server process)")
+q1, q2 = st.columns([1, 1])
+threshold = q1.number_input("Slow-query threshold (ms)", min_value=0.0, value=float(get_threshold_ms()), step=50.0)
+if threshold != get_threshold_ms():
+    set_threshold_ms(threshold)
+if q2.button("Reset SQL stats"):
+    reset_query_log()
+    st.rerun()
+
+stats = statement_stats()
+if stats:
+    st.caption("Grouped by normalized statement. A shape with many calls per page load is usually an N+1 loop.")
+    st.dataframe(stats[:100], use_container_width=True, hide_index=True)
+
+slow = slow_queries()
+st.markdown(f"**Slow queries** (≥ {get_threshold_ms():g} ms): {len(slow)}")
+for entry in slow[:20]:
+    with st.expander(f"{entry['ms']:.1f} ms — {entry['normalized'][:120]}"):
+        st.code(entry["statement"], language="sql")
+        st.caption(f"Parameters: {entry['params']}")
+        st.text(entry["plan"] or "(no plan captured)")
+
+# -----------------------------
+# AI triage usage (triage_call table, all processes)
+# -----------------------------
+st.subheader("AI triage usage")
+u1, u2 = st.columns([1, 1])
+usage_by = u1.radio("Totals per", ["project", "milestone", "model"], horizontal=True)
+usage_days = u2.number_input("Last N days (0 = all)", min_value=0, value=30, step=7)
+usage = triage_usage(usage_by, days=int(usage_days) or None)
+if usage.empty:
+    st.caption("No AI triage calls recorded yet.")
+else:
+    st.dataframe(usage.round({"cache_hit_rate": 3, "p50_ms": 1, "p95_ms": 1, "est_cost_usd": 4}), use_container_width=True, hide_index=True)
+    st.caption(
+        f"Estimated cost: ${usage['est_cost_usd'].sum():,.4f} for {int(usage['total_tokens'].sum()):,} tokens. "
+        "Cache hits cost nothing; models without a known price show no cost (set LLM_PRICES)."
+    )
+
+if not spans:
+    st.info("No spans recorded yet. Use the other pages, then come back here.")
+    st.stop()
+
+df = pd.DataFrame(spans)
+for col in ("rerun", "page", "rows", "bytes"):
+    if col not in df.columns:
+        df[col] = None
+df["area"] = df["name"].str.split(".").str[0]
+
+# -----------------------------
+# Per-rerun breakdown
+# -----------------------------
+st.subheader("Per-rerun breakdown (ms)")
+if df["rerun"].notna().any():
+    reruns = df[df["rerun"].notna()]
+    breakdown = reruns.pivot_table(index=["rerun", "page"], columns="area", values="ms", aggfunc="sum", fill_value=0.0)
+    sql_counts = reruns[reruns["name"] == "sql"].groupby(["rerun", "page"]).size().rename("sql statements")
+    started = reruns.groupby(["rerun", "page"])["ts"].min().rename("started")
+    breakdown = breakdown.join(sql_counts).join(started).fillna({"sql statements": 0})
+    breakdown = breakdown.sort_values("started", ascending=False).drop(columns="started")
+    st.dataframe(breakdown.round(2), use_container_width=True)
+    st.caption(
+        "`db` is total time inside session_scope (SQL + ORM hydration + commit); "
+        "`dashboard.query` minus its `sql` time is roughly ORM hydration."
+    )
+else:
+    st.caption("Process-wide spans are not tied to a page rerun.")
+
+# -----------------------------
+# Per-span summary
+# -----------------------------
+st.subheader("By span")
+summary = df.groupby("name").agg(
+    calls=("ms", "size"),
+    total_ms=("ms", "sum"),
+    p50_ms=("ms", "median"),
+    p95_ms=("ms", lambda s: s.quantile(0.95)),
+    rows=("rows", "sum"),
+    bytes=("bytes", "sum"),
+)
+st.dataframe(summary.sort_values("total_ms", ascending=False).round(2), use_container_width=True)
+
+with st.expander("Most recent spans"):
+    st.dataframe(df.tail(200).iloc[::-1], use_container_width=True, hide_index=True)
+
+with st.expander("Startup timings (this server process)"):
+    st.dataframe(startup_report(), use_container_width=True, hide_index=True)
+
+# -----------------------------
+# Export / reset
+# -----------------------------
+st.subheader("Export")
+c1, c2, c3 = st.columns([3, 1, 1])
+metrics_path = c1.text_input("Metrics file (JSON lines, appended)", value=get_secret("METRICS_PATH", "/tmp/bluebeam_metrics.jsonl"))
+if c2.button("Append to file", use_container_width=True):
+    n = export_spans(metrics_path, spans)
+    st.success(f"Wrote {n} spans to {metrics_path}")
+if c3.button("Clear spans", use_container_width=True):
+    clear_spans()
+    st.rerun()
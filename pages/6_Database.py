@@ -0,0 +1,119 @@
+# pages/6_Database.py
+from __future__ import annotations
+
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from src.auth import require_login
+from src.db import get_engine, init_db
+from src.instrument import begin_rerun
+from src.maintenance import (
+    TASKS,
+    database_report,
+    due_tasks,
+    idle_seconds,
+    last_run,
+    run_task,
+    scheduler_running,
+    task_interval,
+)
+
+st.set_page_config(page_title="Database", layout="wide")
+begin_rerun("Database")
+init_db()
+require_login()
+
+st.title("Database")
+st.caption(
+    "Sizes, row counts and fragmentation of the app's tables and indexes, and the maintenance "
+    "tasks the idle scheduler runs (statistics, space reclamation, integrity checks, change-feed pruning)."
+)
+
+# -----------------------------
+# Maintenance tasks
+# -----------------------------
+st.subheader("Maintenance")
+if scheduler_running():
+    st.caption(f"Idle scheduler running in this process; no app queries for {idle_seconds():,.0f} s.")
+else:
+    st.caption("The idle scheduler is off (MAINTENANCE_SCHEDULER=false); run tasks here instead.")
+
+due = set(due_tasks())
+task_rows = []
+for name, (description, _, _, _) in TASKS.items():
+    last = last_run(name) or {}
+    interval = task_interval(name)
+    task_rows.append(
+        {
+            "task": name,
+            "description": description,
+            "every (h)": interval.total_seconds() / 3600 if interval else None,
+            "last run (UTC)": last.get("at", ""),
+            "ms": last.get("ms"),
+            "ok": last.get("ok"),
+            "due": name in due,
+            "result": str(last.get("detail", "")),
+        }
+    )
+st.dataframe(task_rows, use_container_width=True, hide_index=True)
+
+cols = st.columns(len(TASKS))
+for col, name in zip(cols, TASKS):
+    if col.button(f"Run {name} now", use_container_width=True):
+        with st.spinner(f"Running {name}..."):
+            outcome = run_task(get_engine(), name)
+        if outcome["ok"]:
+            st.success(f"{name}: done in {outcome['ms']:,.0f} ms — {outcome['detail']}")
+        else:
+            st.error(f"{name} failed: {outcome['detail']}")
+
+if (last_run("vacuum") or {}).get("detail", {}).get("needs_full_vacuum"):
+    st.warning(
+        "This SQLite file was created without incremental auto-vacuum, so free pages can't be released "
+        "in the background. Converting it is a one-time full VACUUM that locks the database until it "
+        "finishes; run it when nobody is using the app."
+    )
+    if st.button("Convert with a full VACUUM now"):
+        with st.spinner("Rewriting the database file..."):
+            outcome = run_task(get_engine(), "vacuum", allow_full=True)
+        if outcome["ok"]:
+            st.success(f"vacuum: done in {outcome['ms']:,.0f} ms — {outcome['detail']}")
+        else:
+            st.error(f"vacuum failed: {outcome['detail']}")
+
+# -----------------------------
+# Size report
+# -----------------------------
+st.subheader("Tables and indexes")
+with st.spinner("Measuring..."):
+    report = database_report(get_engine())
+summary = report["summary"]
+
+m1, m2, m3, m4 = st.columns(4)
+if summary["backend"] == "sqlite":
+    m1.metric("File size", f"{summary['file_bytes'] / 1048576:,.1f} MB")
+    m2.metric("Free pages", f"{summary['free_pages']:,}", f"{summary['free_pct']:.1f}% of file", delta_color="off")
+    m3.metric("WAL", f"{summary['wal_bytes'] / 1048576:,.1f} MB")
+    m4.metric("auto_vacuum", summary["auto_vacuum"])
+    st.caption(
+        f"{summary['path']} · journal_mode={summary['journal_mode']} · page size {summary['page_size']:,} B · "
+        + ("statistics present" if summary["analyzed"] else "never analyzed")
+    )
+else:
+    m1.metric("Database size", f"{summary['database_bytes'] / 1048576:,.1f} MB")
+    m2.metric("Database", summary["database"])
+    m3.metric("Statistics", "all tables analyzed" if summary["analyzed"] else "some tables never analyzed")
+
+objects = pd.DataFrame(report["objects"])
+if objects.empty:
+    st.info("No tables yet.")
+else:
+    objects["MB"] = objects["bytes"].astype(float) / 1048576
+    view = objects.drop(columns=["bytes"]).sort_values("MB", ascending=False, na_position="last")
+    st.dataframe(view.round({"MB": 3}), use_container_width=True, hide_index=True)
+    st.caption(
+        "Fragmentation: unused share of the object's pages (SQLite) or dead-tuple share of the table "
+        f"(PostgreSQL). Measured {datetime.utcnow().isoformat(timespec='seconds')}Z."
+    )
@@ -0,0 +1,458 @@
+# src/api.py
+"""
+Headless HTTP API over the data layer (stdlib server, JSON in/out).
+
+    python -m src.api --port 8502
+
+Endpoints (all project-scoped reads carry an ETag and honour If-None-Match):
+
+    GET  /health
+    GET  /projects
+    GET  /projects/{id}/milestones
+    GET  /projects/{id}/comments?limit=&offset=&<filters>       paged rows, newest first
+    GET  /projects/{id}/comments/count?group_by=&<filters>      status|tracked|discipline|milestone_id
+    GET  /projects/{id}/comments.csv?<filters>                  streamed CSV export
+    GET  /projects/{id}/package?<filters>&header=&tracked_only=&group_by=sheet,owner
+                                                                 consultant package text
+    GET  /projects/{id}/changes?since=<version>                  comment ids changed since then
+    POST /projects/{id}/comments/bulk   {"ids": [...], "status": ..., "tracked": ..., ...}
+
+Filters: milestone_id, discipline, status, tracked (true|false), search, history (true to
+include archived comments; see src/archive.py).
+
+ETags are derived from the project's data_version (src/versions.py) plus the request, so
+answering "not modified" costs one primary-key read; full responses for current ETags
+are also kept in a small in-process cache. Set API_TOKEN to require
+"Authorization: Bearer <token>"; without it the server only binds to localhost.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime as dt
+import hashlib
+import hmac
+import io
+import json
+import re
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from sqlmodel import select
+
+from src.config import get_secret
+from src.db import init_db, session_scope
+from src.exporters import DEFAULT_GROUPING, EXPORT_COLUMNS, PACKAGE_GROUPS, export_rows, write_package
+from src.instrument import record, span
+from src.models import Comment, Milestone, Project
+from src.queries import (
+    COUNT_GROUPS,
+    bulk_update,
+    count_comments,
+    iter_comments,
+    iter_package_items,
+    page_comments,
+)
+from src.versions import changes_since, data_version
+
+MAX_PAGE = 1000
+DEFAULT_PAGE = 100
+CACHE_ENTRIES = 128
+
+_LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+_BULK_FIELDS = ("status", "tracked", "owner", "due_date", "tag", "risk", "discipline")
+
+_cache_lock = threading.Lock()
+_responses: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---- helpers -----------------------------------------------------------------
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    raise TypeError(f"not JSON serializable: {type(value).__name__}")
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def _row_dict(row: Any) -> Dict[str, Any]:
+    return dict(row._mapping)
+
+
+def _int_param(params: Dict[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    value = params.get(name, "")
+    if value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def _bool_param(params: Dict[str, str], name: str) -> Optional[bool]:
+    value = params.get(name, "").strip().lower()
+    if value in ("", "all"):
+        return None
+    if value in ("1", "true", "yes"):
+        return True
+    if value in ("0", "false", "no"):
+        return False
+    raise ApiError(400, f"{name} must be true or false")
+
+
+def _filters(project_id: int, params: Dict[str, str]) -> Dict[str, Any]:
+    """Query parameters -> keyword arguments of src.queries.filter_comments."""
+    tracked = _bool_param(params, "tracked")
+    return {
+        "project_id": project_id,
+        "milestone_id": _int_param(params, "milestone_id"),
+        "discipline": params.get("discipline") or "All",
+        "status": params.get("status") or "All",
+        "tracked_filter": "All" if tracked is None else ("Tracked" if tracked else "Untracked"),
+        "search": params.get("search", ""),
+        "history": bool(_bool_param(params, "history")),
+    }
+
+
+def _etag(project_id: int, version: int, path: str, params: Dict[str, str]) -> str:
+    key = json.dumps([path, sorted(params.items())], ensure_ascii=False)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return f'"p{project_id}-v{version}-{digest}"'
+
+
+def _cached(etag: str) -> Optional[Tuple[str, bytes]]:
+    with _cache_lock:
+        hit = _responses.get(etag)
+        if hit is not None:
+            _responses.move_to_end(etag)
+        return hit
+
+
+def _remember(etag: str, content_type: str, body: bytes) -> None:
+    with _cache_lock:
+        _responses[etag] = (content_type, body)
+        _responses.move_to_end(etag)
+        while len(_responses) > CACHE_ENTRIES:
+            _responses.popitem(last=False)
+
+
+def _project_version(project_id: int) -> int:
+    with session_scope() as s:
+        version = data_version(s, project_id)
+    if version is None:
+        raise ApiError(404, f"project {project_id} not found")
+    return version
+
+
+# ---- endpoints ---------------------------------------------------------------
+# Each returns (content_type, body). Project-scoped GETs get ETags in the handler.
+def _projects(params: Dict[str, str]) -> Tuple[str, bytes]:
+    with session_scope() as s:
+        rows = s.exec(select(Project).order_by(Project.is_active.desc(), Project.name)).all()
+        items = [r.model_dump() for r in rows]
+    return "application/json", _dumps({"items": items})
+
+
+def _milestones(project_id: int, params: Dict[str, str]) -> Tuple[str, bytes]:
+    with session_scope() as s:
+        rows = s.exec(
+            select(Milestone).where(Milestone.project_id == project_id).order_by(Milestone.created_at.desc())
+        ).all()
+        items = [r.model_dump() for r in rows]
+    return "application/json", _dumps({"items": items})
+
+
+def _comments(project_id: int, params: Dict[str, str]) -> Tuple[str, bytes]:
+    limit = max(1, min(MAX_PAGE, _int_param(params, "limit", DEFAULT_PAGE)))
+    offset = max(0, _int_param(params, "offset", 0))
+    with session_scope() as s:
+        rows = page_comments(s, _filters(project_id, params), limit=limit + 1, offset=offset)
+    more = len(rows) > limit
+    payload = {
+        "items": [_row_dict(r) for r in rows[:limit]],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if more else None,
+    }
+    return "application/json", _dumps(payload)
+
+
+def _count(project_id: int, params: Dict[str, str]) -> Tuple[str, bytes]:
+    group_by = params.get("group_by") or None
+    if group_by is not None and group_by not in COUNT_GROUPS:
+        raise ApiError(400, f"group_by must be one of {', '.join(COUNT_GROUPS)}")
+    with session_scope() as s:
+        payload = count_comments(s, _filters(project_id, params), group_by)
+    return "application/json", _dumps(payload)
+
+
+def _package(project_id: int, params: Dict[str, str]) -> Tuple[str, bytes]:
+    group_by = tuple(g for g in (params.get("group_by") or ",".join(DEFAULT_GROUPING)).split(",") if g)
+    unknown = [g for g in group_by if g not in PACKAGE_GROUPS]
+    if unknown:
+        raise ApiError(400, f"group_by must be a comma-separated list of {', '.join(PACKAGE_GROUPS)}")
+    items = iter_package_items(
+        project_id,
+        _int_param(params, "milestone_id"),
+        discipline=params.get("discipline") or None,
+        status=params.get("status") or None,
+        tracked_only=bool(_bool_param(params, "tracked_only")),
+        group_by=group_by,
+    )
+    out = io.StringIO()
+    write_package(items, out, params.get("header", ""), group_by)
+    return "text/plain; charset=utf-8", out.getvalue().encode("utf-8")
+
+
+def _changes(project_id: int, params: Dict[str, str]) -> Tuple[str, bytes]:
+    since = _int_param(params, "since", 0)
+    with session_scope() as s:
+        version, ids = changes_since(s, project_id, since)
+    payload = {"version": version, "reload": ids is None, "ids": sorted(ids or [])}
+    return "application/json", _dumps(payload)
+
+
+_GET_ROUTES: List[Tuple[re.Pattern, Callable[..., Tuple[str, bytes]]]] = [
+    (re.compile(r"^/projects/(\d+)/milestones$"), _milestones),
+    (re.compile(r"^/projects/(\d+)/comments$"), _comments),
+    (re.compile(r"^/projects/(\d+)/comments/count$"), _count),
+    (re.compile(r"^/projects/(\d+)/package$"), _package),
+    (re.compile(r"^/projects/(\d+)/changes$"), _changes),
+]
+_CSV_ROUTE = re.compile(r"^/projects/(\d+)/comments\.csv$")
+_BULK_ROUTE = re.compile(r"^/projects/(\d+)/comments/bulk$")
+
+
+def _bulk(project_id: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    ids = body.get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        raise ApiError(400, "ids must be a list of integers")
+    changes = {k: body[k] for k in _BULK_FIELDS if body.get(k) is not None}
+    unknown = set(body) - set(_BULK_FIELDS) - {"ids"}
+    if unknown:
+        raise ApiError(400, f"unknown fields: {', '.join(sorted(unknown))}")
+    if "due_date" in changes:
+        try:
+            changes["due_date"] = dt.date.fromisoformat(str(changes["due_date"]))
+        except ValueError:
+            raise ApiError(400, "due_date must be YYYY-MM-DD")
+    if "tracked" in changes and not isinstance(changes["tracked"], bool):
+        raise ApiError(400, "tracked must be true or false")
+
+    # Only comments of this project; ids from elsewhere are ignored, not updated.
+    with session_scope() as s:
+        own = list(s.exec(select(Comment.id).where(Comment.project_id == project_id).where(Comment.id.in_(ids))))
+    updated = bulk_update(own, **changes) if changes else 0
+    return {"updated": updated, "data_version": _project_version(project_id)}
+
+
+# ---- server ------------------------------------------------------------------
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "BluebeamConsolidatorAPI/1"
+    protocol_version = "HTTP/1.1"
+
+    def _authorized(self) -> bool:
+        token = get_secret("API_TOKEN").strip()
+        if not token:
+            return True
+        supplied = self.headers.get("Authorization", "")
+        return hmac.compare_digest(supplied, f"Bearer {token}")
+
+    def _send(self, status: int, content_type: str, body: bytes, etag: str = "") -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # revalidate, then 304
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, "application/json", _dumps({"error": message}))
+
+    def _route(self) -> Tuple[str, Dict[str, str]]:
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        return parts.path.rstrip("/") or "/", params
+
+    def _read_body(self) -> bytes:
+        # Read in full before any answer, so a keep-alive connection's next request starts
+        # where it should rather than inside this one's body.
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise ApiError(400, "invalid Content-Length")
+        return self.rfile.read(length) if length > 0 else b""
+
+    def _dispatch(self, fn: Callable[[], None]) -> None:
+        if not self._authorized():
+            if self.headers.get("Content-Length", "0").strip() not in ("", "0"):
+                self.close_connection = True  # rather than read an unauthenticated body
+            self._error(401, "missing or invalid bearer token")
+            return
+        try:
+            fn()
+        except ApiError as exc:
+            self._error(exc.status, str(exc))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away mid-stream
+        except Exception as exc:  # noqa: BLE001
+            # Details go to the server's stderr and span buffer, not to the client.
+            traceback.print_exc()
+            record(
+                "api.error", 0.0, method=self.command, path=urlsplit(self.path).path, error=f"{type(exc).__name__}: {exc}"
+            )
+            self._error(500, "internal server error")
+
+    def do_GET(self):  # noqa: N802
+        self._dispatch(self._get)
+
+    def do_HEAD(self):  # noqa: N802
+        self._dispatch(self._get)
+
+    def do_POST(self):  # noqa: N802
+        self._dispatch(self._post)
+
+    def _get(self) -> None:
+        path, params = self._route()
+        if path == "/health":
+            self._send(200, "application/json", _dumps({"ok": True}))
+            return
+        if path == "/projects":
+            self._send(200, *_projects(params))
+            return
+
+        m = _CSV_ROUTE.match(path)
+        if m:
+            self._stream_csv(int(m.group(1)), params)
+            return
+
+        for pattern, endpoint in _GET_ROUTES:
+            m = pattern.match(path)
+            if not m:
+                continue
+            project_id = int(m.group(1))
+            etag = _etag(project_id, _project_version(project_id), path, params)
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                self._send(304, "", b"", etag)
+                return
+            hit = _cached(etag)
+            if hit is None:
+                with span("api.get", path=pattern.pattern):
+                    hit = endpoint(project_id, params)
+                _remember(etag, *hit)
+            self._send(200, hit[0], hit[1], etag)
+            return
+        self._error(404, f"no route for {path}")
+
+    def _stream_csv(self, project_id: int, params: Dict[str, str]) -> None:
+        etag = _etag(project_id, _project_version(project_id), "/comments.csv", params)
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self._send(304, "", b"", etag)
+            return
+        filters = _filters(project_id, params)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Disposition", f'attachment; filename="project_{project_id}_comments.csv"')
+        self.send_header("ETag", etag)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(EXPORT_COLUMNS))
+        writer.writeheader()
+        with span("api.export", project_id=project_id) as sp:
+            rows = 0
+            try:
+                with session_scope() as s:
+                    for chunk in iter_comments(s, filters):
+                        records = export_rows(chunk)
+                        writer.writerows(records)
+                        self._write_chunk(buf.getvalue().encode("utf-8"))
+                        buf.seek(0)
+                        buf.truncate()
+                        rows += len(records)
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as exc:  # noqa: BLE001
+                # The 200 and part of the body are already out: drop the connection without
+                # the terminating chunk, so the client sees a truncated transfer, not a CSV.
+                sp["error"] = f"{type(exc).__name__}: {exc}"
+                self.close_connection = True
+                return
+            finally:
+                sp["rows"] = rows
+        if buf.tell():  # header only: no matching rows
+            self._write_chunk(buf.getvalue().encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _post(self) -> None:
+        path, _ = self._route()
+        raw = self._read_body()
+        m = _BULK_ROUTE.match(path)
+        if not m:
+            self._error(404, f"no route for {path}")
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            raise ApiError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "body must be a JSON object")
+        with span("api.bulk"):
+            payload = _bulk(int(m.group(1)), body)
+        self._send(200, "application/json", _dumps(payload))
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass  # request timings go to the span buffers instead
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8502) -> ThreadingHTTPServer:
+    if host not in _LOOPBACK and not get_secret("API_TOKEN").strip():
+        raise SystemExit("Refusing to listen on a non-local address without API_TOKEN set.")
+    init_db()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Headless HTTP API for the comment data.")
+    parser.add_argument("--host", default=get_secret("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(get_secret("API_PORT", "8502") or 8502))
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# src/archive.py
+"""
+Hot/cold archival of comments.
+
+Rows nobody works on any more are moved out of the hot comment/comment_item tables
+into comment_archive/comment_item_archive (src/models.py): same columns and ids, no
+foreign keys and only the indexes restore and import dedupe need. Two kinds of rows
+go cold:
+
+- Closed comments closed more than ARCHIVE_AFTER_DAYS ago (default 180), going by
+  comment.status_changed_at;
+- every comment of a project that is archived on the Projects page. Reactivating the
+  project restores them (and any archived Closed ones) in one go.
+
+Moves are INSERT ... SELECT + DELETE over chunks of ids inside the caller's transaction
+and bump the project's data_version. History views read hot and cold rows together
+through history_entities(); imports still see archived fingerprints and markup IDs, so
+an archived markup is not imported again as a new Open comment (a delta re-import
+updates its raw fields in the archive instead).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Table, delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import aliased
+from sqlmodel import Session
+
+from src.config import get_secret
+from src.instrument import span
+from src.models import Comment, CommentItem, comment_archive, comment_item_archive
+from src.versions import touch
+
+_CHUNK = 500
+
+_comment = Comment.__table__
+_item = CommentItem.__table__
+
+
+@dataclass
+class ArchiveResult:
+    comments: int = 0
+    items: int = 0
+
+
+def archive_after_days() -> int:
+    try:
+        return int(get_secret("ARCHIVE_AFTER_DAYS", "180") or 180)
+    except ValueError:
+        return 180
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i : i + _CHUNK]
+
+
+def _move(session: Session, src: Table, dst: Table, ids: List[int], now: Optional[datetime]) -> int:
+    """Copy rows `ids` from src to dst (stamping archived_at when dst is cold), then delete them from src."""
+    names = [c.name for c in dst.columns if c.name != "archived_at"]
+    moved = 0
+    for chunk in _chunks(ids):
+        rows = select(*[src.c[n] for n in names]).where(src.c.id.in_(chunk))
+        if "archived_at" in dst.c:
+            stmt = insert(dst).from_select(names + ["archived_at"], rows.add_columns(literal(now, DateTime)))
+        else:
+            stmt = insert(dst).from_select(names, rows)
+        session.execute(stmt)
+        moved += session.execute(delete(src).where(src.c.id.in_(chunk))).rowcount
+    return moved
+
+
+def _archive(session: Session, comment_ids: List[int], item_ids: List[int], project_ids: Iterable[int]) -> ArchiveResult:
+    now = datetime.utcnow()
+    # Comments first: the hot comment -> comment_item foreign key.
+    result = ArchiveResult(comments=_move(session, _comment, comment_archive, comment_ids, now))
+    if item_ids:
+        # An item goes cold only once no hot comment refers to it any more.
+        still_used = set()
+        for chunk in _chunks(item_ids):
+            still_used.update(
+                session.execute(select(_comment.c.comment_item_id).where(_comment.c.comment_item_id.in_(chunk))).scalars()
+            )
+        result.items = _move(session, _item, comment_item_archive, [i for i in item_ids if i not in still_used], now)
+    for project_id in project_ids:
+        touch(session, project_id)
+    return result
+
+
+def archive_closed(
+    session: Session,
+    *,
+    project_id: Optional[int] = None,
+    older_than_days: Optional[int] = None,
+) -> ArchiveResult:
+    """Move comments Closed more than the threshold ago (one project or all) to the cold tables."""
+    days = archive_after_days() if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stmt = (
+        select(_comment.c.id, _comment.c.comment_item_id, _comment.c.project_id)
+        .where(_comment.c.status == "Closed")
+        .where(_comment.c.status_changed_at < cutoff)
+    )
+    if project_id is not None:
+        stmt = stmt.where(_comment.c.project_id == project_id)
+    with span("archive.closed", days=days) as sp:
+        rows = session.execute(stmt).all()
+        result = _archive(
+            session,
+            [r.id for r in rows],
+            [r.comment_item_id for r in rows if r.comment_item_id is not None],
+            {r.project_id for r in rows},
+        )
+        sp.update(comments=result.comments, items=result.items)
+    return result
+
+
+def archive_project(session: Session, project_id: int) -> ArchiveResult:
+    """Move all of a project's comments and raw items to the cold tables."""
+    with span("archive.project", project_id=project_id) as sp:
+        comment_ids = list(session.execute(select(_comment.c.id).where(_comment.c.project_id == project_id)).scalars())
+        item_ids = list(session.execute(select(_item.c.id).where(_item.c.project_id == project_id)).scalars())
+        result = _archive(session, comment_ids, item_ids, [project_id])
+        sp.update(comments=result.comments, items=result.items)
+    return result
+
+
+def restore_project(session: Session, project_id: int) -> ArchiveResult:
+    """Move everything archived for a project back to the hot tables (items first, for the foreign key)."""
+    with span("archive.restore", project_id=project_id) as sp:
+        item_ids = list(
+            session.execute(select(comment_item_archive.c.id).where(comment_item_archive.c.project_id == project_id)).scalars()
+        )
+        comment_ids = list(
+            session.execute(select(comment_archive.c.id).where(comment_archive.c.project_id == project_id)).scalars()
+        )
+        result = ArchiveResult(
+            items=_move(session, comment_item_archive, _item, item_ids, None),
+            comments=_move(session, comment_archive, _comment, comment_ids, None),
+        )
+        touch(session, project_id)
+        sp.update(comments=result.comments, items=result.items)
+    return result
+
+
+def archive_counts(session: Session, project_id: int) -> Dict[str, int]:
+    """Hot and cold comment counts of a project."""
+    hot = session.execute(select(func.count()).select_from(_comment).where(_comment.c.project_id == project_id)).scalar()
+    cold = session.execute(
+        select(func.count()).select_from(comment_archive).where(comment_archive.c.project_id == project_id)
+    ).scalar()
+    return {"hot": int(hot or 0), "cold": int(cold or 0)}
+
+
+def _history(hot: Table, cold: Table, name: str):
+    return union_all(select(*hot.columns), select(*[cold.c[c.name] for c in hot.columns])).subquery(name)
+
+
+# Comment/CommentItem mapped onto "hot UNION ALL cold", for explicit history views.
+_comment_history = aliased(Comment, _history(_comment, comment_archive, "comment_history"), adapt_on_names=True)
+_item_history = aliased(CommentItem, _history(_item, comment_item_archive, "comment_item_history"), adapt_on_names=True)
+
+
+def history_entities() -> Tuple[type, type]:
+    """(Comment, CommentItem) stand-ins that read hot and archived rows together."""
+    return _comment_history, _item_history
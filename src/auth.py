@@ -1,16 +1,15 @@
 from __future__ import annotations
 
 import hmac
-import os
 
 import streamlit as st
 
+from src.config import get_secret
+
 
 def _get_password() -> str:
     # Prefer Streamlit secrets; fallback to env var.
-    if hasattr(st, "secrets") and "APP_PASSWORD" in st.secrets:
-        return str(st.secrets["APP_PASSWORD"])
-    return os.getenv("APP_PASSWORD", "")
+    return get_secret("APP_PASSWORD")
 
 
 def require_login() -> None:
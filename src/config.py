@@ -0,0 +1,20 @@
+# src/config.py
+from __future__ import annotations
+
+import os
+
+import streamlit as st
+
+
+def get_secret(key: str, default: str = "") -> str:
+    """
+    Read a configuration value: Streamlit secrets first, then environment variables.
+    Works outside a Streamlit server too (scripts, benchmarks) where no secrets.toml exists.
+    """
+    try:
+        if hasattr(st, "secrets") and key in st.secrets:
+            return str(st.secrets[key])
+    except Exception:
+        # st.secrets raises if no secrets file is present at all.
+        pass
+    return os.getenv(key, default)
@@ -0,0 +1,183 @@
+# src/csv_engine.py
+"""
+CSV decoding and parsing for uploads.
+
+Bluebeam writes Markups Summary CSVs as UTF-8 (with or without BOM), UTF-16 (usually
+with BOM) or the Windows code page, depending on version and export settings. The
+encoding is sniffed from the bytes, the content is handed to the first available parser
+engine as UTF-8 without BOM, and the result is columnar: header -> list of cell strings.
+
+Engines, fastest first: "arrow" (pyarrow's multithreaded reader; Streamlit already
+depends on pyarrow), "pandas" (C parser) and "python" (csv module, always available).
+CSV_ENGINE (secret/env) picks one; the default "auto" tries them in that order and
+falls through on errors, e.g. ragged rows that Arrow rejects. Cells are never type-
+converted: fingerprints and date parsing work on the raw text.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.config import get_secret
+from src.instrument import span
+from src.startup import lazy_import, module_available
+
+_BOMS: List[Tuple[bytes, str]] = [
+    # UTF-32 first: its LE BOM starts with the UTF-16 LE one.
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+_SNIFF_BYTES = 64 * 1024
+FALLBACK_ENCODING = "cp1252"
+
+
+def sniff_encoding(raw: bytes) -> Tuple[str, int]:
+    """(encoding, BOM length) of `raw`, from its BOM or, failing that, its first 64 KB."""
+    for bom, encoding in _BOMS:
+        if raw.startswith(bom):
+            return encoding, len(bom)
+
+    sample = raw[:_SNIFF_BYTES]
+    if len(sample) >= 4:
+        # BOM-less UTF-16: ASCII text leaves every other byte NUL.
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        half = len(sample) // 2
+        if odd_nuls > 0.4 * half and even_nuls < 0.05 * half:
+            return "utf-16-le", 0
+        if even_nuls > 0.4 * half and odd_nuls < 0.05 * half:
+            return "utf-16-be", 0
+
+    try:
+        # Incremental, so a multi-byte character cut at the sample boundary is not an error.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING, 0
+
+
+def to_utf8(raw: bytes) -> Tuple[bytes, str]:
+    """Content as UTF-8 without BOM, plus the detected encoding. UTF-8 input is only sliced."""
+    encoding, bom = sniff_encoding(raw)
+    if encoding == "utf-8":
+        return (raw[bom:] if bom else raw), encoding
+    return raw[bom:].decode(encoding, errors="replace").encode("utf-8"), encoding
+
+
+@dataclass
+class CsvTable:
+    columns: Dict[str, List[str]]  # header -> cell text ("" for empty or missing cells)
+    num_rows: int
+    encoding: str
+    engine: str
+
+    def rows(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        n = self.num_rows if limit is None else min(limit, self.num_rows)
+        names = list(self.columns)
+        cols = [self.columns[k] for k in names]
+        return [dict(zip(names, (c[i] for c in cols))) for i in range(n)]
+
+
+def _header(data: bytes, encoding: str = "utf-8") -> List[str]:
+    head = codecs.getincrementaldecoder(encoding)(errors="replace").decode(data[:_SNIFF_BYTES], final=False)
+    return next(csv.reader(io.StringIO(head)), [])
+
+
+def read_header(raw: bytes) -> List[str]:
+    """Column names of an uploaded CSV, from its first 64 KB only."""
+    encoding, bom = sniff_encoding(raw)
+    return _header(raw[bom:], encoding)
+
+
+def _read_arrow(data: bytes) -> Dict[str, List[str]]:
+    pa = lazy_import("pyarrow")
+    pacsv = lazy_import("pyarrow.csv")
+    header = _header(data)
+    table = pacsv.read_csv(
+        pa.py_buffer(data),
+        read_options=pacsv.ReadOptions(use_threads=True),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    # Duplicate headers: the last one wins, as with csv.DictReader.
+    return {name: table.column(i).to_pylist() for i, name in enumerate(table.column_names)}
+
+
+def _read_pandas(data: bytes) -> Dict[str, List[str]]:
+    pd = lazy_import("pandas")
+    df = pd.read_csv(
+        io.BytesIO(data),
+        dtype=str,
+        keep_default_na=False,
+        na_filter=False,
+        encoding="utf-8",
+        encoding_errors="replace",
+    ).fillna("")  # short rows
+    return {str(name): df[name].tolist() for name in df.columns}
+
+
+def _read_python(data: bytes) -> Dict[str, List[str]]:
+    reader = csv.reader(io.StringIO(data.decode("utf-8", errors="replace")))
+    header = next(reader, [])
+    columns: List[List[str]] = [[] for _ in header]
+    width = len(header)
+    for row in reader:
+        if not row:
+            continue  # csv.DictReader skips blank lines too
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        for col, value in zip(columns, row):
+            col.append(value)
+    return dict(zip(header, columns))
+
+
+# name -> (module it needs, reader)
+ENGINES: Dict[str, Tuple[Optional[str], Callable[[bytes], Dict[str, List[str]]]]] = {
+    "arrow": ("pyarrow", _read_arrow),
+    "pandas": ("pandas", _read_pandas),
+    "python": (None, _read_python),
+}
+
+
+def available_engines() -> List[str]:
+    return [name for name, (module, _) in ENGINES.items() if module is None or module_available(module)]
+
+
+def _engine_order(engine: Optional[str]) -> List[str]:
+    engine = (engine or get_secret("CSV_ENGINE", "auto") or "auto").strip().lower()
+    available = available_engines()
+    if engine in available:
+        # A pinned engine still falls back to the csv module rather than failing the upload.
+        return [engine] + (["python"] if engine != "python" else [])
+    return available
+
+
+def read_csv_table(raw_bytes: bytes, engine: Optional[str] = None) -> CsvTable:
+    """Decode (encoding/BOM sniffed) and parse an uploaded CSV into columns."""
+    with span("import.decode", bytes=len(raw_bytes)) as sp:
+        data, encoding = to_utf8(raw_bytes)
+        sp["encoding"] = encoding
+
+    with span("import.parse", bytes=len(data)) as sp:
+        order = _engine_order(engine)
+        for name in order:
+            try:
+                columns = ENGINES[name][1](data)
+                break
+            except Exception:
+                if name == order[-1]:
+                    raise
+        num_rows = len(next(iter(columns.values()))) if columns else 0
+        sp.update(rows=num_rows, engine=name)
+    return CsvTable(columns=columns, num_rows=num_rows, encoding=encoding, engine=name)
@@ -2,18 +2,54 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
+from typing import Any, Dict, List
 
 import streamlit as st
-from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, SQLModel, create_engine, insert
 
+from src.config import get_secret
+from src.instrument import instrument_engine, span
+from src.migrations import ensure_schema
+from src.querylog import install_query_log
+from src.startup import timed_step
+from src import versions  # noqa: F401  (registers the data-version session listeners)
 
-@st.cache_resource
-def get_engine():
-    db_url = st.secrets.get("DATABASE_URL", "").strip() if hasattr(st, "secrets") else ""
+
+def _int_secret(name: str, default: int) -> int:
+    try:
+        return int(get_secret(name, str(default)) or default)
+    except ValueError:
+        return default
+
+
+def _pool_options() -> Dict[str, Any]:
+    """
+    QueuePool sizing for server databases. Each Streamlit session thread holds a
+    connection only for the length of a session_scope, so a small pool with some
+    overflow covers a team; recycle stays below typical idle-connection timeouts of
+    managed Postgres and proxies (pre_ping still catches the ones killed earlier).
+    """
+    return {
+        "pool_size": _int_secret("DB_POOL_SIZE", 5),
+        "max_overflow": _int_secret("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _int_secret("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _int_secret("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+
+
+def _create_engine():
+    db_url = get_secret("DATABASE_URL").strip()
     if db_url:
-        return create_engine(db_url, echo=False, pool_pre_ping=True)
+        if make_url(db_url).get_backend_name() == "sqlite":
+            return create_engine(db_url, echo=False, pool_pre_ping=True)
+        return create_engine(db_url, echo=False, **_pool_options())
 
-    sqlite_path = st.secrets.get("SQLITE_PATH", "/tmp/bluebeam_consolidator.db")
+    sqlite_path = get_secret("SQLITE_PATH", "/tmp/bluebeam_consolidator.db")
     sqlite_url = f"sqlite:///{sqlite_path}"
 
     return create_engine(
@@ -23,10 +59,50 @@ def get_engine():
     )
 
 
+@st.cache_resource
+def get_engine():
+    with timed_step("create engine"):
+        engine = _create_engine()
+        instrument_engine(engine)
+        install_query_log(engine)
+        return engine
+
+
+@st.cache_resource(show_spinner=False)
+def _ensure_schema_once() -> int:
+    return ensure_schema(get_engine())
+
+
+@st.cache_resource(show_spinner=False)
+def _start_maintenance() -> bool:
+    # Imported here: src.maintenance builds on session_scope from this module.
+    from src.maintenance import start_scheduler
+
+    return start_scheduler(get_engine())
+
+
 def init_db():
-    engine = get_engine()
-    SQLModel.metadata.create_all(engine)
-    return engine
+    """
+    Make sure the schema is current. Called at the top of every page, so it must be cheap:
+    the version check and any create_all/migrations run once per process, later reruns
+    just return the cached engine. The first call also starts the idle maintenance
+    scheduler (src/maintenance.py).
+    """
+    _ensure_schema_once()
+    _start_maintenance()
+    return get_engine()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session, flush_context):
+    session.info["_wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    # session.execute(insert/update/delete) bypasses the unit of work entirely
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["_wrote"] = True
 
 
 @contextmanager
@@ -37,15 +113,37 @@ def session_scope():
     """
     engine = get_engine()
     session = Session(engine, expire_on_commit=False)
-    try:
-        yield session
+    with span("db.session") as sp:
+        try:
+            yield session
+
+            # Only commit if something changed (prevents unnecessary commits on SELECTs).
+            # Explicit flushes (e.g. the import pipeline) and DML run via session.execute leave
+            # new/dirty empty, so check that too.
+            if session.new or session.dirty or session.deleted or session.info.get("_wrote"):
+                sp["writes"] = len(session.new) + len(session.dirty) + len(session.deleted)
+                session.commit()
 
-        # Only commit if something changed (prevents unnecessary commits on SELECTs)
-        if session.new or session.dirty or session.deleted:
-            session.commit()
+        except Exception:
+            sp["error"] = True
+            session.rollback()
+            raise
+        finally:
+            session.close()
 
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+
+def insert_ignore(session: Session, model: type[SQLModel], values: List[Dict[str, Any]], conflict: List[str]) -> None:
+    """
+    Multi-row INSERT that skips rows conflicting on the unique `conflict` columns
+    (ON CONFLICT DO NOTHING on SQLite/PostgreSQL), so concurrent writers can't fail each other.
+    """
+    if not values:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite_insert(model).on_conflict_do_nothing(index_elements=conflict)
+    elif dialect == "postgresql":
+        stmt = pg_insert(model).on_conflict_do_nothing(index_elements=conflict)
+    else:
+        stmt = insert(model)
+    session.execute(stmt, values)
@@ -0,0 +1,180 @@
+# src/disciplines.py
+"""
+Per-row discipline assignment from sheet numbers.
+
+The prefix of a sheet ("E" for "E101 - LIGHTING PLAN", "FP" for "FP-201") is mapped
+to a discipline through, in order:
+
+1. the project's learned prefix table (sheet_prefix), where corrections made on the
+   dashboard override what earlier imports taught it;
+2. DEFAULT_PREFIXES (the standard sheet designators);
+3. the discipline picked for the upload, which is then learned for that prefix.
+
+Prefixes are computed once per distinct sheet string and the learned table is cached
+in memory per project, so a whole import column resolves with a few dict lookups.
+Cached tables are keyed to the project's data_version (src/versions.py), which every
+learn bumps, so a table learned by another process is picked up on its next commit.
+A transaction that learns prefixes keeps its own copy in session.info until it ends;
+its uncommitted rows never reach the process cache.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from src.db import insert_ignore
+from src.lookups import intern_names
+from src.models import Discipline, SheetPrefix
+from src.versions import data_version, touch
+
+DEFAULT_PREFIXES: Dict[str, str] = {
+    "A": "A",
+    "S": "S",
+    "M": "M",
+    "E": "E",
+    "C": "CIV",
+    "FP": "FP",
+}
+
+_PREFIX = re.compile(r"^([A-Z]{1,3})")
+
+_PENDING_KEY = "_prefix_pending"
+
+_lock = threading.Lock()
+_cache: Dict[int, Tuple[int, Dict[str, str]]] = {}  # project -> (data_version, learned table)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    # Committed tables are read again at the version the commit produced.
+    session.info.pop(_PENDING_KEY, None)
+
+
+def sheet_prefix(sheet: str) -> str:
+    """Leading letters of the sheet number ("M-101" -> "M", "FP2.1" -> "FP"); "" for a blank sheet."""
+    s = (sheet or "").strip().upper()
+    if not s:
+        return ""
+    # If sheet has spaces like "E101 - LIGHTING PLAN", take token before space
+    token = s.split()[0]
+    m = _PREFIX.match(token)
+    return m.group(1) if m else token[:1]
+
+
+def sheet_prefixes(sheets: Iterable[str]) -> Dict[str, str]:
+    """sheet -> prefix for each distinct sheet (a file has hundreds of sheets, not rows)."""
+    return {s: sheet_prefix(s) for s in set(sheets)}
+
+
+def _read_table(session: Session, project_id: int) -> Dict[str, str]:
+    stmt = (
+        select(SheetPrefix.prefix, Discipline.name)
+        .join(Discipline, SheetPrefix.discipline_id == Discipline.id)
+        .where(SheetPrefix.project_id == project_id)
+    )
+    return {prefix: name for prefix, name in session.exec(stmt)}
+
+
+def prefix_table(session: Session, project_id: int) -> Dict[str, str]:
+    """Learned prefix -> discipline name for a project (cached per data_version)."""
+    pending: Dict[int, Optional[Dict[str, str]]] = session.info.get(_PENDING_KEY, {})
+    if project_id in pending:
+        # This transaction learned prefixes: its view includes rows nobody else can see yet.
+        table = pending[project_id]
+        if table is None:
+            table = pending[project_id] = _read_table(session, project_id)
+        return table
+
+    version = data_version(session, project_id) or 0
+    with _lock:
+        cached = _cache.get(project_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    # Read after the version, so the table is at least as new as the key it is stored under.
+    table = _read_table(session, project_id)
+    with _lock:
+        if project_id not in _cache or _cache[project_id][0] <= version:
+            _cache[project_id] = (version, table)
+    return table
+
+
+def learn_prefixes(session: Session, project_id: int, mapping: Dict[str, str], *, source: str) -> None:
+    """
+    Record prefix -> discipline for a project. "user" entries replace whatever is stored;
+    "import" entries only fill prefixes the project doesn't know yet.
+    """
+    mapping = {p: d for p, d in mapping.items() if p and d}
+    if not mapping:
+        return
+    ids = intern_names(session, "discipline", mapping.values())
+    now = datetime.utcnow()
+    if source == "user":
+        existing = {
+            row.prefix: row
+            for row in session.exec(
+                select(SheetPrefix)
+                .where(SheetPrefix.project_id == project_id)
+                .where(SheetPrefix.prefix.in_(list(mapping)))
+            )
+        }
+        for prefix, name in mapping.items():
+            row = existing.get(prefix) or SheetPrefix(project_id=project_id, prefix=prefix)
+            row.discipline_id = ids[name]
+            row.source = source
+            row.updated_at = now
+            session.add(row)
+    else:
+        insert_ignore(
+            session,
+            SheetPrefix,
+            [
+                {
+                    "project_id": project_id,
+                    "prefix": prefix,
+                    "discipline_id": ids[name],
+                    "source": source,
+                    "updated_at": now,
+                }
+                for prefix, name in mapping.items()
+            ],
+            ["project_id", "prefix"],
+        )
+    # Bumps the project's version on commit without marking any comment as changed.
+    touch(session, project_id, [])
+    session.info.setdefault(_PENDING_KEY, {})[project_id] = None
+
+
+def assign_disciplines(
+    session: Session,
+    project_id: int,
+    sheets: List[str],
+    fallback: str,
+    *,
+    learn: bool = True,
+) -> List[str]:
+    """
+    Discipline name per sheet (same order). Prefixes nobody knows get `fallback`, the
+    discipline picked for the upload, and with `learn` that choice is remembered.
+    """
+    prefixes = sheet_prefixes(sheets)
+    learned = prefix_table(session, project_id)
+    resolved: Dict[str, str] = {}
+    new: Dict[str, str] = {}
+    for prefix in set(prefixes.values()):
+        if not prefix:
+            continue
+        if prefix in learned:
+            resolved[prefix] = learned[prefix]
+        elif prefix in DEFAULT_PREFIXES:
+            resolved[prefix] = DEFAULT_PREFIXES[prefix]
+        else:
+            resolved[prefix] = new[prefix] = fallback
+    if learn:
+        learn_prefixes(session, project_id, new, source="import")
+    return [resolved.get(prefixes[s], fallback) for s in sheets]
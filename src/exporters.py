@@ -1,57 +1,143 @@
 from __future__ import annotations
 
+import io
 from datetime import datetime
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
 
-import pandas as pd
+from .instrument import span
 
-from .models import CommentItem
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def comments_to_dataframe(items: List[CommentItem]) -> pd.DataFrame:
+# `items` are comment view rows from src.queries (Comment joined to its CommentItem).
+def comments_to_dataframe(items: List[Any]) -> "pd.DataFrame":
+    import pandas as pd
+
+    with span("export.dataframe", rows=len(items)):
+        return pd.DataFrame(export_rows(items))
+
+
+EXPORT_COLUMNS: Tuple[str, ...] = (
+    "ID",
+    "Project ID",
+    "Milestone ID",
+    "Discipline",
+    "Sheet",
+    "Subject",
+    "Author",
+    "Created At",
+    "Status",
+    "Owner",
+    "Due Date",
+    "Tags",
+    "Tracked",
+    "Comment",
+    "Required Response",
+)
+
+
+def export_rows(items: List[Any]) -> List[dict]:
+    """Export records (EXPORT_COLUMNS -> value) for comment view rows; shared by the CSV exports."""
     rows = []
     for it in items:
-        rows.append(
-            {
-                "ID": it.id,
-                "Project ID": it.project_id,
-                "Milestone ID": it.milestone_id,
-                "Discipline": it.discipline,
-                "Sheet": it.sheet,
-                "Subject": it.subject or "",
-                "Author": it.author or "",
-                "Created At": it.created_at.isoformat() if it.created_at else "",
-                "Status": it.status,
-                "Owner": it.owner or "",
-                "Due Date": it.due_date.isoformat() if it.due_date else "",
-                "Tags": it.tags or "",
-                "Tracked": it.tracked,
-                "Comment": it.comment_text,
-                "Required Response": it.required_response or "",
-            }
+        values = (
+            it.id,
+            it.project_id,
+            it.milestone_id,
+            it.discipline,
+            it.sheet,
+            it.subject or "",
+            it.author or "",
+            it.created_at.isoformat() if it.created_at else "",
+            it.status,
+            it.owner or "",
+            it.due_date.isoformat() if it.due_date else "",
+            it.tag or "",
+            it.tracked,
+            it.comment_text,
+            it.required_response or "",
         )
-    return pd.DataFrame(rows)
+        rows.append(dict(zip(EXPORT_COLUMNS, values)))
+    return rows
+
+
+# Package grouping spec: field -> header label and how an empty value reads. Groups nest
+# in the order given; rows must arrive sorted by them (src.queries orders them in SQL).
+PACKAGE_GROUPS: Dict[str, Tuple[str, str]] = {
+    "sheet": ("Sheet", "(no sheet)"),
+    "discipline": ("Discipline", "(none)"),
+    "owner": ("Owner", "(unassigned)"),
+    "due_date": ("Due", "(no due date)"),
+    "risk": ("Risk", "(none)"),
+}
+DEFAULT_GROUPING: Tuple[str, ...] = ("sheet",)
 
 
-def build_consultant_package(items: List[CommentItem], header: str = "") -> str:
-    # Email/Teams friendly.
-    lines = []
-    if header:
-        lines.append(header.strip())
-        lines.append("")
+def package_group_value(item: Any, field: str) -> str:
+    """How a row's value of a PACKAGE_GROUPS field reads in group headers."""
+    value = getattr(item, field)
+    if value is None or value == "":
+        return PACKAGE_GROUPS[field][1]
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
 
-    if not items:
-        return "(No items match your filters.)"
 
-    # Group by sheet for readability
-    items_sorted = sorted(items, key=lambda x: (x.sheet or "", x.id or 0))
-    current_sheet = None
-    idx = 1
+def _sort_value(item: Any, field: str) -> Tuple[int, str]:
+    # The order of src.queries._PACKAGE_ORDER: empty values first (coalesce(..., '')),
+    # except due dates, where rows without one come last.
+    value = getattr(item, field)
+    if value is None or value == "":
+        return (1 if field == "due_date" else 0, "")
+    return (0, package_group_value(item, field))
 
-    for it in items_sorted:
-        if it.sheet != current_sheet:
-            current_sheet = it.sheet
-            lines.append(f"Sheet: {current_sheet}")
+
+def build_consultant_package(
+    items: Iterable[Any],
+    header: str = "",
+    group_by: Sequence[str] = DEFAULT_GROUPING,
+    *,
+    presorted: bool = False,
+) -> str:
+    """
+    Package text for `items`, grouped by `group_by` (PACKAGE_GROUPS keys). Pass
+    presorted=True when the rows already come ordered by the groups, e.g. from
+    src.queries.load_package_items(group_by=...); otherwise they are sorted here.
+    """
+    if not presorted:
+        items = sorted(items, key=lambda x: tuple(_sort_value(x, f) for f in group_by) + (x.id or 0,))
+    with span("export.package", groups=",".join(group_by)) as sp:
+        out = io.StringIO()
+        sp["rows"] = write_package(items, out, header, group_by)
+        text = out.getvalue()
+        sp["bytes"] = len(text)
+    return text
+
+
+def write_package(items: Iterable[Any], out: TextIO, header: str = "", group_by: Sequence[str] = DEFAULT_GROUPING) -> int:
+    """
+    Stream the package to `out` in one pass over rows ordered by `group_by`: a header is
+    written whenever a group value changes. Email/Teams friendly. Returns the item count.
+    """
+    for field in group_by:
+        if field not in PACKAGE_GROUPS:
+            raise ValueError(f"unknown package grouping {field!r}")
+    depth = max(len(group_by) - 1, 0)
+    pad = "  " * depth
+    current: List[Optional[str]] = [None] * len(group_by)
+    idx = 0
+
+    for it in items:
+        if idx == 0 and header:
+            out.write(header.strip() + "\n\n")
+        values = [package_group_value(it, f) for f in group_by]
+        for level, value in enumerate(values):
+            if value != current[level] or idx == 0:
+                # A change at one level restarts every level below it.
+                for lower in range(level, len(values)):
+                    current[lower] = values[lower]
+                    out.write(f"{'  ' * lower}{PACKAGE_GROUPS[group_by[lower]][0]}: {values[lower]}\n")
+                break
+        idx += 1
 
         req = (it.required_response or "").strip()
         req_line = f"Required response: {req}" if req else "Required response: (please respond with proposed resolution)"
@@ -63,16 +149,17 @@ def build_consultant_package(items: List[CommentItem], header: str = "") -> str:
             meta.append(f"Reviewer: {it.author}")
         if it.due_date:
             meta.append(f"Due: {it.due_date.isoformat()}")
-        if it.tags:
-            meta.append(f"Tags: {it.tags}")
+        if it.tag:
+            meta.append(f"Tags: {it.tag}")
         meta_str = " | ".join(meta)
 
-        lines.append(f"  {idx}. {it.comment_text}")
+        out.write(f"{pad}  {idx}. {it.comment_text}\n")
         if meta_str:
-            lines.append(f"     ({meta_str})")
-        lines.append(f"     {req_line}")
-        lines.append("")
-        idx += 1
+            out.write(f"{pad}     ({meta_str})\n")
+        out.write(f"{pad}     {req_line}\n\n")
 
-    lines.append(f"Generated: {datetime.utcnow().isoformat()}Z")
-    return "\n".join(lines)
+    if not idx:
+        out.write("(No items match your filters.)")
+    else:
+        out.write(f"Generated: {datetime.utcnow().isoformat()}Z")
+    return idx
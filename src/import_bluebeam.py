@@ -1,12 +1,36 @@
 from __future__ import annotations
 
 import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Optional, Tuple, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, Tuple, List
 
-import pandas as pd
 from dateutil import parser as dtparser
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from src.config import get_secret
+from src.csv_engine import CsvTable, read_csv_table, read_header, sniff_encoding, to_utf8
+from src.disciplines import assign_disciplines, sheet_prefix, sheet_prefixes
+from src.instrument import clear_spans, process_spans, record, span
+from src.lookups import intern_names
+from src.models import ImportBatch, CommentItem, Comment, comment_item_archive
+from src.pgcopy import copy_import, copy_supported
+from src.startup import lazy_import
+from src.versions import touch
+from src.xml_engine import is_xml, iter_xml_tables, read_xml_header, read_xml_table, scan_xml
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 DEFAULT_COLUMN_ALIASES = {
@@ -49,7 +73,7 @@ def infer_mapping(columns: List[str]) -> Dict[str, Optional[str]]:
 
 
 def parse_created_at(value) -> Optional[datetime]:
-    if value is None or (isinstance(value, float) and pd.isna(value)):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
         return None
     s = str(value).strip()
     if not s:
@@ -62,15 +86,8 @@ def parse_created_at(value) -> Optional[datetime]:
 
 
 def infer_discipline_from_sheet(sheet: str) -> str:
-    if not sheet:
-        return ""
-    # Common sheet prefixes (A, C, S, M, P, E, FP, etc.)
-    s = sheet.strip().upper()
-    # If sheet has spaces like "E101 - LIGHTING PLAN", take token before space
-    token = s.split()[0]
-    # If token has dash or dot, take leading alpha group
-    m = re.match(r"^([A-Z]{1,3})", token)
-    return m.group(1) if m else token[:1]
+    # Common sheet prefixes (A, C, S, M, P, E, FP, etc.); see src/disciplines.py
+    return sheet_prefix(sheet)
 
 
 def row_fingerprint(
@@ -97,8 +114,10 @@ def row_fingerprint(
 def load_bluebeam_csv(
     file_bytes: bytes,
     mapping: Dict[str, str],
-) -> pd.DataFrame:
-    df = pd.read_csv(pd.io.common.BytesIO(file_bytes))
+) -> "pd.DataFrame":
+    import pandas as pd
+
+    df = pd.read_csv(io.BytesIO(to_utf8(file_bytes)[0]))
 
     # Normalize expected columns
     col_sheet = mapping.get("sheet")
@@ -121,6 +140,808 @@ def load_bluebeam_csv(
     out["comment_text"] = out["comment_text"].astype(str).fillna("").str.strip()
 
     out["created_at"] = out["created_at"].apply(parse_created_at)
-    out["discipline"] = out["sheet"].apply(infer_discipline_from_sheet)
+    out["discipline"] = out["sheet"].map(sheet_prefixes(out["sheet"]))
+
+    return out
+
+
+# ------------------------------------------------------------
+# Import pipeline (used by the Import page, bench/ and scripts)
+# ------------------------------------------------------------
+# Alias lists are tried in order; the first non-empty value wins.
+SHEET_KEYS = ["Page Label", "Page", "Sheet", "sheet"]
+AUTHOR_KEYS = ["Author", "Created By", "Creator", "author"]
+SUBJECT_KEYS = ["Subject", "Type", "Markup Type", "subject"]
+COMMENT_KEYS = ["Comment", "Contents", "Text", "Comments", "Note", "comment_text"]
+MARKUP_ID_KEYS = ["Markup ID", "ID", "Annotation ID", "markup_id"]
+CREATED_KEYS = ["Created", "Date", "Creation Date", "Timestamp", "created_at"]
+STATUS_KEYS = ["Status", "State", "status_raw"]
+PAGE_INDEX_KEYS = ["Page Index", "PageIndex", "page_index"]
+
+# Import field -> alias columns; a mapping plan narrows these to the columns of one header.
+FIELD_KEYS: Dict[str, List[str]] = {
+    "sheet": SHEET_KEYS,
+    "author": AUTHOR_KEYS,
+    "subject": SUBJECT_KEYS,
+    "comment_text": COMMENT_KEYS,
+    "markup_id": MARKUP_ID_KEYS,
+    "created_at": CREATED_KEYS,
+    "status_raw": STATUS_KEYS,
+    "page_index": PAGE_INDEX_KEYS,
+}
+
+# Extra spellings from DEFAULT_COLUMN_ALIASES, only tried when no exact alias is present
+_FUZZY_ALIASES = {
+    "sheet": DEFAULT_COLUMN_ALIASES["sheet"],
+    "author": DEFAULT_COLUMN_ALIASES["author"],
+    "subject": DEFAULT_COLUMN_ALIASES["subject"],
+    "comment_text": DEFAULT_COLUMN_ALIASES["comment"],
+    "created_at": DEFAULT_COLUMN_ALIASES["created_at"],
+}
+
+# Existing CommentItem.source_row_hash values depend on these exact fingerprints.
+_HASH_KEYS = {
+    "sheet": ["sheet", "Sheet", "Page Label", "Page", "PageLabel"],
+    "author": ["author", "Author", "Created By", "Creator"],
+    "subject": ["subject", "Subject", "Type", "Markup Type"],
+    "created": ["created_at", "Created", "Date", "Creation Date", "Timestamp"],
+    "comment": ["comment_text", "Comment", "Contents", "Text", "Comments", "Note"],
+    "markup_id": ["markup_id", "Markup ID", "ID", "Annotation ID"],
+}
+
+_DEDUPE_CHUNK = 500
+IMPORT_CHUNK_ROWS = 5000  # rows per disciplines/lookups/dedupe/insert round in import_files()
+XML_KEEP_ROWS = 100_000  # larger XML exports are read again, batch by batch, on import
+
+
+# Raw fields compared (and updated) when a markup ID is seen again in delta mode
+DELTA_FIELDS = ("status_raw", "comment_text", "subject_id", "sheet_id")
+
+# Field keys stored as lookup-table ids (see src/lookups.py)
+LOOKUP_FIELDS = ("sheet", "author", "subject", "discipline")
+
+
+@dataclass
+class ImportResult:
+    batch_id: Optional[int]
+    rows: int
+    imported: int
+    skipped: int
+    changed: int = 0  # delta mode: existing markups updated in place
+    text_changed: int = 0  # delta mode: ... of which the comment text changed
+    unchanged: int = 0  # delta mode: existing markups with no differences (counted in skipped too)
+    file_skipped: bool = False  # identical file already imported; nothing was parsed or written
+    source_filename: str = ""
+
+
+def header_signature(headers: Iterable[str]) -> str:
+    """Hash of the header set; uploads with the same columns share a mapping plan."""
+    raw = json.dumps(sorted(set(headers)), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def infer_plan(headers: List[str]) -> Dict[str, List[str]]:
+    """
+    Mapping plan for a header: per field, the alias columns present (in alias order, first
+    non-empty value wins per row), which is exactly what extract_fields() reads. A field with
+    no exact alias gets the first header matching an alias case- and whitespace-insensitively.
+    """
+    present = set(headers)
+    normalized: Dict[str, str] = {}
+    for h in headers:
+        normalized.setdefault(_norm(h), h)
+
+    plan: Dict[str, List[str]] = {}
+    for field, keys in FIELD_KEYS.items():
+        cols = [k for k in keys if k in present]
+        if not cols:
+            for alias in keys + _FUZZY_ALIASES.get(field, []):
+                if _norm(alias) in normalized:
+                    cols = [normalized[_norm(alias)]]
+                    break
+        plan[field] = cols
+    return plan
+
+
+def _first_nonempty(d: Dict[str, Any], keys: List[str], default: str = "") -> str:
+    for k in keys:
+        v = d.get(k)
+        if v is None:
+            continue
+        s = str(v).strip()
+        if s:
+            return s
+    return default
+
+
+_DATETIME_FORMATS = [
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+]
+
+
+def parse_bluebeam_datetime(s: str) -> Optional[datetime]:
+    s = (s or "").strip()
+    if not s:
+        return None
+    # Try a few common Bluebeam-ish formats
+    for f in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(s, f)
+        except Exception:
+            pass
+    # last resort: try ISO-ish
+    try:
+        return datetime.fromisoformat(s)
+    except Exception:
+        return None
+
+
+def make_row_hash(row: Dict[str, Any]) -> str:
+    """
+    Stable, non-empty fingerprint.
+    Prevents fp="" which causes everything to be treated as duplicate.
+    """
+    payload = {name: _first_nonempty(row, keys) for name, keys in _HASH_KEYS.items()}
+
+    # If everything is blank, hash the whole row to avoid identical hashes
+    if not any(payload.values()):
+        payload = row
+    return _hash_payload(payload)
+
+
+# Same output as json.dumps(payload, sort_keys=True, ensure_ascii=False), without building
+# a new encoder per row.
+_HASH_ENCODER = json.JSONEncoder(sort_keys=True, ensure_ascii=False)
+
+
+def _hash_payload(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(_HASH_ENCODER.encode(payload).encode("utf-8")).hexdigest()
+
+
+def parse_page_index(value: str) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def read_table(raw_bytes: bytes) -> CsvTable:
+    """Columns of an upload: a Bluebeam XML export (src/xml_engine.py) or a Markups Summary CSV."""
+    return read_xml_table(raw_bytes) if is_xml(raw_bytes) else read_csv_table(raw_bytes)
+
+
+def read_upload_header(raw_bytes: bytes) -> List[str]:
+    """Column names of an upload (CSV header or XML markup fields), without parsing all of it."""
+    return read_xml_header(raw_bytes) if is_xml(raw_bytes) else read_header(raw_bytes)
+
+
+def read_csv_rows(raw_bytes: bytes) -> List[Dict[str, str]]:
+    """Decode an uploaded CSV and return one dict per row (header -> cell)."""
+    return read_csv_table(raw_bytes).rows()
+
+
+def extract_fields(r: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the core markup fields from a raw CSV row, plus its dedupe fingerprint."""
+    sheet = _first_nonempty(r, SHEET_KEYS)
+    author = _first_nonempty(r, AUTHOR_KEYS)
+    subject = _first_nonempty(r, SUBJECT_KEYS)
+    comment_text = _first_nonempty(r, COMMENT_KEYS)
+    markup_id = _first_nonempty(r, MARKUP_ID_KEYS)
+    created_str = _first_nonempty(r, CREATED_KEYS)
+
+    fp = make_row_hash(
+        {
+            "sheet": sheet,
+            "author": author,
+            "subject": subject,
+            "comment_text": comment_text,
+            "markup_id": markup_id,
+            "created_at": created_str,
+        }
+    )
+    return {
+        "sheet": sheet,
+        "author": author,
+        "subject": subject,
+        "comment_text": comment_text,
+        "markup_id": markup_id or None,
+        "created_at": parse_bluebeam_datetime(created_str) or datetime.utcnow(),
+        "status_raw": _first_nonempty(r, STATUS_KEYS) or None,
+        "page_index": parse_page_index(_first_nonempty(r, PAGE_INDEX_KEYS)),
+        "source_row_hash": fp,
+    }
+
+
+def _coalesce(table: CsvTable, keys: List[str]) -> List[str]:
+    """Per row, the first non-empty (stripped) value among the given columns that are present."""
+    cols = [table.columns[k] for k in keys if k in table.columns]
+    if not cols:
+        return [""] * table.num_rows
+    out = [(v or "").strip() for v in cols[0]]
+    for col in cols[1:]:
+        out = [v or (w or "").strip() for v, w in zip(out, col)]
+    return out
+
+
+def parse_datetimes(values: Iterable[str]) -> Dict[str, Optional[datetime]]:
+    """
+    parse_bluebeam_datetime() for many strings at once: each format is applied to the
+    distinct values still unparsed with one vectorized pandas call (when pandas is
+    installed), the rest go through the scalar parser.
+    """
+    distinct = {(v or "").strip() for v in values}
+    distinct.discard("")
+    out: Dict[str, Optional[datetime]] = {"": None}
+    pending = list(distinct)
+    pd = lazy_import("pandas") if len(pending) > 50 else None
+    if pd is not None:
+        series = pd.Series(pending, dtype=object)
+        for fmt in _DATETIME_FORMATS:
+            if series.empty:
+                break
+            parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+            hit = parsed.notna().to_numpy()
+            out.update(zip(series[hit].tolist(), parsed[hit].array.to_pydatetime()))
+            series = series[~hit]
+        pending = series.tolist()
+    for value in pending:
+        out[value] = parse_bluebeam_datetime(value)
+    return out
 
+
+def extract_table(table: CsvTable, plan: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    extract_fields() for every row of a parsed table, column at a time: the mapping plan
+    (inferred from the header if not given) is resolved to column lists once per file and
+    each distinct date string is parsed once.
+    """
+    plan = plan if plan is not None else infer_plan(list(table.columns))
+    sheets = _coalesce(table, plan.get("sheet", []))
+    authors = _coalesce(table, plan.get("author", []))
+    subjects = _coalesce(table, plan.get("subject", []))
+    texts = _coalesce(table, plan.get("comment_text", []))
+    markup_ids = _coalesce(table, plan.get("markup_id", []))
+    created = _coalesce(table, plan.get("created_at", []))
+    statuses = _coalesce(table, plan.get("status_raw", []))
+    pages = _coalesce(table, plan.get("page_index", []))
+    dates = parse_datetimes(created)
+
+    now = datetime.utcnow()
+    out = []
+    for sheet, author, subject, comment_text, markup_id, created_str, status_raw, page in zip(
+        sheets, authors, subjects, texts, markup_ids, created, statuses, pages
+    ):
+        # Same payload make_row_hash() builds from these values, without the alias lookups
+        payload = {
+            "author": author,
+            "comment": comment_text,
+            "created": created_str,
+            "markup_id": markup_id,
+            "sheet": sheet,
+            "subject": subject,
+        }
+        if not any(payload.values()):
+            payload = {
+                "sheet": "",
+                "author": "",
+                "subject": "",
+                "comment_text": "",
+                "markup_id": "",
+                "created_at": "",
+            }
+        out.append(
+            {
+                "sheet": sheet,
+                "author": author,
+                "subject": subject,
+                "comment_text": comment_text,
+                "markup_id": markup_id or None,
+                "created_at": dates[created_str] or now,
+                "status_raw": status_raw or None,
+                "page_index": parse_page_index(page),
+                "source_row_hash": _hash_payload(payload),
+            }
+        )
     return out
+
+
+def existing_hashes(session: Session, hashes: Iterable[str]) -> set[str]:
+    """
+    Which of `hashes` are already stored, hot or archived (chunked IN queries instead of
+    one SELECT per row).
+    """
+    hashes = list(hashes)
+    found: set[str] = set()
+    archived = comment_item_archive.c.source_row_hash
+    for i in range(0, len(hashes), _DEDUPE_CHUNK):
+        chunk = hashes[i : i + _DEDUPE_CHUNK]
+        found.update(
+            session.exec(
+                select(CommentItem.source_row_hash).where(CommentItem.source_row_hash.in_(chunk))
+            ).all()
+        )
+        found.update(session.execute(select(archived).where(archived.in_(chunk))).scalars())
+    return found
+
+
+def file_digest(raw_bytes: bytes) -> str:
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+
+def find_identical_import(
+    session: Session,
+    project_id: int,
+    milestone_id: Optional[int],
+    file_sha256: str,
+) -> Optional[ImportBatch]:
+    """Earlier batch of the same project/milestone created from byte-identical file contents."""
+    if not file_sha256:
+        return None
+    return session.exec(
+        select(ImportBatch)
+        .where(ImportBatch.project_id == project_id)
+        .where(ImportBatch.milestone_id == milestone_id)
+        .where(ImportBatch.file_sha256 == file_sha256)
+        .order_by(ImportBatch.id)
+    ).first()
+
+
+def existing_by_markup_id(
+    session: Session,
+    project_id: int,
+    markup_ids: Iterable[str],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Latest stored raw item per markup ID in this project (id + DELTA_FIELDS), hot or
+    archived; archived ones are flagged with "archived": True. A markup whose comment was
+    archived is updated in the archive, not imported again as a new Open comment.
+    """
+    markup_ids = list(markup_ids)
+    hot_cols = [CommentItem.id, CommentItem.markup_id] + [getattr(CommentItem, f) for f in DELTA_FIELDS]
+    cold = comment_item_archive.c
+    cold_cols = [cold.id, cold.markup_id] + [cold[f] for f in DELTA_FIELDS]
+    found: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(markup_ids), _DEDUPE_CHUNK):
+        chunk = markup_ids[i : i + _DEDUPE_CHUNK]
+        archived = (
+            select(*cold_cols)
+            .where(cold.project_id == project_id)
+            .where(cold.markup_id.in_(chunk))
+            .order_by(cold.id)
+        )
+        for row in session.execute(archived).all():
+            found[row.markup_id] = dict(row._mapping, archived=True)
+        stmt = (
+            select(*hot_cols)
+            .where(CommentItem.project_id == project_id)
+            .where(CommentItem.markup_id.in_(chunk))
+            .order_by(CommentItem.id)
+        )
+        for row in session.exec(stmt).all():  # hot rows win over archived ones
+            found[row.markup_id] = dict(row._mapping)
+    return found
+
+
+def _apply_delta_updates(session: Session, updates: List[Dict[str, Any]], *, archived: bool = False) -> None:
+    """One executemany UPDATE for all changed markups (of the hot or the archive table)."""
+    if not updates:
+        return
+    table = comment_item_archive if archived else CommentItem.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            source_row_hash=bindparam("b_source_row_hash"),
+            **{f: bindparam(f"b_{f}") for f in DELTA_FIELDS},
+        )
+    )
+    session.execute(stmt, updates)
+
+
+def encode_lookups(session: Session, fields: List[Dict[str, Any]]) -> None:
+    """Replace the sheet/author/subject/discipline strings in `fields` with their lookup ids, in place."""
+    for kind in LOOKUP_FIELDS:
+        ids = intern_names(session, kind, {f[kind] for f in fields})
+        for f in fields:
+            f[f"{kind}_id"] = ids[f.pop(kind) or ""]
+
+
+@dataclass
+class ParsedFile:
+    """
+    One uploaded CSV or XML export after decode, field mapping and fingerprinting
+    (picklable for the pool). XML exports are fingerprinted batch by batch while they
+    are imported instead of filling `fields`: from the `tables` read for the preview,
+    or, above XML_KEEP_ROWS markups, from their bytes in `source`, parsed again.
+    """
+
+    name: str
+    file_sha256: str
+    rows: int
+    fields: List[Dict[str, Any]]
+    preview: List[Dict[str, str]]
+    discipline: str = ""  # overrides import_files(discipline=...) for this file
+    encoding: str = ""
+    header_hash: str = ""
+    source: bytes = b""
+    plan: Optional[Dict[str, List[str]]] = None
+    tables: List[CsvTable] = field(default_factory=list)
+
+    def field_batches(self, rows: int = IMPORT_CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+        """The file's extracted fields in batches of at most `rows`."""
+        if self.tables:
+            for table in self.tables:
+                with span("import.fingerprint", rows=table.num_rows, engine="xml"):
+                    fields = extract_table(table, self.plan)
+                for i in range(0, len(fields), rows):
+                    yield fields[i : i + rows]
+            return
+        if self.source:
+            for table in iter_xml_tables(self.source, rows):
+                with span("import.fingerprint", rows=table.num_rows, engine="xml"):
+                    yield extract_table(table, self.plan)
+            return
+        for i in range(0, len(self.fields), rows):
+            yield self.fields[i : i + rows]
+
+
+PlannedUpload = Tuple[str, bytes, Optional[Dict[str, List[str]]]]  # (name, bytes, mapping plan)
+
+
+def parse_upload(name: str, raw_bytes: bytes, plan: Optional[Dict[str, List[str]]] = None) -> ParsedFile:
+    """Decode, map (`plan`, or inferred) and fingerprint one file. Runs in the import process pool."""
+    if is_xml(raw_bytes):
+        # Streamed: one pass for the row count, columns and preview, which also keeps the
+        # markups unless there are too many to hold; fingerprinting happens on import.
+        rows, columns, preview, tables = scan_xml(raw_bytes, keep_rows=XML_KEEP_ROWS, batch_rows=IMPORT_CHUNK_ROWS)
+        return ParsedFile(
+            name=name,
+            file_sha256=file_digest(raw_bytes),
+            rows=rows,
+            fields=[],
+            preview=preview,
+            encoding=sniff_encoding(raw_bytes[:4096])[0],
+            header_hash=header_signature(columns),
+            source=b"" if tables else raw_bytes,
+            plan=plan if plan is not None else infer_plan(columns),
+            tables=tables,
+        )
+    table = read_csv_table(raw_bytes)
+    with span("import.fingerprint", rows=table.num_rows):
+        fields = extract_table(table, plan)
+    return ParsedFile(
+        name=name,
+        file_sha256=file_digest(raw_bytes),
+        rows=table.num_rows,
+        fields=fields,
+        preview=table.rows(10),
+        encoding=table.encoding,
+        header_hash=header_signature(table.columns),
+    )
+
+
+def _parse_in_pool(
+    name: str, raw_bytes: bytes, plan: Optional[Dict[str, List[str]]] = None
+) -> Tuple[ParsedFile, List[Dict[str, Any]]]:
+    """parse_upload() in a pool worker, plus the spans it recorded there for the parent to keep."""
+    clear_spans()  # a worker runs one task at a time: its buffer then holds this file's spans
+    pf = parse_upload(name, raw_bytes, plan)
+    pf.source = b""  # the parent still has the upload: don't pickle XML bytes it re-reads back
+    return pf, process_spans()
+
+
+def _record_worker_spans(spans: List[Dict[str, Any]]) -> None:
+    # Into the caller's buffer (the Streamlit session's, on the Import page) as if timed here.
+    for entry in spans:
+        attrs = dict(entry)
+        record(attrs.pop("name"), attrs.pop("ms"), worker=True, **attrs)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _import_workers() -> int:
+    try:
+        configured = int(get_secret("IMPORT_WORKERS", "0") or 0)
+    except ValueError:
+        configured = 0
+    return configured if configured > 0 else min(4, os.cpu_count() or 1)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # One long-lived pool: spawning workers costs about as much as parsing a small file.
+    # "spawn" because forking a process that runs the Streamlit server threads is unsafe.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_import_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parse_uploads(uploads: List[PlannedUpload]) -> List[ParsedFile]:
+    """
+    parse_upload() for several (name, bytes, plan) files in parallel, results in input order.
+    A single file (or a one-worker setup) is parsed inline; if the pool is unavailable
+    the files are parsed inline as well.
+    """
+    total = sum(len(u[1]) for u in uploads)
+    with span("import.parse_files", files=len(uploads), bytes=total) as sp:
+        if len(uploads) < 2 or _import_workers() < 2:
+            sp["workers"] = 1
+            return [parse_upload(*u) for u in uploads]
+        try:
+            pool = _get_pool()
+            futures = [pool.submit(_parse_in_pool, *u) for u in uploads]
+            sp["workers"] = min(len(uploads), _import_workers())
+            parsed = []
+            for future, upload in zip(futures, uploads):
+                pf, spans = future.result()
+                _record_worker_spans(spans)
+                if is_xml(upload[1]) and not pf.tables:
+                    pf.source = upload[1]
+                parsed.append(pf)
+            return parsed
+        except (BrokenProcessPool, OSError):
+            _reset_pool()
+            sp["workers"] = 1
+            return [parse_upload(*u) for u in uploads]
+
+
+def import_rows(
+    session: Session,
+    rows: List[Dict[str, Any]],
+    *,
+    project_id: int,
+    milestone_id: Optional[int],
+    discipline: str,
+    default_tracked: bool,
+    source_filename: str = "",
+    file_sha256: str = "",
+    delta: bool = False,
+    infer_disciplines: bool = True,
+) -> ImportResult:
+    """
+    Import raw CSV rows as one ImportBatch: fingerprint, skip rows already stored
+    (or repeated within the file), then write CommentItem + working Comment rows.
+
+    file_sha256: digest of the uploaded bytes; if this project/milestone already has a batch
+        with the same digest, nothing is written and `file_skipped` is set.
+    delta: rows whose Bluebeam markup ID is already stored in the project are not inserted
+        again; they are classified unchanged/changed and changed ones get their raw fields
+        (status_raw, text, subject, sheet) updated in one bulk statement.
+    infer_disciplines: assign each row the discipline of its sheet prefix (src/disciplines.py);
+        `discipline` is used for prefixes the project doesn't know yet. Otherwise every row
+        gets `discipline`.
+
+    The caller owns the session/transaction.
+    """
+    with span("import.fingerprint", rows=len(rows)):
+        fields = [extract_fields(r) for r in rows]
+    parsed = ParsedFile(
+        name=source_filename, file_sha256=file_sha256, rows=len(rows), fields=fields, preview=[]
+    )
+    return import_files(
+        session,
+        [parsed],
+        project_id=project_id,
+        milestone_id=milestone_id,
+        discipline=discipline,
+        default_tracked=default_tracked,
+        delta=delta,
+        infer_disciplines=infer_disciplines,
+    )[0]
+
+
+def _import_chunk(
+    session: Session,
+    batch: ImportBatch,
+    file_fields: List[Dict[str, Any]],
+    *,
+    project_id: int,
+    milestone_id: Optional[int],
+    default_tracked: bool,
+    delta: bool,
+    infer_disciplines: bool,
+    counts: Dict[str, int],
+    done: set[str],
+) -> None:
+    """One chunk of a file for import_files(): classify, dedupe and insert it, adding to `counts`."""
+    with span("import.disciplines", inferred=infer_disciplines):
+        if infer_disciplines:
+            names = assign_disciplines(session, project_id, [f["sheet"] for f in file_fields], batch.discipline)
+        else:
+            names = [batch.discipline] * len(file_fields)
+        fields = [dict(f, import_batch_id=batch.id, discipline=name) for f, name in zip(file_fields, names)]
+
+    with span("import.lookups", rows=len(fields)):
+        encode_lookups(session, fields)
+
+    if delta:
+        with span("import.delta") as sp:
+            known = existing_by_markup_id(session, project_id, {f["markup_id"] for f in fields if f["markup_id"]})
+            updates: List[Dict[str, Any]] = []
+            archived_updates: List[Dict[str, Any]] = []
+            remaining = []
+            for f in fields:
+                prev = known.get(f["markup_id"]) if f["markup_id"] else None
+                if prev is None:
+                    remaining.append(f)
+                    continue
+                if f["markup_id"] in done:
+                    counts["unchanged"] += 1  # same markup repeated within the upload
+                    continue
+                done.add(f["markup_id"])
+                if all((prev[k] or "") == (f[k] or "") for k in DELTA_FIELDS):
+                    counts["unchanged"] += 1
+                    continue
+                (archived_updates if prev.get("archived") else updates).append(
+                    {
+                        "b_id": prev["id"],
+                        "b_source_row_hash": f["source_row_hash"],
+                        **{f"b_{k}": f[k] for k in DELTA_FIELDS},
+                    }
+                )
+                counts["changed"] += 1
+                if (prev["comment_text"] or "") != (f["comment_text"] or ""):
+                    counts["text_changed"] += 1
+            _apply_delta_updates(session, updates)
+            _apply_delta_updates(session, archived_updates, archived=True)
+            fields = remaining
+            sp.update(rows=len(known), changed=len(updates) + len(archived_updates))
+
+    with span("import.dedupe", rows=len(fields)) as sp:
+        seen = existing_hashes(session, {f["source_row_hash"] for f in fields})
+        sp["existing"] = len(seen)
+
+    text_bytes = 0
+    with span("import.insert") as sp:
+        new_fields = []
+        for f in fields:
+            fp = f["source_row_hash"]
+            if fp in seen:
+                counts["skipped"] += 1
+                continue
+            seen.add(fp)
+            new_fields.append(f)
+            text_bytes += len(f["comment_text"])
+
+        if copy_supported(session):
+            # PostgreSQL: COPY into a staging table + one merge statement
+            staged = [dict(f, project_id=project_id, milestone_id=milestone_id) for f in new_fields]
+            inserted = copy_import(session, staged, tracked=bool(default_tracked)).get(batch.id, 0)
+            # rows a concurrent import stored since the dedupe check count as skipped
+            counts["imported"] += inserted
+            counts["skipped"] += len(new_fields) - inserted
+            sp.update(rows=inserted, bytes=text_bytes, copy=True)
+        else:
+            items = [CommentItem(project_id=project_id, milestone_id=milestone_id, **f) for f in new_fields]
+            counts["imported"] += len(items)
+            session.add_all(items)
+            session.flush()  # assigns item ids (batched INSERT ... RETURNING)
+
+            # The working Comment only references the raw item, so it appears in the dashboard
+            # without storing the markup text twice.
+            session.add_all(
+                [
+                    Comment(
+                        comment_item_id=item.id,
+                        project_id=project_id,
+                        milestone_id=milestone_id,
+                        discipline_id=item.discipline_id,
+                        status="Open",
+                        tracked=bool(default_tracked),
+                    )
+                    for item in items
+                ]
+            )
+            session.flush()
+            sp["rows"] = len(items)
+            sp["bytes"] = text_bytes
+
+
+def import_files(
+    session: Session,
+    files: List[ParsedFile],
+    *,
+    project_id: int,
+    milestone_id: Optional[int],
+    discipline: str,
+    default_tracked: bool,
+    delta: bool = False,
+    infer_disciplines: bool = True,
+) -> List[ImportResult]:
+    """
+    Import several parsed files in one transaction, with one ImportBatch and one
+    ImportResult per file (same order). Disciplines, lookups, delta matching, dedupe and
+    the inserts run per chunk of IMPORT_CHUNK_ROWS rows; a row repeated across files or
+    chunks is stored once (the first wins).
+    See import_rows for `delta`, `infer_disciplines` and the file-level skip.
+
+    The caller owns the session/transaction.
+    """
+    results: List[Optional[ImportResult]] = [None] * len(files)
+    batches: Dict[int, ImportBatch] = {}
+    seen_digests: Dict[str, int] = {}
+    repeats: Dict[int, int] = {}  # same file uploaded twice -> index of its first copy
+    for idx, pf in enumerate(files):
+        previous = find_identical_import(session, project_id, milestone_id, pf.file_sha256)
+        if previous is None and pf.file_sha256 in seen_digests:
+            previous = batches[seen_digests[pf.file_sha256]]
+            repeats[idx] = seen_digests[pf.file_sha256]
+        if previous is not None:
+            results[idx] = ImportResult(
+                batch_id=previous.id,
+                rows=pf.rows,
+                imported=0,
+                skipped=pf.rows,
+                file_skipped=True,
+                source_filename=pf.name,
+            )
+            continue
+        batches[idx] = ImportBatch(
+            project_id=project_id,
+            milestone_id=milestone_id,
+            source_filename=pf.name,
+            discipline=pf.discipline or discipline,
+            file_sha256=pf.file_sha256,
+            row_count=pf.rows,
+        )
+        if pf.file_sha256:
+            seen_digests[pf.file_sha256] = idx
+    session.add_all(batches.values())
+    session.flush()  # get batch ids without closing session
+    for idx, first in repeats.items():
+        results[idx].batch_id = batches[first].id
+    if batches:
+        touch(session, project_id)  # the COPY path and delta updates bypass the ORM
+
+    counts: Dict[int, Dict[str, int]] = {
+        b.id: {"imported": 0, "skipped": 0, "changed": 0, "unchanged": 0, "text_changed": 0} for b in batches.values()
+    }
+    done: set[str] = set()  # delta mode: markup ids already classified by this call
+    for idx, batch in batches.items():
+        # Files go through in chunks, so a streamed XML export never has all of its rows
+        # in memory at once. Earlier chunks are flushed, so dedupe still sees them.
+        for file_fields in files[idx].field_batches():
+            _import_chunk(
+                session,
+                batch,
+                file_fields,
+                project_id=project_id,
+                milestone_id=milestone_id,
+                default_tracked=default_tracked,
+                delta=delta,
+                infer_disciplines=infer_disciplines,
+                counts=counts[batch.id],
+                done=done,
+            )
+
+    for idx, batch in batches.items():
+        c = counts[batch.id]
+        results[idx] = ImportResult(
+            batch_id=batch.id,
+            rows=files[idx].rows,
+            imported=c["imported"],
+            skipped=c["skipped"] + c["unchanged"],
+            changed=c["changed"],
+            text_changed=c["text_changed"],
+            unchanged=c["unchanged"],
+            source_filename=files[idx].name,
+        )
+    return results
@@ -0,0 +1,145 @@
+# src/instrument.py
+"""
+Lightweight timing spans for the hot paths (SQL, sessions, import stages, triage, exporters).
+
+    with span("import.parse", bytes=len(raw)) as sp:
+        rows = ...
+        sp["rows"] = len(rows)
+
+A span is one perf_counter pair and a dict append. Inside a Streamlit script run the
+spans go to a per-session ring buffer (st.session_state), tagged with the current rerun
+started by `begin_rerun()`; elsewhere (bench/, worker threads) they go to a process-wide
+ring buffer. The Diagnostics page reads both.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import streamlit as st
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except Exception:  # pragma: no cover - streamlit moved it before
+    get_script_run_ctx = None
+
+MAX_SPANS = 5000
+
+_SESSION_KEY = "_diag_spans"
+_RERUN_KEY = "_diag_rerun"
+
+_process_spans: Deque[Dict[str, Any]] = deque(maxlen=MAX_SPANS)
+_process_lock = threading.Lock()
+
+
+def _script_ctx():
+    if get_script_run_ctx is None:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def _session_buffer() -> Optional[Deque[Dict[str, Any]]]:
+    if _script_ctx() is None:
+        return None
+    buf = st.session_state.get(_SESSION_KEY)
+    if buf is None:
+        buf = deque(maxlen=MAX_SPANS)
+        st.session_state[_SESSION_KEY] = buf
+    return buf
+
+
+def begin_rerun(page: str) -> None:
+    """Mark the start of a page run; later spans in this session are grouped under it."""
+    if _script_ctx() is None:
+        return
+    st.session_state[_RERUN_KEY] = {
+        "rerun": uuid.uuid4().hex[:8],
+        "page": page,
+        "started": time.time(),
+    }
+
+
+def record(name: str, ms: float, **attrs: Any) -> None:
+    """Append a finished span (used directly by event hooks that can't wrap a `with`)."""
+    entry: Dict[str, Any] = {"name": name, "ms": round(ms, 3), "ts": time.time(), **attrs}
+    buf = _session_buffer()
+    if buf is not None:
+        rerun = st.session_state.get(_RERUN_KEY)
+        if rerun:
+            entry["rerun"] = rerun["rerun"]
+            entry["page"] = rerun["page"]
+        buf.append(entry)
+        return
+    with _process_lock:
+        _process_spans.append(entry)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time the block; the yielded dict can be filled with counts/byte sizes."""
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(name, (time.perf_counter() - t0) * 1000.0, **attrs)
+
+
+def session_spans() -> List[Dict[str, Any]]:
+    buf = _session_buffer()
+    return list(buf) if buf is not None else []
+
+
+def process_spans() -> List[Dict[str, Any]]:
+    with _process_lock:
+        return list(_process_spans)
+
+
+def clear_spans() -> None:
+    buf = _session_buffer()
+    if buf is not None:
+        buf.clear()
+    with _process_lock:
+        _process_spans.clear()
+
+
+def export_spans(path: str, spans: List[Dict[str, Any]]) -> int:
+    """Append spans as JSON lines to a local metrics file; returns how many were written."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in spans:
+            f.write(json.dumps(entry, default=str) + "\n")
+    return len(spans)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record one "sql" span per cursor execution (statement kind, rows, statement bytes)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_span_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_span_t0"].pop()
+        record(
+            "sql",
+            (time.perf_counter() - t0) * 1000.0,
+            op=statement.lstrip().split(None, 1)[0].upper() if statement else "",
+            rows=cursor.rowcount,
+            bytes=len(statement),
+            params=len(parameters) if executemany else 1,
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exc_ctx):
+        stack = exc_ctx.connection.info.get("_span_t0") if exc_ctx.connection is not None else None
+        if stack:
+            stack.pop()
@@ -3,14 +3,35 @@ from __future__ import annotations
 
 import json
 import re
+import time
 from typing import Dict, Any
 
 import streamlit as st
 
+from src.config import get_secret
+from src.instrument import span
+from src.llm_usage import note_call
+from src.startup import lazy_import
+
 # IMPORTANT:
 # This implementation uses Chat Completions for maximum compatibility
 # with OpenAI python versions commonly used on Streamlit Cloud.
-from openai import OpenAI
+# The openai package is imported lazily (first actual AI call), it is slow to import.
+#
+# Every call notes its model, token usage, retries and cache hit/miss for
+# src/llm_usage.py (apply_triage stores them in the triage_call table).
+
+# Transient API errors retried with backoff (LLM_MAX_RETRIES, default 2, like the client's own).
+_RETRYABLE = ("RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError")
+
+# Safe defaults when OPENAI_API_KEY is not set (no AI).
+_NO_KEY_RESULT: Dict[str, Any] = {
+    "tag": "",
+    "risk": "",
+    "required_response": "",
+    "owner": "",
+    "status": "Open",
+}
 
 
 def _normalize_risk(r: str) -> str:
@@ -53,7 +74,13 @@ def _safe_json_from_text(text: str) -> Dict[str, Any]:
         return {}
 
 
-@st.cache_data(show_spinner=False)
+def _max_retries() -> int:
+    try:
+        return max(0, int(get_secret("LLM_MAX_RETRIES", "2") or 2))
+    except ValueError:
+        return 2
+
+
 def triage_comment_cached(
     comment_text: str,
     discipline: str = "",
@@ -70,21 +97,44 @@ def triage_comment_cached(
       - owner: suggested owner role
       - status: suggested status (Open by default)
 
-    Safe defaults if API key missing.
+    Safe defaults if API key missing. Identical inputs are answered from st.cache_data.
     """
+    if not get_secret("OPENAI_API_KEY").strip():
+        # No AI if no key. Checked before the cache so the defaults are never cached (or
+        # logged as cache hits) and a key added later takes effect.
+        note_call(model=model, cache_hit=False, prompt_tokens=0, completion_tokens=0, retries=0)
+        return dict(_NO_KEY_RESULT)
+    called = {}
+    note_call(model=model, cache_hit=True)
+    result = _triage_cached(comment_text, discipline, sheet, subject, milestone, model, _called=called)
+    if not called.get("request"):
+        # Cache hit: nothing was sent, nothing spent.
+        note_call(prompt_tokens=0, completion_tokens=0, retries=0)
+    return result
+
 
-    api_key = st.secrets.get("OPENAI_API_KEY", "").strip()
+@st.cache_data(show_spinner=False)
+def _triage_cached(
+    comment_text: str,
+    discipline: str,
+    sheet: str,
+    subject: str,
+    milestone: str,
+    model: str,
+    _called: Dict[str, bool],
+) -> Dict[str, Any]:
+    # `_called` is left out of the cache key (leading underscore); it reports a real request.
+    api_key = get_secret("OPENAI_API_KEY").strip()
     if not api_key:
-        # No AI if no key
-        return {
-            "tag": "",
-            "risk": "",
-            "required_response": "",
-            "owner": "",
-            "status": "Open",
-        }
+        return dict(_NO_KEY_RESULT)
 
-    client = OpenAI(api_key=api_key)
+    openai = lazy_import("openai")
+    if openai is None:
+        raise RuntimeError("The openai package is not installed.")
+    # OPENAI_BASE_URL is optional (proxies, or the local fake server used by bench/).
+    base_url = get_secret("OPENAI_BASE_URL").strip() or None
+    client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    retryable = tuple(getattr(openai, name) for name in _RETRYABLE if hasattr(openai, name))
 
     system = (
         "You are a construction/design review assistant. "
@@ -108,14 +158,36 @@ def triage_comment_cached(
     }
 
     # Chat Completions call (compatible)
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user)},
-        ],
-        temperature=0.2,
-    )
+    _called["request"] = True
+    note_call(cache_hit=False)
+    max_retries = _max_retries()
+    with span("llm.request", model=model) as sp:
+        for attempt in range(max_retries + 1):
+            try:
+                resp = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": json.dumps(user)},
+                    ],
+                    temperature=0.2,
+                )
+                break
+            except retryable:
+                if attempt == max_retries:
+                    raise
+                note_call(retries=attempt + 1)
+                time.sleep(min(8.0, 0.5 * 2 ** attempt))
+        sp["retries"] = attempt
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            sp["prompt_tokens"] = usage.prompt_tokens
+            sp["completion_tokens"] = usage.completion_tokens
+            note_call(
+                model=getattr(resp, "model", None) or model,
+                prompt_tokens=usage.prompt_tokens or 0,
+                completion_tokens=usage.completion_tokens or 0,
+            )
 
     text = resp.choices[0].message.content if resp and resp.choices else ""
     data = _safe_json_from_text(text)
@@ -0,0 +1,249 @@
+# src/llm_usage.py
+"""
+AI triage telemetry: tokens, latency, cache hits and retries per call, cost estimates and
+per-run token budgets.
+
+src.llm notes what one call did (model, token usage, retries, whether st.cache_data
+answered it) in a thread-local slot; src.queries.apply_triage wraps every triage call in
+begin_call()/end_call(), times it, and writes one triage_call row per comment once the
+run ends (also when it fails part way, so spent tokens are never lost). Cache hits are
+logged with zero tokens: they cost nothing.
+
+Costs are estimates from MODEL_PRICES (USD per million prompt/completion tokens); set
+LLM_PRICES to a JSON object {"model": [prompt, completion]} to add or override models.
+
+A run stops before the call that would push it over its token ceiling (TRIAGE_TOKEN_BUDGET,
+0 = unlimited). The next call is estimated from this run's average so far, or from the
+comment length before anything was spent.
+
+    budget = run_budget()
+    updated = apply_triage(ids, milestone, triage_comment_cached, budget=budget)
+    if budget and budget.stopped: ...
+"""
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+from sqlmodel import select
+
+from src.config import get_secret
+from src.db import session_scope
+from src.models import Milestone, Project, TriageCall
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# USD per 1M tokens (prompt, completion).
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+# Budget estimate before a run has spent anything: the fixed system prompt and
+# instructions, ~4 characters per token, and a short JSON answer.
+PROMPT_OVERHEAD_TOKENS = 250
+COMPLETION_ESTIMATE_TOKENS = 60
+
+_call = threading.local()
+
+
+# ---- per-call notes (thread-local) -----------------------------------------
+def begin_call() -> None:
+    _call.stats = None
+
+
+def note_call(**stats: Any) -> None:
+    """Merge what the current triage call did into its note (src.llm calls this)."""
+    current = getattr(_call, "stats", None)
+    _call.stats = {**(current or {}), **stats}
+
+
+def end_call() -> Optional[Dict[str, Any]]:
+    """The current call's note, or None when the triage function records nothing."""
+    stats = getattr(_call, "stats", None)
+    _call.stats = None
+    return stats
+
+
+# ---- cost -------------------------------------------------------------------
+def model_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(MODEL_PRICES)
+    raw = get_secret("LLM_PRICES").strip()
+    if raw:
+        try:
+            prices.update({str(k): (float(v[0]), float(v[1])) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError, IndexError, AttributeError):
+            pass
+    return prices
+
+
+def estimate_cost(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    prices: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Optional[float]:
+    """Estimated USD for one call; None for a model without a known price."""
+    prices = prices if prices is not None else model_prices()
+    price = prices.get(model)
+    if price is None:
+        # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their base model.
+        base = max((m for m in prices if model.startswith(m + "-")), key=len, default=None)
+        if base is None:
+            return None
+        price = prices[base]
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+# ---- budgets ----------------------------------------------------------------
+@dataclass
+class TriageBudget:
+    max_tokens: int
+    used: int = 0
+    spending_calls: int = 0
+    stopped: bool = False
+    skipped: int = 0  # comments left untriaged once stopped
+
+    def estimate(self, text: str) -> int:
+        if self.spending_calls:
+            return -(-self.used // self.spending_calls)
+        return PROMPT_OVERHEAD_TOKENS + len(text or "") // 4 + COMPLETION_ESTIMATE_TOKENS
+
+    def allows(self, text: str) -> bool:
+        if self.used + self.estimate(text) > self.max_tokens:
+            self.stopped = True
+        return not self.stopped
+
+    def spend(self, tokens: int) -> None:
+        if tokens:
+            self.used += tokens
+            self.spending_calls += 1
+
+
+def run_budget(max_tokens: Optional[int] = None) -> Optional[TriageBudget]:
+    """Budget for one triage run; `max_tokens` defaults to TRIAGE_TOKEN_BUDGET (0 = none)."""
+    if max_tokens is None:
+        try:
+            max_tokens = int(get_secret("TRIAGE_TOKEN_BUDGET", "0") or 0)
+        except ValueError:
+            max_tokens = 0
+    return TriageBudget(max_tokens=max_tokens) if max_tokens > 0 else None
+
+
+# ---- storage and summaries --------------------------------------------------
+def call_row(
+    stats: Optional[Dict[str, Any]],
+    *,
+    project_id: int,
+    milestone_id: Optional[int],
+    comment_id: Optional[int],
+    latency_ms: float,
+    error: str = "",
+) -> Dict[str, Any]:
+    """triage_call values for one call; `latency_ms` is the wall time seen by the caller."""
+    stats = stats or {}
+    return {
+        "project_id": project_id,
+        "milestone_id": milestone_id,
+        "comment_id": comment_id,
+        "model": str(stats.get("model", "") or ""),
+        "prompt_tokens": int(stats.get("prompt_tokens", 0) or 0),
+        "completion_tokens": int(stats.get("completion_tokens", 0) or 0),
+        "latency_ms": round(latency_ms, 3),
+        "cache_hit": bool(stats.get("cache_hit", False)),
+        "retries": int(stats.get("retries", 0) or 0),
+        "error": error[:200],
+        "created_at": datetime.utcnow(),
+    }
+
+
+def record_calls(rows: Sequence[Dict[str, Any]]) -> None:
+    if rows:
+        with session_scope() as s:
+            s.execute(insert(TriageCall), list(rows))
+
+
+_USAGE_KEYS = {
+    "project": ["project"],
+    "milestone": ["project", "milestone"],
+    "model": ["model"],
+}
+
+
+def triage_usage(
+    by: str = "project",
+    *,
+    project_id: Optional[int] = None,
+    days: Optional[int] = 30,
+) -> "pd.DataFrame":
+    """
+    Triage totals grouped by project, project + milestone or model: calls, cache hit rate,
+    tokens, retries, errors, p50/p95 latency and estimated cost (NaN when some model in
+    the group has no price).
+    """
+    import pandas as pd
+
+    keys = _USAGE_KEYS[by]
+    stmt = (
+        select(
+            TriageCall.model,
+            TriageCall.prompt_tokens,
+            TriageCall.completion_tokens,
+            TriageCall.latency_ms,
+            TriageCall.cache_hit,
+            TriageCall.retries,
+            TriageCall.error,
+            Project.name.label("project"),
+            Milestone.name.label("milestone"),
+        )
+        .join(Project, Project.id == TriageCall.project_id, isouter=True)
+        .join(Milestone, Milestone.id == TriageCall.milestone_id, isouter=True)
+    )
+    if project_id:
+        stmt = stmt.where(TriageCall.project_id == project_id)
+    if days:
+        stmt = stmt.where(TriageCall.created_at >= datetime.utcnow() - timedelta(days=days))
+    with session_scope() as s:
+        rows = s.exec(stmt).all()
+
+    columns = keys + [
+        "calls", "cache_hit_rate", "prompt_tokens", "completion_tokens", "total_tokens",
+        "retries", "errors", "p50_ms", "p95_ms", "est_cost_usd",
+    ]
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.DataFrame([r._asdict() for r in rows])
+    df["project"] = df["project"].fillna("(deleted project)")
+    df["milestone"] = df["milestone"].fillna("(none)")
+    df["model"] = df["model"].replace("", "(unknown)")
+    prices = model_prices()
+    df["cost"] = [
+        estimate_cost(m, p, c, prices) if (p or c) else 0.0
+        for m, p, c in zip(df["model"], df["prompt_tokens"], df["completion_tokens"])
+    ]
+    df["cost"] = df["cost"].astype(float)  # None -> NaN
+    df["errors"] = df["error"] != ""
+
+    grouped = df.groupby(keys, dropna=False)
+    out = grouped.agg(
+        calls=("latency_ms", "size"),
+        cache_hit_rate=("cache_hit", "mean"),
+        prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"),
+        retries=("retries", "sum"),
+        errors=("errors", "sum"),
+        p50_ms=("latency_ms", "median"),
+        p95_ms=("latency_ms", lambda s: s.quantile(0.95)),
+        est_cost_usd=("cost", lambda s: s.sum(min_count=len(s))),
+    ).reset_index()
+    out["total_tokens"] = out["prompt_tokens"] + out["completion_tokens"]
+    return out[columns].sort_values("total_tokens", ascending=False, ignore_index=True)
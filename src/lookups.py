@@ -0,0 +1,97 @@
+# src/lookups.py
+"""
+Name <-> id interning for the author/sheet/subject/discipline lookup tables.
+
+The process keeps a name -> id dict per table. Ids never change once committed, so
+the cache never needs invalidation; names inserted by a transaction are parked in
+session.info and only promoted into the process cache after that transaction
+commits (a rollback simply drops them).
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, Optional, Type
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, select
+
+from src.db import insert_ignore
+from src.models import Author, Discipline, Sheet, Subject
+
+LOOKUP_MODELS: Dict[str, Type[SQLModel]] = {
+    "author": Author,
+    "sheet": Sheet,
+    "subject": Subject,
+    "discipline": Discipline,
+}
+
+_CHUNK = 500
+_PENDING_KEY = "_lookup_pending"
+
+_lock = threading.Lock()
+_cache: Dict[str, Dict[str, int]] = {kind: {} for kind in LOOKUP_MODELS}
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        with _lock:
+            for kind, names in pending.items():
+                _cache[kind].update(names)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _select_ids(session: Session, kind: str, names: Iterable[str]) -> Dict[str, int]:
+    model = LOOKUP_MODELS[kind]
+    names = list(names)
+    found: Dict[str, int] = {}
+    for i in range(0, len(names), _CHUNK):
+        chunk = names[i : i + _CHUNK]
+        for row_id, name in session.exec(select(model.id, model.name).where(model.name.in_(chunk))):
+            found[name] = row_id
+    return found
+
+
+def intern_names(session: Session, kind: str, names: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Ids for `names` (None counts as ""), inserting the ones that don't exist yet."""
+    wanted = {n or "" for n in names}
+    with _lock:
+        cache = _cache[kind]
+        out = {n: cache[n] for n in wanted if n in cache}
+    pending = session.info.setdefault(_PENDING_KEY, {}).setdefault(kind, {})
+    out.update({n: pending[n] for n in wanted if n not in out and n in pending})
+
+    missing = wanted - out.keys()
+    if not missing:
+        return out
+
+    committed = _select_ids(session, kind, missing)
+    with _lock:
+        _cache[kind].update(committed)
+    out.update(committed)
+
+    missing -= committed.keys()
+    if missing:
+        insert_ignore(session, LOOKUP_MODELS[kind], [{"name": n} for n in sorted(missing)], ["name"])
+        created = _select_ids(session, kind, missing)
+        pending.update(created)
+        out.update(created)
+    return out
+
+
+def lookup_id(session: Session, kind: str, name: Optional[str]) -> Optional[int]:
+    """Id for an existing name (no insert); None if the name was never stored."""
+    name = name or ""
+    with _lock:
+        cached = _cache[kind].get(name)
+    if cached is not None:
+        return cached
+    found = _select_ids(session, kind, [name])
+    with _lock:
+        _cache[kind].update(found)
+    return found.get(name)
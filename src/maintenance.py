@@ -0,0 +1,416 @@
+# src/maintenance.py
+"""
+Database maintenance: planner statistics, space reclamation, integrity checks and
+change-feed pruning, run by a local scheduler while the app is idle, plus a size report
+for the Database page.
+
+Tasks (interval in hours, 0 disables one):
+
+- analyze   (MAINTENANCE_ANALYZE_HOURS, 24): SQLite ANALYZE (bounded by
+  PRAGMA analysis_limit) + PRAGMA optimize; PostgreSQL ANALYZE.
+- vacuum    (MAINTENANCE_VACUUM_HOURS, 24): SQLite releases free pages with PRAGMA
+  incremental_vacuum once more than MAINTENANCE_VACUUM_FREE (10%) of the file is free.
+  A database created with auto_vacuum=NONE needs one full VACUUM to convert, which
+  locks the whole file while it rewrites it: the scheduler only reports that, and the
+  conversion runs from the Database page (run_task(..., allow_full=True)) or, with
+  MAINTENANCE_FULL_VACUUM=true, from the scheduler too. PostgreSQL VACUUMs (ANALYZE)
+  the tables whose dead-tuple share is above the same threshold.
+- integrity (MAINTENANCE_INTEGRITY_HOURS, 168): SQLite PRAGMA quick_check and
+  foreign_key_check; PostgreSQL invalid indexes, plus amcheck's bt_index_check when
+  that extension is installed.
+- prune     (MAINTENANCE_PRUNE_HOURS, 24): comment_change rows older than
+  CHANGE_FEED_DAYS (7), see src/versions.py.
+
+The scheduler is a daemon thread per process (MAINTENANCE_SCHEDULER=false turns it
+off). Every MAINTENANCE_CHECK_S (60) it looks at the last SQL statement this process ran
+for someone else; after MAINTENANCE_IDLE_S (300) of silence it runs the most overdue
+task, one per check. Last runs are kept in app settings, so other processes sharing the
+database see them and do not repeat the work. A failing task, or failing bookkeeping,
+is recorded as a span and the scheduler carries on.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+from src.config import get_secret
+from src.db import session_scope
+from src.instrument import record, span
+from src.settings import get_setting, set_setting
+from src.versions import prune_changes
+
+_SETTING_PREFIX = "maintenance."
+_MIN_FRAGMENT_PAGES = 16  # smaller objects get no fragmentation figure
+
+_local = threading.local()  # .active: SQL issued by maintenance itself
+_last_activity = time.monotonic()
+_scheduler: Optional[threading.Thread] = None
+_scheduler_lock = threading.Lock()
+_run_lock = threading.Lock()
+
+
+def _float_setting(key: str, default: float) -> float:
+    try:
+        return float(get_secret(key, str(default)) or default)
+    except ValueError:
+        return default
+
+
+def _maintenance_conn(engine: Engine) -> Connection:
+    # VACUUM cannot run inside a transaction on either backend.
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _app_tables(conn: Connection) -> List[str]:
+    from sqlmodel import SQLModel
+
+    import src.models  # noqa: F401  (register all tables)
+
+    present = set(inspect(conn).get_table_names())
+    return [t for t in SQLModel.metadata.tables if t in present]
+
+
+# ---- tasks ------------------------------------------------------------------
+def _analyze(engine: Engine) -> Dict[str, Any]:
+    with _maintenance_conn(engine) as conn:
+        if conn.dialect.name == "sqlite":
+            limit = int(_float_setting("MAINTENANCE_ANALYSIS_LIMIT", 1000))
+            conn.exec_driver_sql(f"PRAGMA analysis_limit={limit}")
+            conn.exec_driver_sql("ANALYZE")
+            conn.exec_driver_sql("PRAGMA optimize")
+            return {"analysis_limit": limit}
+        conn.exec_driver_sql("ANALYZE")
+        return {}
+
+
+def _sqlite_pages(conn: Connection) -> Tuple[int, int, int]:
+    """(page_size, page_count, freelist_count)."""
+    return tuple(conn.exec_driver_sql(f"PRAGMA {p}").scalar() or 0 for p in ("page_size", "page_count", "freelist_count"))  # type: ignore[return-value]
+
+
+def _full_vacuum_allowed() -> bool:
+    return get_secret("MAINTENANCE_FULL_VACUUM", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _vacuum(engine: Engine, allow_full: bool = False) -> Dict[str, Any]:
+    threshold = _float_setting("MAINTENANCE_VACUUM_FREE", 0.10)
+    with _maintenance_conn(engine) as conn:
+        if conn.dialect.name == "sqlite":
+            page_size, pages, free = _sqlite_pages(conn)
+            result: Dict[str, Any] = {"free_pages": free, "pages": pages}
+            if not pages or free / pages < threshold:
+                result["action"] = "none"
+                return result
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode == 2:  # INCREMENTAL
+                # It frees one page per step and sqlite3's execute() steps only once;
+                # executescript() runs statements to completion.
+                conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum;")
+                result["action"] = "incremental_vacuum"
+            elif not (allow_full or _full_vacuum_allowed()):
+                # The rebuild holds an exclusive lock for as long as it takes: not unattended.
+                result["action"] = "none"
+                result["needs_full_vacuum"] = True
+                return result
+            else:
+                # auto_vacuum only changes through a full rebuild; later runs are incremental.
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+                result["action"] = "vacuum (auto_vacuum -> incremental)"
+            result["reclaimed_bytes"] = (pages - _sqlite_pages(conn)[1]) * page_size
+            return result
+
+        stats = conn.execute(
+            text("SELECT relname, n_live_tup, n_dead_tup FROM pg_stat_user_tables WHERE schemaname = current_schema()")
+        ).all()
+        tables = set(_app_tables(conn))
+        vacuumed = []
+        for name, live, dead in stats:
+            if name in tables and dead and dead / ((live or 0) + dead) >= threshold:
+                conn.exec_driver_sql(f'VACUUM (ANALYZE) "{name}"')
+                vacuumed.append(name)
+        return {"action": "vacuum" if vacuumed else "none", "tables": vacuumed}
+
+
+def _integrity(engine: Engine) -> Dict[str, Any]:
+    with _maintenance_conn(engine) as conn:
+        if conn.dialect.name == "sqlite":
+            check = [r[0] for r in conn.exec_driver_sql("PRAGMA quick_check").fetchall()]
+            fk = conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+            problems = [] if check == ["ok"] else check[:20]
+            problems += [f"foreign key: {r[0]} rowid {r[1]} -> {r[2]}" for r in fk[:20]]
+            return {"ok": not problems, "problems": problems}
+
+        invalid = [
+            r[0]
+            for r in conn.execute(
+                text("SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid")
+            )
+        ]
+        problems = [f"invalid index: {name}" for name in invalid]
+        checked = 0
+        has_amcheck = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'amcheck'")).first()
+        if has_amcheck:
+            indexes = conn.execute(
+                text(
+                    "SELECT c.oid, c.relname FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "JOIN pg_am a ON a.oid = c.relam "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE a.amname = 'btree' AND i.indisvalid AND n.nspname = current_schema()"
+                )
+            ).all()
+            for oid, name in indexes:
+                try:
+                    conn.execute(text("SELECT bt_index_check(:oid)"), {"oid": oid})
+                    checked += 1
+                except Exception as e:
+                    problems.append(f"{name}: {e}")
+        return {"ok": not problems, "problems": problems, "amcheck_indexes": checked}
+
+
+def _prune(engine: Engine) -> Dict[str, Any]:
+    days = int(_float_setting("CHANGE_FEED_DAYS", 7))
+    with session_scope() as s:
+        return {"deleted": prune_changes(s, older_than_days=days), "older_than_days": days}
+
+
+# name -> (description, interval setting, default hours, task)
+TASKS: Dict[str, Tuple[str, str, float, Callable[..., Dict[str, Any]]]] = {
+    "analyze": ("Planner statistics (ANALYZE / PRAGMA optimize)", "MAINTENANCE_ANALYZE_HOURS", 24, _analyze),
+    "vacuum": ("Reclaim free space (incremental vacuum / VACUUM)", "MAINTENANCE_VACUUM_HOURS", 24, _vacuum),
+    "integrity": ("Integrity check", "MAINTENANCE_INTEGRITY_HOURS", 168, _integrity),
+    "prune": ("Prune the comment change feed", "MAINTENANCE_PRUNE_HOURS", 24, _prune),
+}
+
+
+def task_interval(name: str) -> Optional[timedelta]:
+    _, key, default, _ = TASKS[name]
+    hours = _float_setting(key, default)
+    return timedelta(hours=hours) if hours > 0 else None
+
+
+def last_run(name: str) -> Optional[Dict[str, Any]]:
+    raw = get_setting(_SETTING_PREFIX + name)
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def run_task(engine: Engine, name: str, **options: Any) -> Dict[str, Any]:
+    """
+    Run one task now and store its outcome; errors are recorded, not raised. `options`
+    go to the task (vacuum: allow_full=True for the one-time full VACUUM).
+    """
+    with _run_lock:
+        was_active = getattr(_local, "active", False)
+        _local.active = True
+        try:
+            t0 = time.perf_counter()
+            with span(f"maintenance.{name}") as sp:
+                try:
+                    detail = TASKS[name][3](engine, **options)
+                    ok = bool(detail.get("ok", True))
+                except OperationalError as e:  # e.g. "database is locked": try again next time
+                    detail, ok = {"error": str(e.orig)}, False
+                except Exception as e:
+                    detail, ok = {"error": f"{type(e).__name__}: {e}"}, False
+                sp["ok"] = ok
+            outcome = {
+                "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "ms": round((time.perf_counter() - t0) * 1000.0, 1),
+                "ok": ok,
+                "detail": detail,
+            }
+            try:
+                set_setting(_SETTING_PREFIX + name, json.dumps(outcome, default=str))
+            except Exception as e:  # e.g. the settings table is locked: the task is simply due again
+                outcome["store_error"] = f"{type(e).__name__}: {e}"
+            return outcome
+        finally:
+            _local.active = was_active
+
+
+def due_tasks(now: Optional[datetime] = None) -> List[str]:
+    """Tasks whose interval has passed, most overdue first (never-run tasks lead)."""
+    now = now or datetime.utcnow()
+    overdue: List[Tuple[float, str]] = []
+    for name in TASKS:
+        interval = task_interval(name)
+        if interval is None:
+            continue
+        last = last_run(name)
+        if last is None:
+            overdue.append((float("inf"), name))
+            continue
+        at = datetime.fromisoformat(last["at"].rstrip("Z"))
+        late = (now - at - interval).total_seconds()
+        if late >= 0:
+            overdue.append((late, name))
+    return [name for _, name in sorted(overdue, reverse=True)]
+
+
+# ---- idle scheduler ----------------------------------------------------------
+def idle_seconds() -> float:
+    return time.monotonic() - _last_activity
+
+
+def _track_activity(conn, cursor, statement, parameters, context, executemany):
+    global _last_activity
+    if not getattr(_local, "active", False):
+        _last_activity = time.monotonic()
+
+
+def _scheduler_loop(engine: Engine) -> None:
+    check_s = max(1.0, _float_setting("MAINTENANCE_CHECK_S", 60))
+    idle_s = _float_setting("MAINTENANCE_IDLE_S", 300)
+    _local.active = True  # nothing this thread runs counts as activity
+    while True:
+        time.sleep(check_s)
+        if idle_seconds() < idle_s:
+            continue
+        try:
+            due = due_tasks()
+            if due:
+                run_task(engine, due[0])
+        except Exception as e:  # the thread must outlive any one check
+            record("maintenance.scheduler", 0.0, error=f"{type(e).__name__}: {e}")
+
+
+def scheduler_enabled() -> bool:
+    return get_secret("MAINTENANCE_SCHEDULER", "true").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def start_scheduler(engine: Engine) -> bool:
+    """Start this process's idle scheduler once; returns whether it is running."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            return True
+        if not scheduler_enabled():
+            return False
+        event.listen(engine, "before_cursor_execute", _track_activity)
+        _scheduler = threading.Thread(target=_scheduler_loop, args=(engine,), name="db-maintenance", daemon=True)
+        _scheduler.start()
+        return True
+
+
+def scheduler_running() -> bool:
+    return _scheduler is not None and _scheduler.is_alive()
+
+
+# ---- size report ---------------------------------------------------------------
+def database_report(engine: Engine) -> Dict[str, Any]:
+    """
+    {"summary": {...}, "objects": [...]}: one object per table and index with its rows
+    (tables), bytes and fragmentation (SQLite: unused share of its pages; PostgreSQL:
+    dead-tuple share of a table). Counts every row of every table, so it is for the
+    admin page, not hot paths.
+    """
+    with span("maintenance.report"), _maintenance_conn(engine) as conn:
+        if conn.dialect.name == "sqlite":
+            return _sqlite_report(conn)
+        return _pg_report(conn)
+
+
+def _sqlite_report(conn: Connection) -> Dict[str, Any]:
+    page_size, pages, free = _sqlite_pages(conn)
+    path = conn.engine.url.database or ""
+    wal = f"{path}-wal"
+    summary = {
+        "backend": "sqlite",
+        "path": path,
+        "file_bytes": page_size * pages,
+        "wal_bytes": os.path.getsize(wal) if path and os.path.exists(wal) else 0,
+        "page_size": page_size,
+        "pages": pages,
+        "free_pages": free,
+        "free_pct": round(100.0 * free / pages, 2) if pages else 0.0,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.exec_driver_sql("PRAGMA auto_vacuum").scalar(), "?"),
+        "journal_mode": conn.exec_driver_sql("PRAGMA journal_mode").scalar(),
+        "analyzed": bool(conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first()),
+    }
+
+    sizes: Dict[str, Tuple[int, int]] = {}
+    try:
+        sizes = {
+            r[0]: (int(r[1] or 0), int(r[2] or 0))
+            for r in conn.exec_driver_sql("SELECT name, pgsize, unused FROM dbstat WHERE aggregate = TRUE")
+        }
+    except Exception:  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        pass
+
+    objects = []
+    for name, kind, table in conn.exec_driver_sql(
+        "SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY tbl_name, type DESC, name"
+    ):
+        size, unused = sizes.get(name, (None, None))
+        if size is not None and size < _MIN_FRAGMENT_PAGES * page_size:
+            unused = None  # a few pages are mostly slack by nature; not worth reporting
+        rows = conn.exec_driver_sql(f'SELECT COUNT(*) FROM "{name}"').scalar() if kind == "table" else None
+        objects.append(
+            {
+                "name": name,
+                "type": kind,
+                "table": table,
+                "rows": rows,
+                "bytes": size,
+                "fragmentation_pct": round(100.0 * unused / size, 2) if size and unused is not None else None,
+            }
+        )
+    return {"summary": summary, "objects": objects}
+
+
+def _pg_report(conn: Connection) -> Dict[str, Any]:
+    summary = {
+        "backend": "postgresql",
+        "database": conn.exec_driver_sql("SELECT current_database()").scalar(),
+        "database_bytes": conn.exec_driver_sql("SELECT pg_database_size(current_database())").scalar(),
+    }
+    tables = conn.execute(
+        text(
+            "SELECT relname, n_live_tup, n_dead_tup, pg_table_size(relid), "
+            "GREATEST(last_analyze, last_autoanalyze), GREATEST(last_vacuum, last_autovacuum) "
+            "FROM pg_stat_user_tables WHERE schemaname = current_schema() ORDER BY relname"
+        )
+    ).all()
+    summary["analyzed"] = bool(tables) and all(t[4] is not None for t in tables)
+    indexes = conn.execute(
+        text(
+            "SELECT indexrelname, relname, pg_relation_size(indexrelid) "
+            "FROM pg_stat_user_indexes WHERE schemaname = current_schema() ORDER BY relname, indexrelname"
+        )
+    ).all()
+    by_table: Dict[str, List[Any]] = {}
+    for name, table, size in indexes:
+        by_table.setdefault(table, []).append((name, size))
+
+    objects = []
+    for name, live, dead, size, analyzed, vacuumed in tables:
+        total = (live or 0) + (dead or 0)
+        objects.append(
+            {
+                "name": name,
+                "type": "table",
+                "table": name,
+                "rows": live,
+                "bytes": size,
+                "fragmentation_pct": round(100.0 * (dead or 0) / total, 2) if total else 0.0,
+                "last_analyze": analyzed,
+                "last_vacuum": vacuumed,
+            }
+        )
+        for index_name, index_size in by_table.get(name, []):
+            objects.append(
+                {"name": index_name, "type": "index", "table": name, "rows": None, "bytes": index_size, "fragmentation_pct": None}
+            )
+    return {"summary": summary, "objects": objects}
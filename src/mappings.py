@@ -0,0 +1,112 @@
+# src/mappings.py
+"""
+Stored import column-mapping plans, keyed by a hash of the CSV header set.
+
+The first upload with a new header layout stores its inferred plan; later uploads with
+the same columns reuse it without inference (process-wide LRU of CACHE_ENTRIES plans in
+front of the table).
+A plan saved from the Import page's mapping editor (source "user") replaces the stored
+one; resetting deletes it so the layout is inferred again.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List
+
+from sqlmodel import Session, select
+
+from src.db import insert_ignore
+from src.import_bluebeam import FIELD_KEYS, header_signature, infer_plan
+from src.models import ColumnMapping
+
+Plan = Dict[str, List[str]]
+
+
+@dataclass(frozen=True)
+class StoredPlan:
+    header_hash: str
+    plan: Plan
+    source: str  # inferred | user
+
+
+CACHE_ENTRIES = 256
+
+_lock = threading.Lock()
+_cache: "OrderedDict[str, StoredPlan]" = OrderedDict()
+
+
+def plan_key(plan: Plan) -> str:
+    """Stable text form of a plan (parsed uploads are cached per file + plan)."""
+    return json.dumps(plan, sort_keys=True, ensure_ascii=False)
+
+
+def plan_for(session: Session, headers: List[str]) -> StoredPlan:
+    """The stored plan for this header layout, inferring and storing it on first sight."""
+    header_hash = header_signature(headers)
+    with _lock:
+        cached = _cache.get(header_hash)
+        if cached is not None:
+            _cache.move_to_end(header_hash)
+    if cached is not None:
+        return cached
+
+    row = session.exec(select(ColumnMapping).where(ColumnMapping.header_hash == header_hash)).first()
+    if row is not None:
+        plan = json.loads(row.plan)
+        missing = [field for field in FIELD_KEYS if field not in plan]
+        if missing:
+            # Fields added after the plan was stored are inferred.
+            inferred = infer_plan(headers)
+            plan.update({field: inferred[field] for field in missing})
+        stored = StoredPlan(header_hash, plan, row.source)
+    else:
+        stored = StoredPlan(header_hash, infer_plan(headers), "inferred")
+        insert_ignore(
+            session,
+            ColumnMapping,
+            [
+                {
+                    "header_hash": header_hash,
+                    "headers": json.dumps(list(headers), ensure_ascii=False),
+                    "plan": plan_key(stored.plan),
+                    "source": stored.source,
+                    "updated_at": datetime.utcnow(),
+                }
+            ],
+            ["header_hash"],
+        )
+    with _lock:
+        _cache[header_hash] = stored
+        _cache.move_to_end(header_hash)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return stored
+
+
+def save_plan(session: Session, headers: List[str], plan: Plan) -> None:
+    """Store a user-edited plan for this header layout (fields missing from `plan` map to nothing)."""
+    header_hash = header_signature(headers)
+    plan = {field: [c for c in plan.get(field, []) if c in headers] for field in FIELD_KEYS}
+    row = session.exec(select(ColumnMapping).where(ColumnMapping.header_hash == header_hash)).first()
+    if row is None:
+        row = ColumnMapping(header_hash=header_hash, headers=json.dumps(list(headers), ensure_ascii=False))
+    row.plan = plan_key(plan)
+    row.source = "user"
+    row.updated_at = datetime.utcnow()
+    session.add(row)
+    with _lock:
+        _cache.pop(header_hash, None)
+
+
+def reset_plan(session: Session, headers: List[str]) -> None:
+    """Forget the stored plan; the next upload with these columns is inferred again."""
+    header_hash = header_signature(headers)
+    row = session.exec(select(ColumnMapping).where(ColumnMapping.header_hash == header_hash)).first()
+    if row is not None:
+        session.delete(row)
+    with _lock:
+        _cache.pop(header_hash, None)
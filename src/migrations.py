@@ -0,0 +1,279 @@
+# src/migrations.py
+"""
+Schema versioning.
+
+The applied version lives in the single-row `schema_info` table. `ensure_schema`
+reads it with one cheap query; only when it is behind SCHEMA_VERSION do we run
+`create_all` (new tables/indexes) and the pending migration steps below.
+
+A brand-new database gets `create_all` and is stamped with the latest version
+directly, so migrations only ever run against databases created by older code.
+Each step receives a Connection inside the upgrade transaction and should be
+safe to re-run (check before altering).
+"""
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from src.startup import timed_step
+
+
+def _column_names(conn: Connection, table: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+# ---- migration steps -------------------------------------------------------
+def _add_import_file_hash(conn: Connection) -> None:
+    if "file_sha256" not in _column_names(conn, "import_batch"):
+        conn.execute(text("ALTER TABLE import_batch ADD COLUMN file_sha256 VARCHAR NOT NULL DEFAULT ''"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_import_batch_file_sha256 ON import_batch (file_sha256)"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_comment_item_project_markup "
+            "ON comment_item (project_id, markup_id)"
+        )
+    )
+
+
+def _drop_columns(conn: Connection, table: str, columns: List[str]) -> None:
+    """Drop columns (and any index using them). SQLite needs 3.35+ for DROP COLUMN."""
+    present = _column_names(conn, table)
+    columns = [c for c in columns if c in present]
+    if not columns:
+        return
+    for ix in inspect(conn).get_indexes(table):
+        if set(ix["column_names"]) & set(columns):
+            conn.execute(text(f'DROP INDEX IF EXISTS "{ix["name"]}"'))
+    for col in columns:
+        conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{col}"'))
+
+
+_RAW_COLUMNS = ["sheet", "subject", "author", "created_at", "comment_text"]
+
+
+def _link_comments_to_items(conn: Connection) -> None:
+    """
+    comment.comment_item_id -> comment_item.id, then drop the raw columns duplicated on comment.
+
+    Import always wrote the CommentItem and its Comment back to back with identical raw
+    fields, so pairs are matched on (project, milestone, raw text fields) in id order. Comments
+    with no matching item (older data, manual inserts) get a CommentItem in a per-project
+    "(backfill)" batch so no text is lost.
+    """
+    if "comment_item_id" not in _column_names(conn, "comment"):
+        conn.execute(text("ALTER TABLE comment ADD COLUMN comment_item_id INTEGER REFERENCES comment_item (id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_comment_comment_item_id ON comment (comment_item_id)"))
+
+    if "comment_text" not in _column_names(conn, "comment"):
+        return  # already normalized
+
+    # created_at is left out of the key: it is a datetime round-tripped through each
+    # backend's text/timestamp handling and only adds false mismatches.
+    key_cols = "project_id, milestone_id, sheet, author, subject, comment_text"
+    items: Dict[tuple, deque] = defaultdict(deque)
+    linked = {
+        r[0] for r in conn.execute(text("SELECT comment_item_id FROM comment WHERE comment_item_id IS NOT NULL"))
+    }
+    for row in conn.execute(text(f"SELECT id, {key_cols} FROM comment_item ORDER BY id")):
+        if row[0] not in linked:
+            items[tuple(row[1:])].append(row[0])
+
+    links = []
+    orphans = []
+    for row in conn.execute(text(f"SELECT id, {key_cols} FROM comment WHERE comment_item_id IS NULL ORDER BY id")):
+        bucket = items.get(tuple(row[1:]))
+        if bucket:
+            links.append({"item_id": bucket.popleft(), "comment_id": row[0]})
+        else:
+            orphans.append(row)
+
+    batches: Dict[tuple, int] = {}
+    for row in orphans:
+        comment_id, project_id, milestone_id = row[0], row[1], row[2]
+        scope = (project_id, milestone_id)
+        if scope not in batches:
+            batches[scope] = conn.execute(
+                text(
+                    "INSERT INTO import_batch (project_id, milestone_id, source_filename, discipline, "
+                    "file_sha256, imported_at, row_count) "
+                    "VALUES (:p, :m, '(backfill)', '', '', :t, 0) RETURNING id"
+                ),
+                {"p": project_id, "m": milestone_id, "t": datetime.utcnow()},
+            ).scalar_one()
+        item_id = conn.execute(
+            text(
+                "INSERT INTO comment_item (import_batch_id, project_id, milestone_id, discipline, sheet, "
+                "subject, author, created_at, comment_text, source_row_hash) "
+                "SELECT :b, project_id, milestone_id, discipline, sheet, subject, author, created_at, "
+                "comment_text, :h FROM comment WHERE id = :c RETURNING id"
+            ),
+            {"b": batches[scope], "h": f"backfill:{comment_id}", "c": comment_id},
+        ).scalar_one()
+        links.append({"item_id": item_id, "comment_id": comment_id})
+
+    if links:
+        conn.execute(text("UPDATE comment SET comment_item_id = :item_id WHERE id = :comment_id"), links)
+
+    _drop_columns(conn, "comment", _RAW_COLUMNS)
+
+
+# (table, raw string column, lookup table); the id column is "<column>_id"
+_LOOKUP_COLUMNS = [
+    ("comment_item", "discipline", "discipline"),
+    ("comment_item", "sheet", "sheet"),
+    ("comment_item", "subject", "subject"),
+    ("comment_item", "author", "author"),
+    ("comment", "discipline", "discipline"),
+]
+
+_LOOKUP_INDEXES = [
+    ("comment_item", "discipline_id"),
+    ("comment_item", "sheet_id"),
+    ("comment_item", "author_id"),
+    ("comment", "discipline_id"),
+]
+
+
+def _encode_lookup_columns(conn: Connection) -> None:
+    """
+    Move the repeated author/sheet/subject/discipline strings into the lookup tables
+    (created by create_all just before this runs), point rows at them by id and drop
+    the strings. NULL and "" both map to the "" entry, as on import.
+    """
+    for table, column, lookup in _LOOKUP_COLUMNS:
+        present = _column_names(conn, table)
+        id_column = f"{column}_id"
+        if id_column not in present:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {id_column} INTEGER REFERENCES {lookup} (id)"))
+        if column not in present:
+            continue  # already encoded
+        conn.execute(
+            text(
+                f"INSERT INTO {lookup} (name) "
+                f"SELECT DISTINCT COALESCE({column}, '') FROM {table} "
+                f"WHERE COALESCE({column}, '') NOT IN (SELECT name FROM {lookup})"
+            )
+        )
+        conn.execute(
+            text(
+                f"UPDATE {table} SET {id_column} = "
+                f"(SELECT id FROM {lookup} WHERE name = COALESCE({table}.{column}, ''))"
+            )
+        )
+
+    for table, id_column in _LOOKUP_INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{id_column} ON {table} ({id_column})"))
+
+    _drop_columns(conn, "comment_item", ["discipline", "sheet", "subject", "author"])
+    _drop_columns(conn, "comment", ["discipline"])
+
+
+def _tables_only(conn: Connection) -> None:
+    """Nothing to alter: the new tables are created by create_all before the steps run."""
+
+
+def _add_project_data_version(conn: Connection) -> None:
+    if "data_version" not in _column_names(conn, "project"):
+        conn.execute(text("ALTER TABLE project ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_package_index(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_comment_package ON comment (project_id, status, tracked)"))
+
+
+def _add_archive_markup_index(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_comment_item_archive_project_markup "
+            "ON comment_item_archive (project_id, markup_id)"
+        )
+    )
+
+
+def _add_status_changed_at(conn: Connection) -> None:
+    for table in ("comment", "comment_archive"):
+        if "status_changed_at" not in _column_names(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN status_changed_at TIMESTAMP"))
+    # When existing comments were closed is unknown: their closed age starts now, so
+    # archiving never moves a comment that might have been closed yesterday.
+    conn.execute(
+        text("UPDATE comment SET status_changed_at = :now WHERE status_changed_at IS NULL AND status = 'Closed'"),
+        {"now": datetime.utcnow()},
+    )
+
+
+# (version, description, step). Version 1 is the original baseline schema.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (2, "import_batch.file_sha256 + markup_id index", _add_import_file_hash),
+    (3, "link comment -> comment_item, drop duplicated raw columns", _link_comments_to_items),
+    (4, "author/sheet/subject/discipline lookup tables", _encode_lookup_columns),
+    (5, "column_mapping table", _tables_only),
+    (6, "sheet_prefix table", _tables_only),
+    (7, "project.data_version", _add_project_data_version),
+    (8, "comment/comment_item archive tables", _tables_only),
+    (9, "comment_change feed", _tables_only),
+    (10, "consultant package index", _add_package_index),
+    (11, "triage_call telemetry table", _tables_only),
+    (12, "comment_item_archive markup_id index", _add_archive_markup_index),
+    (13, "comment.status_changed_at", _add_status_changed_at),
+]
+
+SCHEMA_VERSION = max([1] + [v for v, _, _ in MIGRATIONS])
+
+
+def _current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_info"):
+        return -1 if not inspect(conn).has_table("project") else 0
+    row = conn.execute(text("SELECT version FROM schema_info WHERE id = 1")).first()
+    return int(row[0]) if row else 0
+
+
+def _stamp(conn: Connection, version: int) -> None:
+    now = datetime.utcnow()
+    updated = conn.execute(
+        text("UPDATE schema_info SET version = :v, applied_at = :t WHERE id = 1"),
+        {"v": version, "t": now},
+    ).rowcount
+    if not updated:
+        conn.execute(
+            text("INSERT INTO schema_info (id, version, applied_at) VALUES (1, :v, :t)"),
+            {"v": version, "t": now},
+        )
+
+
+def ensure_schema(engine: Engine) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION. Returns the version found before upgrading
+    (-1 for a brand-new database).
+    """
+    import src.models  # noqa: F401  (register all tables on SQLModel.metadata)
+
+    with timed_step("schema version check"):
+        with engine.connect() as conn:
+            try:
+                found = int(
+                    conn.execute(text("SELECT version FROM schema_info WHERE id = 1")).scalar() or 0
+                )
+            except Exception:
+                conn.rollback()
+                found = _current_version(conn)
+    if found == SCHEMA_VERSION:
+        return found
+
+    with timed_step("schema upgrade"):
+        with engine.begin() as conn:
+            found = _current_version(conn)
+            SQLModel.metadata.create_all(conn)
+            if found >= 0:
+                for version, description, step in MIGRATIONS:
+                    if version > found:
+                        with timed_step(f"migration {version}: {description}"):
+                            step(conn)
+            _stamp(conn, SCHEMA_VERSION)
+    return found
@@ -4,9 +4,20 @@ from __future__ import annotations
 from datetime import datetime, date
 from typing import Optional
 
+from sqlalchemy import Column, DateTime, Index, Table, UniqueConstraint, event, inspect
 from sqlmodel import SQLModel, Field
 
 
+class SchemaInfo(SQLModel, table=True):
+    """Single-row table holding the applied schema version (see src/migrations.py)."""
+    __tablename__ = "schema_info"
+    __table_args__ = {"extend_existing": True}
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0)
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class AppSetting(SQLModel, table=True):
     __tablename__ = "app_setting"
     __table_args__ = {"extend_existing": True}
@@ -29,6 +40,9 @@ class Project(SQLModel, table=True):
     is_active: bool = Field(default=True, index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Bumped with every committed write to the project's comments (src/versions.py)
+    data_version: int = Field(default=0)
+
 
 class Milestone(SQLModel, table=True):
     __tablename__ = "milestone"
@@ -55,13 +69,88 @@ class ImportBatch(SQLModel, table=True):
     source_filename: str = Field(default="")
     discipline: str = Field(default="", index=True)
 
+    # sha256 of the uploaded bytes; an identical re-upload is skipped without parsing
+    file_sha256: str = Field(default="", index=True)
+
     imported_at: datetime = Field(default_factory=datetime.utcnow)
     row_count: int = Field(default=0)
 
 
+class ColumnMapping(SQLModel, table=True):
+    """
+    Import column-mapping plan for one CSV header layout (see src/mappings.py).
+    plan is JSON {field: [source columns, first non-empty wins]}.
+    """
+    __tablename__ = "column_mapping"
+    __table_args__ = {"extend_existing": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    header_hash: str = Field(unique=True)
+    headers: str = Field(default="[]")  # JSON list, for the editor
+    plan: str = Field(default="{}")
+    source: str = Field(default="inferred")  # inferred | user
+
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ------------------------------------------------------------
+# Lookup tables: a project has a few dozen authors and a few hundred sheets,
+# but hundreds of thousands of comments. Rows store small integer ids instead.
+# ------------------------------------------------------------
+class _LookupBase(SQLModel):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(default="", unique=True)
+
+
+class Author(_LookupBase, table=True):
+    __tablename__ = "author"
+    __table_args__ = {"extend_existing": True}
+
+
+class Sheet(_LookupBase, table=True):
+    __tablename__ = "sheet"
+    __table_args__ = {"extend_existing": True}
+
+
+class Subject(_LookupBase, table=True):
+    __tablename__ = "subject"
+    __table_args__ = {"extend_existing": True}
+
+
+class Discipline(_LookupBase, table=True):
+    __tablename__ = "discipline"
+    __table_args__ = {"extend_existing": True}
+
+
+class SheetPrefix(SQLModel, table=True):
+    """
+    Learned sheet-number prefix -> discipline for one project (see src/disciplines.py).
+    source is "import" (the discipline picked for an upload) or "user" (a correction).
+    """
+    __tablename__ = "sheet_prefix"
+    __table_args__ = (
+        UniqueConstraint("project_id", "prefix", name="uq_sheet_prefix_project_prefix"),
+        {"extend_existing": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    project_id: int = Field(index=True)
+    prefix: str = Field(default="")
+    discipline_id: int = Field(foreign_key="discipline.id")
+    source: str = Field(default="import")
+
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class CommentItem(SQLModel, table=True):
     __tablename__ = "comment_item"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # Delta re-import looks rows up by Bluebeam markup ID within a project
+        Index("ix_comment_item_project_markup", "project_id", "markup_id"),
+        {"extend_existing": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -69,10 +158,11 @@ class CommentItem(SQLModel, table=True):
     project_id: int = Field(index=True)
     milestone_id: Optional[int] = Field(default=None, index=True)
 
-    discipline: str = Field(default="", index=True)
-    sheet: str = Field(default="", index=True)
-    subject: str = Field(default="")
-    author: str = Field(default="", index=True)
+    # Dictionary-encoded (see the lookup tables above and src/lookups.py)
+    discipline_id: Optional[int] = Field(default=None, foreign_key="discipline.id", index=True)
+    sheet_id: Optional[int] = Field(default=None, foreign_key="sheet.id", index=True)
+    subject_id: Optional[int] = Field(default=None, foreign_key="subject.id")
+    author_id: Optional[int] = Field(default=None, foreign_key="author.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     comment_text: str = Field(default="")
@@ -86,21 +176,28 @@ class CommentItem(SQLModel, table=True):
 
 
 class Comment(SQLModel, table=True):
+    """
+    Working record for one imported markup. The raw markup (sheet, author, subject,
+    created_at, comment_text) lives only on the referenced CommentItem; read both
+    through src.queries, which joins them and resolves lookup ids to names.
+    """
     __tablename__ = "comment"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # Consultant package filter (project, status, tracked); the grouped ORDER BY then
+        # only sorts the package rows.
+        Index("ix_comment_package", "project_id", "status", "tracked"),
+        {"extend_existing": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    comment_item_id: Optional[int] = Field(default=None, foreign_key="comment_item.id", index=True)
+
     project_id: int = Field(index=True)
     milestone_id: Optional[int] = Field(default=None, index=True)
 
-    discipline: str = Field(default="", index=True)
-    sheet: str = Field(default="", index=True)
-    subject: str = Field(default="")
-    author: str = Field(default="", index=True)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-    comment_text: str = Field(default="")
+    # Working classification; starts as the import discipline and can be corrected
+    discipline_id: Optional[int] = Field(default=None, foreign_key="discipline.id", index=True)
 
     status: str = Field(default="Open", index=True)
     tracked: bool = Field(default=False, index=True)
@@ -110,3 +207,103 @@ class Comment(SQLModel, table=True):
     tag: str = Field(default="", index=True)
     risk: str = Field(default="", index=True)
     required_response: str = Field(default="")
+
+    # When `status` last changed (stamped on ORM writes); archival counts closed age from it.
+    status_changed_at: Optional[datetime] = Field(default=None)
+
+
+@event.listens_for(Comment, "before_insert")
+def _stamp_new_status(mapper, connection, target: Comment) -> None:
+    if target.status_changed_at is None:
+        target.status_changed_at = datetime.utcnow()
+
+
+@event.listens_for(Comment, "before_update")
+def _stamp_status_change(mapper, connection, target: Comment) -> None:
+    if inspect(target).attrs.status.history.has_changes():
+        target.status_changed_at = datetime.utcnow()
+
+
+class CommentChange(SQLModel, table=True):
+    """
+    Append-only change feed (see src/versions.py): one row per changed comment per
+    data_version bump, or a single row with comment_id NULL when a change touched the
+    whole project (imports, archiving) and readers should reload.
+    """
+    __tablename__ = "comment_change"
+    __table_args__ = (
+        Index("ix_comment_change_project_version", "project_id", "version"),
+        {"extend_existing": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    project_id: int
+    version: int
+    comment_id: Optional[int] = Field(default=None)
+
+    changed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class TriageCall(SQLModel, table=True):
+    """
+    One AI triage call (see src/llm_usage.py). Cache hits are logged with zero tokens;
+    error is empty unless the call failed.
+    """
+    __tablename__ = "triage_call"
+    __table_args__ = (
+        Index("ix_triage_call_project_created", "project_id", "created_at"),
+        {"extend_existing": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    project_id: int
+    milestone_id: Optional[int] = Field(default=None)
+    comment_id: Optional[int] = Field(default=None)
+
+    model: str = Field(default="")
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    latency_ms: float = Field(default=0.0)
+    cache_hit: bool = Field(default=False)
+    retries: int = Field(default=0)
+    error: str = Field(default="")
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ------------------------------------------------------------
+# Cold copies (see src/archive.py): same columns and ids as the hot tables plus
+# archived_at, but no foreign keys and only the indexes restore, dedupe and delta
+# matching need.
+# ------------------------------------------------------------
+def _cold_copy(hot: Table, name: str, indexed: dict[str, list[str]]) -> Table:
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in hot.columns
+    ]
+    return Table(
+        name,
+        SQLModel.metadata,
+        *columns,
+        Column("archived_at", DateTime, nullable=False),
+        *[Index(f"ix_{name}_{suffix}", *cols) for suffix, cols in indexed.items()],
+        extend_existing=True,
+    )
+
+
+comment_item_archive = _cold_copy(
+    CommentItem.__table__,
+    "comment_item_archive",
+    {
+        "project_id": ["project_id"],
+        "source_row_hash": ["source_row_hash"],
+        "project_markup": ["project_id", "markup_id"],
+    },
+)
+comment_archive = _cold_copy(
+    Comment.__table__,
+    "comment_archive",
+    {"project_id": ["project_id"], "comment_item_id": ["comment_item_id"]},
+)
@@ -0,0 +1,164 @@
+# src/package_batch.py
+"""
+Batch export of consultant packages: one ZIP with a text + CSV package per discipline
+(or per owner) instead of one download per filter change.
+
+The package rows are read once, ordered by the partition field and then the package
+grouping (src.queries.iter_package_items), so each partition arrives as a contiguous,
+already sorted run. Finished partitions are rendered in worker processes while the
+cursor moves on and written to the ZIP in order as their renders complete; at most a
+few partitions per worker are in flight, so memory holds a window of partitions, not
+the whole export. manifest.json with the item counts goes in last.
+
+    with open("packages.zip", "wb") as f:
+        manifest = write_package_zip(f, project_id, milestone_id, partition_by="owner")
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, BinaryIO, Deque, Dict, List, Optional, Sequence, Tuple
+
+from src.config import get_secret
+from src.exporters import DEFAULT_GROUPING, build_consultant_package, comments_to_dataframe, package_group_value
+from src.instrument import span
+from src.queries import iter_package_items
+
+# Fields a batch can be split by (a subset of PACKAGE_GROUPS).
+BATCH_PARTITIONS: Tuple[str, ...] = ("discipline", "owner")
+IN_FLIGHT_PER_WORKER = 2  # partitions rendered or waiting per worker before the oldest is written
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _package_workers() -> int:
+    try:
+        configured = int(get_secret("PACKAGE_WORKERS", "0") or 0)
+    except ValueError:
+        configured = 0
+    return configured if configured > 0 else min(4, os.cpu_count() or 1)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Long-lived and "spawn", for the same reasons as the import parser pool.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_package_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def render_partition(items: List[Any], header: str, group_by: Sequence[str]) -> Tuple[bytes, bytes]:
+    """(package text, CSV) of one partition; rows must already be ordered by `group_by`."""
+    text = build_consultant_package(items, header=header, group_by=group_by, presorted=True)
+    csv = comments_to_dataframe(items).to_csv(index=False)
+    return text.encode("utf-8"), csv.encode("utf-8")
+
+
+def _file_stem(value: str, used: Dict[str, int]) -> str:
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", value).strip("._") or "package"
+    used[stem] = used.get(stem, 0) + 1
+    return stem if used[stem] == 1 else f"{stem}-{used[stem]}"
+
+
+def write_package_zip(
+    out: BinaryIO,
+    project_id: int,
+    milestone_id: Optional[int] = None,
+    *,
+    partition_by: str = "discipline",
+    discipline: Optional[str] = None,
+    status: Optional[str] = None,
+    tracked_only: bool = False,
+    group_by: Sequence[str] = DEFAULT_GROUPING,
+    header: str = "",
+) -> Dict[str, Any]:
+    """
+    Write a ZIP of per-partition packages (`<name>.txt` + `<name>.csv`) and manifest.json
+    to `out`; returns the manifest.
+    """
+    if partition_by not in BATCH_PARTITIONS:
+        raise ValueError(f"partition_by must be one of {', '.join(BATCH_PARTITIONS)}")
+    group_by = tuple(g for g in group_by if g != partition_by)
+    rows = iter_package_items(
+        project_id,
+        milestone_id,
+        discipline=discipline,
+        status=status,
+        tracked_only=tracked_only,
+        group_by=(partition_by,) + group_by,
+    )
+
+    with span("export.package_zip", partition_by=partition_by) as sp:
+        manifest: Dict[str, Any] = {
+            "project_id": project_id,
+            "milestone_id": milestone_id,
+            "partition_by": partition_by,
+            "filters": {"discipline": discipline, "status": status, "tracked_only": tracked_only},
+            "group_by": list(group_by),
+            "generated": datetime.utcnow().isoformat() + "Z",
+            "total_items": 0,
+            "packages": [],
+        }
+        used: Dict[str, int] = {}
+        # (partition value, rows, pending render in a worker or None), oldest first
+        pending: Deque[Tuple[str, List[Any], Optional[Future]]] = deque()
+        pool = _get_pool() if _package_workers() > 1 else None
+        window = _package_workers() * IN_FLIGHT_PER_WORKER
+
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+
+            def write_oldest() -> None:
+                value, items, future = pending.popleft()
+                rendered = None
+                if future is not None:
+                    try:
+                        rendered = future.result()
+                    except BrokenProcessPool:
+                        _reset_pool()
+                text, csv = rendered or render_partition(items, header, group_by)
+                stem = _file_stem(value, used)
+                zf.writestr(f"{stem}.txt", text)
+                zf.writestr(f"{stem}.csv", csv)
+                manifest["packages"].append(
+                    {"name": value, "items": len(items), "files": [f"{stem}.txt", f"{stem}.csv"]}
+                )
+                manifest["total_items"] += len(items)
+
+            for value, run in itertools.groupby(rows, key=lambda it: package_group_value(it, partition_by)):
+                items = list(run)
+                future = None
+                if pool is not None:
+                    try:
+                        future = pool.submit(render_partition, items, header, group_by)
+                    except (BrokenProcessPool, RuntimeError):
+                        _reset_pool()
+                        pool = None
+                pending.append((value, items, future))
+                while len(pending) > (window if pool is not None else 0):
+                    write_oldest()
+            while pending:
+                write_oldest()
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+        sp.update(partitions=len(manifest["packages"]), rows=manifest["total_items"])
+    return manifest
@@ -0,0 +1,232 @@
+# src/package_cache.py
+"""
+Rendered consultant-package cache.
+
+The Consultant Package page reruns on every widget change, and rebuilding the package
+text and CSV each time means a full package query plus two renders. Rendered artifacts
+are kept here instead, keyed by format, the normalized filters, grouping, header text
+(text format only) and the project's data_version (src/versions.py): any committed
+write to the project changes the key, so entries never need explicit invalidation.
+
+Entries live in a process-wide LRU bounded by PACKAGE_CACHE_MB (default 64). Artifacts
+larger than PACKAGE_SPILL_KB (default 512) are spilled to a per-process temp directory,
+itself bounded by PACKAGE_CACHE_DISK_MB (default 512), and read back on a hit.
+
+    arts = package_artifacts(project_id, milestone_id, status="Needs Response", header=h)
+    arts["txt"].data, arts["csv"].data, arts["txt"].rows
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.config import get_secret
+from src.db import session_scope
+from src.exporters import DEFAULT_GROUPING, build_consultant_package, comments_to_dataframe
+from src.instrument import span
+from src.queries import load_package_items
+from src.versions import data_version
+
+
+def _render_txt(items: List[Any], header: str, group_by: Sequence[str]) -> bytes:
+    return build_consultant_package(items, header=header, group_by=group_by, presorted=True).encode("utf-8")
+
+
+def _render_csv(items: List[Any], header: str, group_by: Sequence[str]) -> bytes:
+    return comments_to_dataframe(items).to_csv(index=False).encode("utf-8")
+
+
+# format -> (renderer, whether the header text is part of the output)
+PACKAGE_FORMATS: Dict[str, Tuple[Callable[[List[Any], str, Sequence[str]], bytes], bool]] = {
+    "txt": (_render_txt, True),
+    "csv": (_render_csv, False),
+}
+
+
+@dataclass
+class Artifact:
+    data: bytes
+    rows: int
+
+
+@dataclass
+class _Entry:
+    rows: int
+    size: int
+    data: Optional[bytes] = None  # in memory...
+    path: str = ""  # ...or spilled to disk
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, _Entry]" = OrderedDict()
+_mem_bytes = 0
+_disk_bytes = 0
+_spill_dir = ""
+
+
+def _int_setting(key: str, default: int) -> int:
+    try:
+        return int(get_secret(key, str(default)) or default)
+    except ValueError:
+        return default
+
+
+def _limits() -> Tuple[int, int, int]:
+    """(memory bytes, disk bytes, spill threshold bytes)."""
+    return (
+        _int_setting("PACKAGE_CACHE_MB", 64) * 1024 * 1024,
+        _int_setting("PACKAGE_CACHE_DISK_MB", 512) * 1024 * 1024,
+        _int_setting("PACKAGE_SPILL_KB", 512) * 1024,
+    )
+
+
+def _spill_path(key: str) -> str:
+    global _spill_dir
+    if not _spill_dir:
+        _spill_dir = tempfile.mkdtemp(prefix="bluebeam-packages-")
+        atexit.register(shutil.rmtree, _spill_dir, True)
+    return os.path.join(_spill_dir, key)
+
+
+def _drop(key: str) -> None:
+    # Caller holds _lock.
+    global _mem_bytes, _disk_bytes
+    entry = _entries.pop(key)
+    if entry.path:
+        _disk_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    else:
+        _mem_bytes -= entry.size
+
+
+def package_key(fmt: str, project_id: int, version: int, **options: Any) -> str:
+    """Cache key of one rendered format; options are the filters/grouping/header that shape it."""
+    normalized = {k: (list(v) if isinstance(v, (list, tuple)) else v) for k, v in sorted(options.items())}
+    raw = json.dumps([fmt, project_id, version, normalized], ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_artifact(key: str) -> Optional[Artifact]:
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        _entries.move_to_end(key)
+        if entry.data is not None:
+            return Artifact(entry.data, entry.rows)
+        path, rows = entry.path, entry.rows
+    try:
+        with open(path, "rb") as f:
+            return Artifact(f.read(), rows)
+    except OSError:
+        with _lock:
+            if key in _entries:
+                _drop(key)
+        return None
+
+
+def put_artifact(key: str, data: bytes, rows: int) -> Artifact:
+    global _mem_bytes, _disk_bytes
+    max_mem, max_disk, spill = _limits()
+    entry = _Entry(rows=rows, size=len(data))
+    if entry.size > spill:
+        if entry.size > max_disk:
+            return Artifact(data, rows)  # too big to keep at all
+        entry.path = _spill_path(key)
+        with open(entry.path, "wb") as f:
+            f.write(data)
+    elif entry.size > max_mem:
+        return Artifact(data, rows)
+    else:
+        entry.data = data
+
+    with _lock:
+        if key in _entries:
+            _drop(key)
+        _entries[key] = entry
+        if entry.path:
+            _disk_bytes += entry.size
+        else:
+            _mem_bytes += entry.size
+        for old in list(_entries):
+            if _mem_bytes <= max_mem and _disk_bytes <= max_disk:
+                break
+            if old != key:
+                _drop(old)
+    return Artifact(data, rows)
+
+
+def clear_package_cache() -> None:
+    with _lock:
+        for key in list(_entries):
+            _drop(key)
+
+
+def package_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {"entries": len(_entries), "memory_bytes": _mem_bytes, "disk_bytes": _disk_bytes}
+
+
+def package_artifacts(
+    project_id: int,
+    milestone_id: Optional[int] = None,
+    *,
+    discipline: Optional[str] = None,
+    status: Optional[str] = None,
+    tracked_only: bool = False,
+    group_by: Sequence[str] = DEFAULT_GROUPING,
+    header: str = "",
+    formats: Sequence[str] = ("txt", "csv"),
+) -> Dict[str, Artifact]:
+    """
+    Rendered package formats for the given filters, from the cache where possible. The
+    package rows are loaded once, and only when some format is missing.
+    """
+    with session_scope() as s:
+        version = data_version(s, project_id) or 0
+    filters = {
+        "milestone_id": milestone_id,
+        "discipline": discipline or None,
+        "status": status or None,
+        "tracked_only": bool(tracked_only),
+        "group_by": tuple(group_by),
+    }
+    header = header.strip()
+
+    out: Dict[str, Artifact] = {}
+    missing: Dict[str, str] = {}
+    with span("package.cache", formats=",".join(formats)) as sp:
+        for fmt in formats:
+            with_header = PACKAGE_FORMATS[fmt][1]
+            key = package_key(fmt, project_id, version, **filters, **({"header": header} if with_header else {}))
+            hit = get_artifact(key)
+            if hit is not None:
+                out[fmt] = hit
+            else:
+                missing[fmt] = key
+        sp["misses"] = len(missing)
+
+        if missing:
+            items = load_package_items(
+                project_id,
+                milestone_id,
+                discipline=filters["discipline"],
+                status=filters["status"],
+                tracked_only=filters["tracked_only"],
+                group_by=filters["group_by"],
+            )
+            for fmt, key in missing.items():
+                render = PACKAGE_FORMATS[fmt][0]
+                out[fmt] = put_artifact(key, render(items, header, filters["group_by"]), len(items))
+    return {fmt: out[fmt] for fmt in formats}
@@ -0,0 +1,114 @@
+# src/pgcopy.py
+"""
+PostgreSQL fast path for the import insert stage.
+
+Instead of ORM inserts (one multi-row INSERT ... RETURNING per chunk for comment_item,
+then the same for comment), the rows are streamed with COPY ... FROM STDIN into a
+temporary staging table and merged into comment_item and comment with a single
+set-based statement. Rows whose fingerprint appeared in the meantime (a concurrent
+import of the same markups) are skipped by the merge.
+
+Needs psycopg 3 (its cursor.copy API); other drivers and SQLite keep the ORM path.
+PG_COPY_IMPORT=false turns the fast path off.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from src.config import get_secret
+from src.instrument import span
+
+# Staging columns, in COPY order; all but seq are comment_item columns
+STAGING_COLUMNS = [
+    "seq",
+    "import_batch_id",
+    "project_id",
+    "milestone_id",
+    "discipline_id",
+    "sheet_id",
+    "subject_id",
+    "author_id",
+    "created_at",
+    "comment_text",
+    "markup_id",
+    "status_raw",
+    "page_index",
+    "source_row_hash",
+]
+_ITEM_COLUMNS = ", ".join(STAGING_COLUMNS[1:])
+
+_CREATE_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS import_staging (
+    seq bigint NOT NULL,
+    import_batch_id integer NOT NULL,
+    project_id integer NOT NULL,
+    milestone_id integer,
+    discipline_id integer,
+    sheet_id integer,
+    subject_id integer,
+    author_id integer,
+    created_at timestamp NOT NULL,
+    comment_text varchar NOT NULL,
+    markup_id varchar,
+    status_raw varchar,
+    page_index integer,
+    source_row_hash varchar NOT NULL
+) ON COMMIT DROP
+"""
+
+_MERGE = f"""
+WITH items AS (
+    INSERT INTO comment_item ({_ITEM_COLUMNS})
+    SELECT {_ITEM_COLUMNS}
+    FROM import_staging s
+    WHERE NOT EXISTS (SELECT 1 FROM comment_item ci WHERE ci.source_row_hash = s.source_row_hash)
+    ORDER BY s.seq
+    RETURNING id, import_batch_id, project_id, milestone_id, discipline_id
+), comments AS (
+    INSERT INTO comment (
+        comment_item_id, project_id, milestone_id, discipline_id,
+        status, tracked, owner, tag, risk, required_response
+    )
+    SELECT id, project_id, milestone_id, discipline_id, 'Open', :tracked, '', '', '', ''
+    FROM items
+    ORDER BY id
+)
+SELECT import_batch_id, count(*) FROM items GROUP BY import_batch_id
+"""
+
+
+def copy_supported(session: Session) -> bool:
+    if get_secret("PG_COPY_IMPORT", "true").strip().lower() in ("0", "false", "no", "off"):
+        return False
+    dialect = session.get_bind().dialect
+    return dialect.name == "postgresql" and dialect.driver == "psycopg"
+
+
+def copy_import(session: Session, rows: List[Dict[str, Any]], *, tracked: bool) -> Dict[int, int]:
+    """
+    Insert CommentItem + Comment rows (dicts with the STAGING_COLUMNS except seq).
+    Returns inserted rows per import_batch_id.
+    """
+    if not rows:
+        return {}
+    conn = session.connection()
+    conn.execute(text(_CREATE_STAGING))
+    conn.execute(text("TRUNCATE import_staging"))
+
+    with span("import.copy", rows=len(rows)):
+        cur = conn.connection.cursor()
+        try:
+            with cur.copy(f"COPY import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN") as copy:
+                for seq, r in enumerate(rows):
+                    copy.write_row([seq] + [r.get(c) for c in STAGING_COLUMNS[1:]])
+        finally:
+            cur.close()
+
+    conn.execute(text("ANALYZE import_staging"))  # temp tables are never auto-analyzed
+    with span("import.merge", rows=len(rows)) as sp:
+        inserted = {batch_id: n for batch_id, n in conn.execute(text(_MERGE), {"tracked": bool(tracked)})}
+        sp["inserted"] = sum(inserted.values())
+    return inserted
@@ -0,0 +1,546 @@
+# src/queries.py
+"""
+Comment queries and updates shared by the pages, bench/ and scripts.
+Nothing here touches Streamlit widgets.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlmodel import select
+
+from src.archive import history_entities
+from src.db import session_scope
+from src.exporters import DEFAULT_GROUPING
+from src.instrument import span
+from src.disciplines import learn_prefixes, sheet_prefixes
+from src.llm_usage import TriageBudget, begin_call, call_row, end_call, record_calls
+from src.lookups import intern_names, lookup_id
+from src.models import Author, Comment, CommentItem, Discipline, Sheet, Subject
+from src.versions import changes_since, data_version
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Joined read model: the working Comment plus the raw fields of its CommentItem, with
+# lookup ids resolved to names. Rows expose these as attributes (row.sheet, row.comment_text, ...).
+def _view_columns(C, CI) -> List[Any]:
+    return [
+        C.id,
+        C.comment_item_id,
+        C.project_id,
+        C.milestone_id,
+        Discipline.name.label("discipline"),
+        Sheet.name.label("sheet"),
+        Subject.name.label("subject"),
+        Author.name.label("author"),
+        CI.created_at,
+        CI.comment_text,
+        CI.markup_id,
+        CI.status_raw,
+        C.status,
+        C.tracked,
+        C.owner,
+        C.due_date,
+        C.tag,
+        C.risk,
+        C.required_response,
+    ]
+
+
+COMMENT_VIEW_COLUMNS = _view_columns(Comment, CommentItem)
+
+
+def _entities(history: bool):
+    """Comment/CommentItem, or their hot + archived stand-ins (src/archive.py) for history views."""
+    return history_entities() if history else (Comment, CommentItem)
+
+
+def comment_view_select(*columns, history: bool = False):
+    """
+    SELECT over Comment joined to its raw CommentItem and lookup names (all view columns
+    by default). With `history`, archived comments are included; explicit `columns`
+    must then come from _entities(True).
+    """
+    C, CI = _entities(history)
+    return (
+        select(*(columns or _view_columns(C, CI)))
+        .select_from(C)
+        .join(CI, C.comment_item_id == CI.id)
+        .outerjoin(Discipline, C.discipline_id == Discipline.id)
+        .outerjoin(Sheet, CI.sheet_id == Sheet.id)
+        .outerjoin(Subject, CI.subject_id == Subject.id)
+        .outerjoin(Author, CI.author_id == Author.id)
+    )
+
+
+def _discipline_clause(session, discipline: str, C=Comment):
+    """Filter on the integer id; a name that was never stored matches nothing."""
+    discipline_id = lookup_id(session, "discipline", discipline)
+    return C.discipline_id == discipline_id if discipline_id is not None else sa.false()
+
+
+def filter_comments(
+    session,
+    stmt,
+    project_id: Optional[int],
+    milestone_id: Optional[int],
+    discipline: str = "All",
+    status: str = "All",
+    tracked_filter: str = "All",
+    search: str = "",
+    history: bool = False,
+):
+    """Apply the dashboard filters to a comment_view_select(history=history) statement."""
+    C, CI = _entities(history)
+    if project_id:
+        stmt = stmt.where(C.project_id == project_id)
+    if milestone_id:
+        stmt = stmt.where(C.milestone_id == milestone_id)
+
+    if discipline != "All":
+        stmt = stmt.where(_discipline_clause(session, discipline, C))
+
+    if status != "All":
+        stmt = stmt.where(C.status == status)
+
+    if tracked_filter != "All":
+        stmt = stmt.where(C.tracked == (tracked_filter == "Tracked"))
+
+    if search.strip():
+        q = f"%{search.strip()}%"
+        stmt = stmt.where(
+            (CI.comment_text.ilike(q))
+            | (Sheet.name.ilike(q))
+            | (Author.name.ilike(q))
+            | (C.tag.ilike(q))
+            | (C.required_response.ilike(q))
+        )
+    return stmt
+
+
+# Dashboard frame: low-cardinality columns are categorical and long text is only a
+# preview; load_full_text fetches the rest for the rows someone actually looks at.
+CATEGORY_COLUMNS = ("discipline", "status", "tag", "risk", "author", "owner", "sheet", "subject")
+PREVIEW_CHARS = 160
+# More changed rows than this and refresh_comments reloads instead of patching.
+REFRESH_MAX_ROWS = 2000
+
+
+def _dashboard_select(session, project_id, milestone_id, discipline, status, tracked_filter, search, history):
+    """Filtered dashboard statement (text previews, newest first) and the Comment entity it reads."""
+    C, CI = _entities(history)
+    # One character past the preview length tells whether the text was cut.
+    previews = {
+        "comment_text": sa.func.substr(CI.comment_text, 1, PREVIEW_CHARS + 1).label("comment_text"),
+        "required_response": sa.func.substr(C.required_response, 1, PREVIEW_CHARS + 1).label("required_response"),
+    }
+    columns = [previews.get(getattr(col, "key", None), col) for col in _view_columns(C, CI)]
+    stmt = filter_comments(
+        session,
+        comment_view_select(*columns, history=history),
+        project_id,
+        milestone_id,
+        discipline,
+        status,
+        tracked_filter,
+        search,
+        history,
+    )
+    return stmt.order_by(CI.created_at.desc()), C
+
+
+def load_comments(
+    project_id: Optional[int],
+    milestone_id: Optional[int],
+    discipline: str = "All",
+    status: str = "All",
+    tracked_filter: str = "All",
+    search: str = "",
+    history: bool = False,
+) -> "pd.DataFrame":
+    """
+    Dashboard frame: one row per Comment matching the filters, newest first (archived ones
+    too with `history`). comment_text/required_response hold previews of PREVIEW_CHARS.
+    For a single project, df.attrs["data_version"] records what refresh_comments starts from.
+    """
+    with session_scope() as s:
+        # Version first: a write landing before the SELECT is simply re-read on the next refresh.
+        version = data_version(s, project_id) if project_id else None
+        stmt, _ = _dashboard_select(s, project_id, milestone_id, discipline, status, tracked_filter, search, history)
+
+        with span("dashboard.query", history=history) as sp:
+            rows = list(s.exec(stmt))
+            sp["rows"] = len(rows)
+
+    with span("dashboard.frame", rows=len(rows)) as sp:
+        df = _comments_frame(rows)
+        df.attrs["data_version"] = version
+        sp["bytes"] = int(df.memory_usage(deep=True).sum()) if not df.empty else 0
+    return df
+
+
+def refresh_comments(
+    df: "pd.DataFrame",
+    project_id: Optional[int],
+    milestone_id: Optional[int],
+    discipline: str = "All",
+    status: str = "All",
+    tracked_filter: str = "All",
+    search: str = "",
+    history: bool = False,
+) -> "pd.DataFrame":
+    """
+    Bring a load_comments frame (same filters) up to date. Only comments in the change
+    feed since df.attrs["data_version"] are re-read and patched in; project-wide changes
+    fall back to a full load. Returns `df` itself when nothing changed.
+    """
+    import pandas as pd
+
+    filters = (project_id, milestone_id, discipline, status, tracked_filter, search, history)
+    version = df.attrs.get("data_version")
+    if not project_id or version is None:
+        return load_comments(*filters)
+
+    with span("dashboard.refresh", since=version) as sp:
+        with session_scope() as s:
+            current, changed = changes_since(s, project_id, version)
+            if changed is not None and 0 < len(changed) <= REFRESH_MAX_ROWS:
+                stmt, C = _dashboard_select(s, *filters)
+                rows = list(s.exec(stmt.where(C.id.in_(sorted(changed)))))
+        if changed is None or len(changed) > REFRESH_MAX_ROWS:
+            sp["reload"] = True
+            return load_comments(*filters)
+        sp["changed"] = len(changed)
+        if not changed:
+            return df
+
+        # Changed rows that no longer match the filters simply drop out.
+        keep = df[~df["id"].isin(changed)]
+        patch = _comments_frame(rows)
+        if patch.empty:
+            out = keep.copy()
+        elif keep.empty:
+            out = patch
+        else:
+            out = pd.concat([keep, patch], ignore_index=True)
+            for name in CATEGORY_COLUMNS:
+                out[name] = pd.api.types.union_categoricals([keep[name], patch[name]], ignore_order=True)
+            out = out.sort_values("created_at", ascending=False, kind="stable")
+        out = out.reset_index(drop=True)
+        out.attrs["data_version"] = current
+        sp["rows"] = len(rows)
+    return out
+
+
+def load_full_text(ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """Untruncated comment_text/required_response for the given comment ids (hot or archived)."""
+    if not ids:
+        return {}
+    C, CI = _entities(True)
+    with session_scope() as s:
+        stmt = comment_view_select(C.id, CI.comment_text, C.required_response, history=True)
+        rows = s.exec(stmt.where(C.id.in_([int(i) for i in ids])))
+        return {
+            r.id: {"comment_text": r.comment_text or "", "required_response": r.required_response or ""}
+            for r in rows
+        }
+
+
+# group_by values accepted by count_comments
+COUNT_GROUPS = ("status", "tracked", "discipline", "milestone_id")
+
+
+def count_comments(session, filters: Dict[str, Any], group_by: Optional[str] = None) -> Dict[str, Any]:
+    """Filtered comment count, optionally per COUNT_GROUPS column: {"total": n, "groups": {...}}."""
+    history = filters.get("history", False)
+    C, _ = _entities(history)
+    if group_by is None:
+        stmt = filter_comments(session, comment_view_select(sa.func.count(C.id), history=history), **filters)
+        return {"total": int(session.exec(stmt).one())}
+    column = Discipline.name if group_by == "discipline" else getattr(C, group_by)
+    stmt = filter_comments(session, comment_view_select(column, sa.func.count(C.id), history=history), **filters)
+    groups = {("" if key is None else str(key)): int(n) for key, n in session.exec(stmt.group_by(column))}
+    return {"total": sum(groups.values()), "groups": groups}
+
+
+def _ordered_view(session, filters: Dict[str, Any]):
+    history = filters.get("history", False)
+    C, CI = _entities(history)
+    stmt = filter_comments(session, comment_view_select(history=history), **filters)
+    return stmt.order_by(CI.created_at.desc(), C.id.desc())
+
+
+def page_comments(session, filters: Dict[str, Any], *, limit: int, offset: int = 0) -> List[Any]:
+    """One page of comment view rows, newest first (id breaks ties so pages don't overlap)."""
+    return list(session.exec(_ordered_view(session, filters).limit(limit).offset(offset)))
+
+
+def iter_comments(session, filters: Dict[str, Any], chunk: int = 1000) -> Iterator[List[Any]]:
+    """All matching comment view rows in chunks, streamed from the cursor (for exports)."""
+    result = session.exec(_ordered_view(session, filters).execution_options(yield_per=chunk))
+    yield from result.partitions()
+
+
+def _preview(text: Optional[str]) -> str:
+    text = text or ""
+    return text if len(text) <= PREVIEW_CHARS else text[: PREVIEW_CHARS - 1] + "…"
+
+
+def _comments_frame(rows: List[Any]) -> "pd.DataFrame":
+    import pandas as pd
+
+    # Built column by column from one transpose of the result (no per-row dicts), and
+    # categoricals store each distinct value once.
+    n = len(rows)
+    cols = dict(zip(rows[0]._fields, zip(*rows))) if rows else {}
+
+    def col(name: str, default: Any = "") -> List[Any]:
+        return [default if v is None else v for v in cols.get(name, ())]
+
+    data: Dict[str, Any] = {
+        "select": [False] * n,  # checkbox column for selection
+        "id": list(cols.get("id", ())),
+        "discipline": col("discipline"),
+        "sheet": col("sheet"),
+        "subject": col("subject"),
+        "author": col("author"),
+        "created_at": pd.to_datetime(list(cols.get("created_at", ()))).floor("min"),
+        "status": [v or "Open" for v in cols.get("status", ())],
+        "tracked": [bool(v) for v in cols.get("tracked", ())],
+        "tag": col("tag"),
+        "risk": col("risk"),
+        "required_response": [_preview(v) for v in cols.get("required_response", ())],
+        "owner": col("owner"),
+        "due_date": [v.isoformat() if v else "" for v in cols.get("due_date", ())],
+        "comment_text": [_preview(v) for v in cols.get("comment_text", ())],
+    }
+    # Categorical even when empty, so frames can always be combined with union_categoricals.
+    return pd.DataFrame(data).astype({name: "category" for name in CATEGORY_COLUMNS})
+
+
+def bulk_update(
+    ids: List[int],
+    *,
+    status: Optional[str] = None,
+    tracked: Optional[bool] = None,
+    owner: Optional[str] = None,
+    due_date: Optional[dt.date] = None,
+    tag: Optional[str] = None,
+    risk: Optional[str] = None,
+    discipline: Optional[str] = None,
+) -> int:
+    """
+    Set the given fields on the selected comments. A discipline change is also learned
+    as a correction for the sheet prefixes of those comments (src/disciplines.py).
+    """
+    if not ids:
+        return 0
+    with session_scope() as s:
+        stmt = select(Comment).where(Comment.id.in_(ids))
+        rows = list(s.exec(stmt))
+        discipline_id = None
+        if discipline is not None:
+            discipline_id = intern_names(s, "discipline", [discipline])[discipline or ""]
+            sheets_by_project: Dict[int, List[str]] = {}
+            for project_id, sheet in s.exec(
+                comment_view_select(Comment.project_id, Sheet.name).where(Comment.id.in_(ids)).distinct()
+            ):
+                sheets_by_project.setdefault(project_id, []).append(sheet)
+            for project_id, sheets in sheets_by_project.items():
+                prefixes = sheet_prefixes(sheets).values()
+                learn_prefixes(s, project_id, {p: discipline for p in prefixes}, source="user")
+        for r in rows:
+            if discipline_id is not None:
+                r.discipline_id = discipline_id
+            if status is not None:
+                r.status = status
+            if tracked is not None:
+                r.tracked = tracked
+            if owner is not None:
+                r.owner = owner
+            if due_date is not None:
+                r.due_date = due_date
+            if tag is not None:
+                r.tag = tag
+            if risk is not None:
+                r.risk = risk
+
+        s.add_all(rows)
+    return len(ids)
+
+
+def apply_triage(
+    ids: List[int],
+    milestone_name: str,
+    triage_fn: Callable[..., Dict[str, Any]],
+    budget: Optional[TriageBudget] = None,
+) -> int:
+    """
+    Calls `triage_fn` (normally src.llm.triage_comment_cached) per comment and saves:
+    tracked, tag, risk, required_response
+
+    Every call is logged to triage_call (src/llm_usage.py). With a `budget`, the run stops
+    before the call that would exceed its token ceiling; budget.stopped/skipped tell the
+    caller, and the comments triaged so far are kept.
+    """
+    updated = 0
+    calls: List[Dict[str, Any]] = []
+    try:
+        with session_scope() as s:
+            ids = [int(i) for i in ids]
+            raw = {
+                r.id: r
+                for r in s.exec(
+                    comment_view_select(
+                        Comment.id,
+                        CommentItem.comment_text,
+                        Sheet.name.label("sheet"),
+                        Discipline.name.label("discipline"),
+                    ).where(Comment.id.in_(ids))
+                )
+            }
+            for n, comment_id in enumerate(ids):
+                obj = s.get(Comment, comment_id)
+                if not obj:
+                    continue
+                text = (raw[comment_id].comment_text or "") if comment_id in raw else ""
+                sheet = (raw[comment_id].sheet or "") if comment_id in raw else ""
+                discipline = (raw[comment_id].discipline or "") if comment_id in raw else ""
+
+                if budget is not None and not budget.allows(text):
+                    budget.skipped = len(ids) - n
+                    break
+
+                begin_call()
+                error = ""
+                t0 = time.perf_counter()
+                try:
+                    with span("triage.call", chars=len(text)):
+                        result = triage_fn(
+                            comment_text=text,
+                            sheet=sheet,
+                            discipline=discipline,
+                            milestone=milestone_name or "",
+                        )
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    row = call_row(
+                        end_call(),
+                        project_id=obj.project_id,
+                        milestone_id=obj.milestone_id,
+                        comment_id=comment_id,
+                        latency_ms=(time.perf_counter() - t0) * 1000.0,
+                        error=error,
+                    )
+                    calls.append(row)
+                    if budget is not None:
+                        budget.spend(row["prompt_tokens"] + row["completion_tokens"])
+
+                # Save results into DB
+                obj.tracked = bool(result.get("track", True))
+                obj.tag = str(result.get("tag", "") or "")
+                obj.risk = str(result.get("risk", "") or "")
+                obj.required_response = str(result.get("required_response", "") or "")
+
+                s.add(obj)
+                updated += 1
+    finally:
+        # In its own transaction: calls that failed (and rolled the run back) still cost tokens.
+        record_calls(calls)
+
+    return updated
+
+
+def _package_filters(stmt, project_id: int, milestone_id: Optional[int]):
+    stmt = stmt.where(Comment.project_id == project_id)
+    if milestone_id:
+        stmt = stmt.where(Comment.milestone_id == milestone_id)
+    return stmt
+
+
+def package_filter_options(project_id: int, milestone_id: Optional[int]) -> Dict[str, List[str]]:
+    """Distinct disciplines/statuses present for the package page's filter dropdowns."""
+    out: Dict[str, List[str]] = {}
+    with session_scope() as s:
+        disciplines = select(Discipline.name).distinct().join(Comment, Comment.discipline_id == Discipline.id)
+        statuses = select(Comment.status).distinct()
+        for name, stmt in (("discipline", disciplines), ("status", statuses)):
+            stmt = _package_filters(stmt, project_id, milestone_id)
+            out[name] = sorted(v for v in s.exec(stmt).all() if v not in (None, ""))
+    return out
+
+
+# ORDER BY per package grouping (src.exporters.PACKAGE_GROUPS); names come from the
+# lookup joins, working fields from Comment itself.
+_PACKAGE_ORDER: Dict[str, List[Any]] = {
+    "sheet": [sa.func.coalesce(Sheet.name, "")],
+    "discipline": [sa.func.coalesce(Discipline.name, "")],
+    # coalesce: NULLs sort first on SQLite but last on PostgreSQL.
+    "owner": [sa.func.coalesce(Comment.owner, "")],
+    "due_date": [Comment.due_date.is_(None), Comment.due_date],
+    "risk": [sa.func.coalesce(Comment.risk, "")],
+}
+
+
+def _package_select(
+    session,
+    project_id: int,
+    milestone_id: Optional[int],
+    discipline: Optional[str],
+    status: Optional[str],
+    tracked_only: bool,
+    group_by: Optional[Sequence[str]],
+):
+    stmt = _package_filters(comment_view_select(), project_id, milestone_id)
+    if discipline:
+        stmt = stmt.where(_discipline_clause(session, discipline))
+    if status:
+        stmt = stmt.where(Comment.status == status)
+    if tracked_only:
+        stmt = stmt.where(Comment.tracked == True)  # noqa: E712
+    if group_by is not None:
+        unknown = [g for g in group_by if g not in _PACKAGE_ORDER]
+        if unknown:
+            raise ValueError(f"unknown package grouping: {', '.join(unknown)}")
+        stmt = stmt.order_by(*[col for g in group_by for col in _PACKAGE_ORDER[g]], Comment.id)
+    return stmt
+
+
+def load_package_items(
+    project_id: int,
+    milestone_id: Optional[int] = None,
+    *,
+    discipline: Optional[str] = None,
+    status: Optional[str] = None,
+    tracked_only: bool = False,
+    group_by: Optional[Sequence[str]] = None,
+) -> List[Any]:
+    """
+    Comment view rows that go into a consultant package (filters applied in SQL). With
+    `group_by` (src.exporters.PACKAGE_GROUPS keys, possibly empty) they come ordered for
+    build_consultant_package(..., presorted=True).
+    """
+    with session_scope() as s:
+        return list(s.exec(_package_select(s, project_id, milestone_id, discipline, status, tracked_only, group_by)))
+
+
+def iter_package_items(
+    project_id: int,
+    milestone_id: Optional[int] = None,
+    *,
+    discipline: Optional[str] = None,
+    status: Optional[str] = None,
+    tracked_only: bool = False,
+    group_by: Sequence[str] = DEFAULT_GROUPING,
+    chunk: int = 500,
+) -> Iterator[Any]:
+    """load_package_items(group_by=...) streamed from the cursor, for exporters.write_package."""
+    with session_scope() as s:
+        stmt = _package_select(s, project_id, milestone_id, discipline, status, tracked_only, group_by)
+        yield from s.exec(stmt.execution_options(yield_per=chunk))
@@ -0,0 +1,207 @@
+# src/querylog.py
+"""
+Slow-query log and per-statement aggregates.
+
+Every cursor execution is timed through engine events. Statements slower than the
+threshold (SLOW_QUERY_MS, default 200 ms) land in a bounded log together with their
+parameters and the database's query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+PostgreSQL). All statements are also aggregated by normalized text (literals and IN
+lists collapsed), so a sudden jump in `calls` for one shape, e.g. an N+1 loop,
+stands out.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import get_secret
+
+MAX_SLOW_ENTRIES = 200
+MAX_STATEMENTS = 500
+SAMPLES_PER_STATEMENT = 256
+PLAN_TTL_S = 60.0
+
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+_lock = threading.Lock()
+_slow: Deque[Dict[str, Any]] = deque(maxlen=MAX_SLOW_ENTRIES)
+_stats: Dict[str, Dict[str, Any]] = {}
+_plans: Dict[str, tuple[float, str]] = {}
+
+try:
+    _threshold_ms = float(get_secret("SLOW_QUERY_MS", "200") or 200)
+except ValueError:
+    _threshold_ms = 200.0
+
+_PARAM = r"(?:\?|%\(\w+\)s|%s|:\w+|\$\d+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace, literals and expanded IN lists so equivalent statements group together."""
+    s = _SPACE.sub(" ", statement or "").strip()
+    s = _STRING.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    return _IN_LIST.sub("(...)", s)
+
+
+def get_threshold_ms() -> float:
+    return _threshold_ms
+
+
+def set_threshold_ms(ms: float) -> None:
+    global _threshold_ms
+    _threshold_ms = max(0.0, float(ms))
+
+
+def _short_params(parameters: Any, executemany: bool, limit: int = 500) -> str:
+    if executemany and isinstance(parameters, (list, tuple)):
+        shown = f"{len(parameters)} param sets, first: {parameters[0]!r}" if parameters else "[]"
+    else:
+        shown = repr(parameters)
+    return shown if len(shown) <= limit else shown[:limit] + "…"
+
+
+def _explain(conn, statement: str, parameters: Any, executemany: bool) -> str:
+    """Query plan via a raw DBAPI cursor (bypasses our own event hooks)."""
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if head not in _EXPLAINABLE:
+        return ""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return ""
+    params = parameters[0] if executemany and parameters else parameters
+    # On PostgreSQL a failed statement aborts the whole transaction, so the EXPLAIN runs
+    # inside a savepoint that is rolled back on error.
+    guard = dialect == "postgresql" and conn.in_transaction()
+    try:
+        cur = conn.connection.cursor()
+        try:
+            if guard:
+                cur.execute("SAVEPOINT querylog_explain")
+            try:
+                cur.execute(prefix + statement, params or ())
+                rows = cur.fetchall()
+            except Exception:
+                if guard:
+                    cur.execute("ROLLBACK TO SAVEPOINT querylog_explain")
+                raise
+            finally:
+                if guard:
+                    cur.execute("RELEASE SAVEPOINT querylog_explain")
+        finally:
+            cur.close()
+    except Exception as e:  # a plan is diagnostics only; never break the real query
+        return f"(EXPLAIN failed: {e})"
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(str(r[-1]) for r in rows)
+    return "\n".join(str(r[0]) for r in rows)
+
+
+def _record(conn, statement: str, parameters: Any, executemany: bool, ms: float) -> None:
+    key = normalize_statement(statement)
+    now = time.time()
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            if len(_stats) >= MAX_STATEMENTS:
+                # Evict the cheapest shape so the table stays bounded.
+                del _stats[min(_stats, key=lambda k: _stats[k]["total_ms"])]
+            st = _stats[key] = {
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "samples": deque(maxlen=SAMPLES_PER_STATEMENT),
+            }
+        st["calls"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        st["samples"].append(ms)
+
+        if ms < _threshold_ms:
+            return
+        cached = _plans.get(key)
+        plan = cached[1] if cached and now - cached[0] < PLAN_TTL_S else None
+
+    if plan is None:
+        plan = _explain(conn, statement, parameters, executemany)
+        with _lock:
+            _plans[key] = (now, plan)
+
+    with _lock:
+        _slow.append(
+            {
+                "ts": now,
+                "ms": round(ms, 3),
+                "statement": statement,
+                "normalized": key,
+                "params": _short_params(parameters, executemany),
+                "plan": plan,
+            }
+        )
+
+
+def install_query_log(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_querylog_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_querylog_t0"].pop()
+        _record(conn, statement, parameters, executemany, (time.perf_counter() - t0) * 1000.0)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exc_ctx):
+        stack = exc_ctx.connection.info.get("_querylog_t0") if exc_ctx.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+def slow_queries() -> List[Dict[str, Any]]:
+    """Slow statements, newest first."""
+    with _lock:
+        return list(reversed(_slow))
+
+
+def statement_stats() -> List[Dict[str, Any]]:
+    """Aggregates per normalized statement: calls, total/mean/p95/max ms."""
+    with _lock:
+        items = [(k, dict(v, samples=list(v["samples"]))) for k, v in _stats.items()]
+    out = []
+    for key, st in items:
+        samples = sorted(st["samples"])
+        p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))] if samples else 0.0
+        out.append(
+            {
+                "statement": key,
+                "calls": st["calls"],
+                "total_ms": round(st["total_ms"], 3),
+                "mean_ms": round(st["total_ms"] / st["calls"], 3) if st["calls"] else 0.0,
+                "p95_ms": round(p95, 3),
+                "max_ms": round(st["max_ms"], 3),
+            }
+        )
+    return sorted(out, key=lambda r: r["total_ms"], reverse=True)
+
+
+def reset_query_log() -> None:
+    with _lock:
+        _slow.clear()
+        _stats.clear()
+        _plans.clear()
+
@@ -1,23 +1,108 @@
 # src/settings.py
+"""
+Process-wide cached settings.
+
+All AppSetting rows are loaded once into an in-memory dict. Reads are plain
+dict lookups; writes go through to the database only when a value actually
+changes. A version stamp row lets other workers notice changes: each process
+re-checks the stamp at most every VERSION_CHECK_INTERVAL seconds and reloads
+everything when it moved.
+"""
 from __future__ import annotations
 
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Mapping, Optional
+
 from sqlmodel import select
 
 from src.db import session_scope
 from src.models import AppSetting
 
+VERSION_KEY = "__settings_version__"
+VERSION_CHECK_INTERVAL = 5.0  # seconds
 
-def get_setting(key: str, default: str = "") -> str:
-    with session_scope() as s:
-        row = s.get(AppSetting, key)
-        return row.value if row else default
+_lock = threading.Lock()
+_cache: Optional[Dict[str, str]] = None
+_version: str = ""
+_checked_at: float = 0.0
 
 
-def set_setting(key: str, value: str) -> None:
+def _load_all() -> None:
+    global _cache, _version, _checked_at
     with session_scope() as s:
-        row = s.get(AppSetting, key)
-        if row:
-            row.value = value
+        rows = s.exec(select(AppSetting)).all()
+    values = {r.key: r.value for r in rows}
+    _version = values.pop(VERSION_KEY, "")
+    _cache = values
+    _checked_at = time.monotonic()
+
+
+def _ensure_fresh() -> Dict[str, str]:
+    """Load the cache on first use; re-check the version stamp when it is due."""
+    global _checked_at
+    if _cache is None:
+        _load_all()
+    elif time.monotonic() - _checked_at > VERSION_CHECK_INTERVAL:
+        with session_scope() as s:
+            row = s.get(AppSetting, VERSION_KEY)
+            current = row.value if row else ""
+        if current != _version:
+            _load_all()
         else:
-            row = AppSetting(key=key, value=value)
-        s.add(row)
+            _checked_at = time.monotonic()
+    return _cache  # type: ignore[return-value]
+
+
+def invalidate_settings_cache() -> None:
+    """Drop the in-process cache; the next access reloads from the database."""
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def get_setting(key: str, default: str = "") -> str:
+    with _lock:
+        return _ensure_fresh().get(key, default)
+
+
+def get_settings() -> Dict[str, str]:
+    """Snapshot of all settings (excluding the internal version stamp)."""
+    with _lock:
+        return dict(_ensure_fresh())
+
+
+def set_settings(values: Mapping[str, str]) -> bool:
+    """
+    Write several settings in one transaction.
+    Only keys whose value differs from the cache are written; returns True if anything changed.
+    """
+    global _version, _checked_at
+    with _lock:
+        cache = _ensure_fresh()
+        changed = {k: str(v) for k, v in values.items() if cache.get(k) != str(v)}
+        if not changed:
+            return False
+
+        now = datetime.utcnow()
+        new_version = uuid.uuid4().hex
+        with session_scope() as s:
+            for key, value in {**changed, VERSION_KEY: new_version}.items():
+                row = s.get(AppSetting, key)
+                if row:
+                    row.value = value
+                    row.updated_at = now
+                else:
+                    row = AppSetting(key=key, value=value, updated_at=now)
+                s.add(row)
+
+        cache.update(changed)
+        _version = new_version
+        _checked_at = time.monotonic()
+        return True
+
+
+def set_setting(key: str, value: str) -> None:
+    set_settings({key: value})
@@ -0,0 +1,412 @@
+# src/similarity.py
+"""
+Comment similarity: "related comments" lookups and carry-forward of responses across
+milestones.
+
+Each project has a TF-IDF index over its comments' text: words and word pairs hashed
+into FEATURES buckets (crc32, so stable across processes), sublinear term counts, and
+IDF computed from the current document frequencies when the index is loaded. Very
+common features (in more than MAX_DF of the comments) are ignored once a project has a
+few dozen comments; they add cost without telling comments apart.
+
+The index is a CSR matrix in numpy arrays, persisted per project as an .npz under
+SIMILARITY_DIR (default: a directory in the system temp dir, one per database). It is
+append-only: update_index() adds the comments with ids above the last indexed one, so
+it is cheap to call after every import and before every query. Comments that were
+archived since are filtered out against the database when results are read. Markup
+text changed in place by a delta re-import (ImportResult.text_changed), and comments
+restored from the archive with their old ids, need rebuild_index(), which the import
+and projects pages run in those cases.
+
+Scoring joins query features with an inverted (feature-sorted) copy of the matrix, so a
+block of queries costs the postings of the features they actually use, and the cosine
+scores of a whole milestone against everything before it come from a few vectorized
+passes.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlmodel import select
+
+from src.config import get_secret
+from src.db import get_engine, session_scope
+from src.instrument import span
+from src.models import Comment, CommentItem, Milestone
+
+FEATURES = 1 << 18
+MAX_DF = 0.25
+MAX_DF_MIN_DOCS = 50  # below this every feature counts
+CARRY_FIELDS = ("required_response", "owner", "tag")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_BLOCK_CELLS = 4_000_000  # queries x documents scored per block
+
+_lock = threading.Lock()
+_indexes: Dict[int, Tuple[float, "SimilarityIndex"]] = {}  # project id -> (file mtime, index)
+
+
+def text_features(text: str) -> Dict[int, float]:
+    """Hashed word and word-pair features of a text, with sublinear counts."""
+    words = _TOKEN.findall((text or "").lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = Counter(zlib.crc32(g.encode("utf-8")) & (FEATURES - 1) for g in grams)
+    return {f: 1.0 + math.log(c) for f, c in counts.items()}
+
+
+def _csr(docs: Sequence[Dict[int, float]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(d) for d in docs])
+    indices = np.fromiter((f for d in docs for f in d), dtype=np.int32, count=int(indptr[-1]))
+    values = np.fromiter((v for d in docs for v in d.values()), dtype=np.float32, count=int(indptr[-1]))
+    return indptr, indices, values
+
+
+@dataclass
+class SimilarityIndex:
+    ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))  # ascending comment ids
+    milestone_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))  # -1: none
+    indptr: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    indices: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    tf: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    _prepared: Optional[Dict[str, np.ndarray]] = field(default=None, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def last_id(self) -> int:
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    def add(self, ids: Sequence[int], milestone_ids: Sequence[Optional[int]], texts: Sequence[str]) -> None:
+        """Append comments (ids above last_id, ascending)."""
+        if not len(ids):
+            return
+        indptr, indices, tf = _csr([text_features(t) for t in texts])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.milestone_ids = np.concatenate(
+            [self.milestone_ids, np.asarray([-1 if m is None else m for m in milestone_ids], dtype=np.int64)]
+        )
+        self.indptr = np.concatenate([self.indptr, indptr[1:] + self.indptr[-1]])
+        self.indices = np.concatenate([self.indices, indices])
+        self.tf = np.concatenate([self.tf, tf])
+        self._prepared = None
+
+    def _prepare(self) -> Dict[str, np.ndarray]:
+        # IDF weights, unit-length rows and the feature-sorted postings, once per change.
+        if self._prepared is None:
+            n = len(self.ids)
+            df = np.bincount(self.indices, minlength=FEATURES)
+            idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+            if n >= MAX_DF_MIN_DOCS:
+                idf[df > MAX_DF * n] = 0.0
+            rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+            weights = self.tf * idf[self.indices]
+            norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=n))
+            norms[norms == 0] = 1.0
+            weights = (weights / norms[rows]).astype(np.float32)
+            order = np.argsort(self.indices, kind="stable")
+            self._prepared = {
+                "idf": idf,
+                "weights": weights,
+                "post_features": self.indices[order],
+                "post_rows": rows[order],
+                "post_weights": weights[order],
+            }
+        return self._prepared
+
+    def query_vectors(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Unit-length TF-IDF rows (indptr, features, weights) for texts outside the index."""
+        idf = self._prepare()["idf"]
+        indptr, indices, tf = _csr([text_features(t) for t in texts])
+        weights = tf * idf[indices]
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=len(texts)))
+        norms[norms == 0] = 1.0
+        return indptr, indices, (weights / norms[rows]).astype(np.float32)
+
+    def stored_vectors(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The indexed rows at `positions`, in the same form as query_vectors()."""
+        weights = self._prepare()["weights"]
+        starts, ends = self.indptr[positions], self.indptr[positions + 1]
+        lengths = ends - starts
+        indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(lengths)
+        take = _ranges(starts, lengths)
+        return indptr, self.indices[take], weights[take]
+
+    def scores(self, indptr: np.ndarray, features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query row against every indexed comment (queries x len(self))."""
+        p = self._prepare()
+        n, m = len(self.ids), len(indptr) - 1
+        query_rows = np.repeat(np.arange(m, dtype=np.int64), np.diff(indptr))
+        keep = p["idf"][features] > 0  # ignored common features have the longest postings
+        features, weights, query_rows = features[keep], weights[keep], query_rows[keep]
+        starts = np.searchsorted(p["post_features"], features, side="left")
+        lengths = np.searchsorted(p["post_features"], features, side="right") - starts
+        take = _ranges(starts, lengths)
+        query_rows = np.repeat(query_rows, lengths)
+        products = p["post_weights"][take] * np.repeat(weights, lengths)
+        flat = np.bincount(query_rows * n + p["post_rows"][take], weights=products, minlength=m * n)
+        return flat.reshape(m, n)
+
+    def positions(self, comment_ids: Iterable[int]) -> np.ndarray:
+        """Row positions of the given comment ids (ids not in the index are dropped)."""
+        wanted = np.asarray(sorted(set(comment_ids)), dtype=np.int64)
+        pos = np.searchsorted(self.ids, wanted)
+        pos = pos[pos < len(self.ids)]
+        return pos[np.isin(self.ids[pos], wanted)]
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of range(start, start + length) for each pair, vectorized."""
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total, dtype=np.int64) - offsets + np.repeat(starts, lengths)
+
+
+# ---- persistence ---------------------------------------------------------------
+def index_dir() -> str:
+    configured = get_secret("SIMILARITY_DIR", "")
+    if configured:
+        return configured
+    # One directory per database, so project ids of different databases never mix.
+    url = get_engine().url.render_as_string(hide_password=True)
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"bluebeam-similarity-{digest}")
+
+
+def _index_path(project_id: int) -> str:
+    return os.path.join(index_dir(), f"project-{int(project_id)}.npz")
+
+
+def load_index(project_id: int) -> SimilarityIndex:
+    """The project's index as last saved (empty if there is none yet), cached per file version."""
+    path = _index_path(project_id)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return SimilarityIndex()
+    with _lock:
+        cached = _indexes.get(project_id)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with np.load(path) as data:
+        index = SimilarityIndex(
+            ids=data["ids"],
+            milestone_ids=data["milestone_ids"],
+            indptr=data["indptr"],
+            indices=data["indices"],
+            tf=data["tf"],
+        )
+    with _lock:
+        _indexes[project_id] = (mtime, index)
+    return index
+
+
+def _save_index(project_id: int, index: SimilarityIndex) -> None:
+    path = _index_path(project_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A temp file of its own per writer (threads of one process too), renamed into place.
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f, ids=index.ids, milestone_ids=index.milestone_ids, indptr=index.indptr, indices=index.indices, tf=index.tf
+            )
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    with _lock:
+        _indexes[project_id] = (os.path.getmtime(path), index)
+
+
+def update_index(project_id: int, *, rebuild: bool = False) -> SimilarityIndex:
+    """Add the project's comments imported since the last update (or rebuild from scratch) and save."""
+    index = SimilarityIndex() if rebuild else load_index(project_id)
+    with span("similarity.update", project_id=project_id, rebuild=rebuild) as sp:
+        with session_scope() as s:
+            rows = s.exec(
+                select(Comment.id, Comment.milestone_id, CommentItem.comment_text)
+                .join(CommentItem, Comment.comment_item_id == CommentItem.id)
+                .where(Comment.project_id == project_id)
+                .where(Comment.id > index.last_id)
+                .order_by(Comment.id)
+            ).all()
+        sp["added"] = len(rows)
+        if rows or rebuild:
+            if rows:
+                ids, milestone_ids, texts = zip(*rows)
+                index = replace(index, _prepared=None)  # readers may still hold the cached one
+                index.add(ids, milestone_ids, texts)
+            _save_index(project_id, index)
+        sp["comments"] = len(index)
+    return index
+
+
+def rebuild_index(project_id: int) -> SimilarityIndex:
+    return update_index(project_id, rebuild=True)
+
+
+# ---- queries -------------------------------------------------------------------
+def similar_comments(
+    project_id: int,
+    *,
+    comment_id: Optional[int] = None,
+    text: str = "",
+    k: int = 5,
+    min_score: float = 0.2,
+) -> List[Dict[str, Any]]:
+    """
+    Top-k comments of the project most similar to an indexed comment (or a free text),
+    best first: comment_id, milestone_id, score and the fields carry-forward reuses.
+    """
+    index = update_index(project_id)
+    if not len(index):
+        return []
+    with span("similarity.query", comments=len(index)):
+        if comment_id is not None:
+            pos = index.positions([comment_id])
+            if not len(pos):
+                return []
+            scores = index.scores(*index.stored_vectors(pos))[0]
+            scores[pos[0]] = -1.0  # not itself
+        else:
+            scores = index.scores(*index.query_vectors([text]))[0]
+        top = np.argsort(-scores, kind="stable")[: k * 2]  # headroom for archived ones
+        top = [int(i) for i in top if scores[i] >= min_score]
+        if not top:
+            return []
+        with session_scope() as s:
+            found = {
+                r.id: r
+                for r in s.exec(
+                    select(Comment.id, Comment.milestone_id, *[getattr(Comment, f) for f in CARRY_FIELDS]).where(
+                        Comment.id.in_([int(index.ids[i]) for i in top])
+                    )
+                )
+            }
+    out = []
+    for i in top:
+        row = found.get(int(index.ids[i]))
+        if row is None:
+            continue
+        out.append(
+            {
+                "comment_id": row.id,
+                "milestone_id": row.milestone_id,
+                "score": round(float(scores[i]), 3),
+                **{f: getattr(row, f) for f in CARRY_FIELDS},
+            }
+        )
+        if len(out) == k:
+            break
+    return out
+
+
+def carry_forward_suggestions(
+    project_id: int,
+    milestone_id: int,
+    *,
+    min_score: float = 0.6,
+) -> List[Dict[str, Any]]:
+    """
+    For each comment of `milestone_id` that has no response, owner or tag yet, the most
+    similar comment of the project's earlier milestones (created before this one) that
+    has at least one of them, if it scores at least `min_score`. One dict per suggestion: comment_id, source_id,
+    score and the source's CARRY_FIELDS.
+    """
+    index = update_index(project_id)
+    carry_cols = [getattr(Comment, f) for f in CARRY_FIELDS]
+    with session_scope() as s:
+        target = s.get(Milestone, milestone_id)
+        if target is None:
+            return []
+        earlier = select(Milestone.id).where(Milestone.project_id == project_id).where(
+            or_(
+                Milestone.created_at < target.created_at,
+                and_(Milestone.created_at == target.created_at, Milestone.id < target.id),
+            )
+        )
+        targets = s.exec(
+            select(Comment.id)
+            .where(Comment.project_id == project_id)
+            .where(Comment.milestone_id == milestone_id)
+            .where(*[col == "" for col in carry_cols])
+        ).all()
+        sources = {
+            r.id: r
+            for r in s.exec(
+                select(Comment.id, *carry_cols)
+                .where(Comment.project_id == project_id)
+                .where(Comment.milestone_id.in_(earlier))
+                .where(or_(*[col != "" for col in carry_cols]))
+            )
+        }
+    target_pos = index.positions(targets)
+    source_pos = index.positions(sources)
+    if not len(target_pos) or not len(source_pos):
+        return []
+
+    eligible = np.zeros(len(index), dtype=bool)
+    eligible[source_pos] = True
+    suggestions: List[Dict[str, Any]] = []
+    with span("similarity.carry_forward", targets=len(target_pos), sources=len(source_pos)) as sp:
+        block = max(1, _BLOCK_CELLS // len(index))
+        for i in range(0, len(target_pos), block):
+            chunk = target_pos[i : i + block]
+            scores = index.scores(*index.stored_vectors(chunk))
+            scores[:, ~eligible] = -1.0
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(chunk)), best]
+            for pos, b, score in zip(chunk, best, best_scores):
+                if score < min_score:
+                    continue
+                src = sources[int(index.ids[b])]
+                suggestions.append(
+                    {
+                        "comment_id": int(index.ids[pos]),
+                        "source_id": src.id,
+                        "score": round(float(score), 3),
+                        **{f: getattr(src, f) for f in CARRY_FIELDS},
+                    }
+                )
+        sp["suggestions"] = len(suggestions)
+    return suggestions
+
+
+def apply_carry_forward(suggestions: Iterable[Dict[str, Any]]) -> int:
+    """Copy the suggested fields onto their comments; fields filled in since are kept. Returns comments changed."""
+    by_id = {int(s["comment_id"]): s for s in suggestions}
+    if not by_id:
+        return 0
+    changed = 0
+    with session_scope() as s:
+        for row in s.exec(select(Comment).where(Comment.id.in_(list(by_id)))):
+            suggestion = by_id[row.id]
+            touched = False
+            for f in CARRY_FIELDS:
+                if not getattr(row, f) and suggestion.get(f):
+                    setattr(row, f, suggestion[f])
+                    touched = True
+            if touched:
+                s.add(row)
+                changed += 1
+    return changed
@@ -0,0 +1,71 @@
+# src/startup.py
+"""
+Process startup helpers: step timings and lazy imports of heavy optional modules.
+
+Everything here is process-wide; Streamlit reruns reuse the same interpreter,
+so a step that ran once (engine creation, schema check, openai import) is
+never paid for again on later reruns.
+"""
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Dict, List, Optional
+
+_PROCESS_STARTED = time.perf_counter()
+
+_lock = threading.Lock()
+_timings: List[Dict[str, object]] = []
+
+
+@contextmanager
+def timed_step(name: str):
+    """Record how long a one-off startup step took."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        with _lock:
+            _timings.append(
+                {
+                    "step": name,
+                    "ms": round(elapsed_ms, 2),
+                    "at_ms": round((t0 - _PROCESS_STARTED) * 1000.0, 2),
+                }
+            )
+
+
+def startup_report() -> List[Dict[str, object]]:
+    """Steps recorded so far in this process, in the order they started."""
+    with _lock:
+        return sorted(_timings, key=lambda r: r["at_ms"])
+
+
+def module_available(name: str) -> bool:
+    """True if `name` can be imported, without actually importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_import(name: str) -> Optional[ModuleType]:
+    """
+    Import a heavy/optional module on first use (timed), or return None if it isn't installed.
+    Later calls are plain sys.modules lookups.
+    """
+    import sys
+
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    try:
+        with timed_step(f"import {name}"):
+            return importlib.import_module(name)
+    except ImportError:
+        return None
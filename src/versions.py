@@ -0,0 +1,129 @@
+# src/versions.py
+"""
+Per-project data version and change feed.
+
+project.data_version is bumped in the same transaction as any committed write to that
+project's comments or milestones, so "did anything change?" is a single primary-key read for every
+process: the HTTP API derives its ETags from it, and the dashboard uses it to refresh
+its cached frame.
+
+Each bump also appends to comment_change which comments changed, so a reader holding
+version N can ask changes_since(N) and re-read only those rows. Writes that touch a
+whole project (imports, archiving) log one "reload" row instead of every id.
+
+ORM writes to Comment are picked up per id at flush (CommentItem and Milestone changes
+count as project-wide). Core DML that bypasses the unit of work (the import's COPY path
+and delta updates, archival) must call touch() itself.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, insert, update
+from sqlmodel import Session, select
+
+from src.models import Comment, CommentChange, CommentItem, Milestone, Project
+
+_KEY = "_touched_projects"
+
+
+def touch(session: Session, project_id: int, comment_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Mark a project's data as changed; its version is bumped when the session commits.
+    Without `comment_ids` the change counts as project-wide (readers reload).
+    """
+    touched: Dict[int, Optional[Set[int]]] = session.info.setdefault(_KEY, {})
+    project_id = int(project_id)
+    if comment_ids is None:
+        touched[project_id] = None
+    elif project_id not in touched:
+        touched[project_id] = set(comment_ids)
+    elif touched[project_id] is not None:
+        touched[project_id].update(comment_ids)
+
+
+def data_version(session: Session, project_id: int) -> Optional[int]:
+    """Current version of a project's data (None if the project doesn't exist)."""
+    return session.exec(select(Project.data_version).where(Project.id == project_id)).first()
+
+
+def data_versions(session: Session, project_ids: Iterable[int]) -> Dict[int, int]:
+    ids = list(project_ids)
+    if not ids:
+        return {}
+    return dict(session.exec(select(Project.id, Project.data_version).where(Project.id.in_(ids))).all())
+
+
+def changes_since(session: Session, project_id: int, version: int) -> Tuple[Optional[int], Optional[Set[int]]]:
+    """
+    (current version, ids of comments changed after `version`). The id set is None when
+    the reader must reload instead: a project-wide change, or the feed was pruned past
+    `version`. An unknown project gives (None, None).
+    """
+    current = data_version(session, project_id)
+    if current is None or current <= version:
+        return current, (set() if current is not None else None)
+    rows = session.exec(
+        select(CommentChange.version, CommentChange.comment_id)
+        .where(CommentChange.project_id == project_id)
+        .where(CommentChange.version > version)
+    ).all()
+    # Every bump writes at least one row, so a missing version means it was pruned.
+    if not rows or min(v for v, _ in rows) != version + 1:
+        return current, None
+    if any(comment_id is None for _, comment_id in rows):
+        return current, None
+    return current, {comment_id for _, comment_id in rows}
+
+
+def prune_changes(session: Session, older_than_days: int = 7) -> int:
+    """Drop feed rows older than the given age; readers that far behind reload."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    return session.execute(delete(CommentChange).where(CommentChange.changed_at < cutoff)).rowcount
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    # Runs while new/dirty/deleted still describe the flush, and new rows have their ids.
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, (Comment, CommentItem, Milestone)) or obj.project_id is None:
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Comment):
+            touch(session, obj.project_id, [obj.id])
+        else:
+            touch(session, obj.project_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump(session):
+    session.flush()  # pending ORM changes register their projects first
+    touched = session.info.pop(_KEY, None)
+    if not touched:
+        return
+    # One UPDATE, ids in a fixed order so concurrent writers lock rows alike.
+    session.execute(
+        update(Project)
+        .where(Project.id.in_(sorted(touched)))
+        .values(data_version=Project.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    versions = data_versions(session, touched)
+    now = datetime.utcnow()
+    feed = []
+    for project_id, comment_ids in touched.items():
+        version = versions.get(project_id)
+        if version is None:
+            continue
+        for comment_id in sorted(comment_ids) if comment_ids else [None]:
+            feed.append({"project_id": project_id, "version": version, "comment_id": comment_id, "changed_at": now})
+    if feed:
+        session.execute(insert(CommentChange), feed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session):
+    session.info.pop(_KEY, None)
@@ -0,0 +1,252 @@
+# src/xml_engine.py
+"""
+Streaming reader for Bluebeam XML markup exports.
+
+Besides the CSV Markups Summary, Revu can export the markups list as XML: one element
+per markup whose child elements are the columns (`<Page_Label>`, `<Comments>`,
+`<Status>`, ...), sometimes with attributes and a nested status history. The file is
+read with an incremental iterparse; each markup is flattened to header -> text and then
+removed from the tree. iter_xml_tables() hands the markups on in batches of
+XML_BATCH_ROWS as the same columnar CsvTable the CSV engines produce, so mapping plans,
+fingerprints and dedupe are shared (an XML and a CSV export of the same markups import
+as the same rows) while memory holds one batch rather than the whole document.
+scan_xml() makes the pass the preview needs and can keep its batches, so a file that
+is not too large is parsed only once.
+
+Markups are the elements named in MARKUP_TAGS that are children of the markup container:
+the parent of the first one found, at any depth, and any element with the same tag and
+depth as that parent. Elements inside a markup (e.g. <Row>s of a reply list or status
+history) are never markups themselves. Files that use other names fall back to treating
+every child of the root as one markup. Column names are the tag
+names with underscores read as spaces ("Page_Label" -> "Page Label"). A nested status
+history (an element named *History, or a Status/State element with entries) supplies
+"Status" when the markup has no status of its own: the last non-empty entry wins. Other
+nested content, e.g. rich-text <Comments>, is flattened to its text, one line per
+paragraph.
+
+defusedxml is used when installed; the bundled expat rejects entity expansion attacks
+on its own.
+"""
+from __future__ import annotations
+
+import io
+import xml.etree.ElementTree as ElementTree
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.csv_engine import CsvTable, sniff_encoding
+from src.instrument import span
+from src.startup import lazy_import
+
+MARKUP_TAGS = frozenset({"markup", "annotation", "row"})
+_STATUS_TAGS = frozenset({"status", "state"})
+_BLOCK_TAGS = frozenset({"p", "div", "li", "br", "tr", "paragraph"})
+
+HEADER_SAMPLE = 50  # markups read for read_xml_header()
+XML_BATCH_ROWS = 5000  # markups per table from iter_xml_tables()
+
+
+def _etree():
+    return lazy_import("defusedxml.ElementTree") or ElementTree
+
+
+def is_xml(raw: bytes) -> bool:
+    """Whether an upload looks like XML (first non-blank character is '<')."""
+    encoding, bom = sniff_encoding(raw[:4096])
+    head = raw[bom : bom + 512].decode(encoding, errors="ignore")
+    return head.lstrip().startswith("<")
+
+
+def _local(tag: Any) -> str:
+    return str(tag).rsplit("}", 1)[-1]
+
+
+def _column(name: str) -> str:
+    return _local(name).replace("_", " ").strip()
+
+
+def _latest_status(elem) -> str:
+    latest = ""
+    for node in elem.iter():
+        value = node.get("Status") or node.get("State") or ""
+        if not value and _local(node.tag).lower() in _STATUS_TAGS:
+            value = node.text or ""
+        if value.strip():
+            latest = value.strip()
+    return latest
+
+
+def _is_history(tag: Any) -> bool:
+    local = _local(tag).lower()
+    return local in _STATUS_TAGS or "history" in local
+
+
+def _nested_text(elem) -> str:
+    """Text of an element with markup inside (rich text): inline runs joined, block elements on their own lines."""
+    parts: List[str] = []
+
+    def walk(node) -> None:
+        if _local(node.tag).lower() in _BLOCK_TAGS:
+            parts.append("\n")
+        parts.append(node.text or "")
+        for child in node:
+            walk(child)
+            parts.append(child.tail or "")
+
+    walk(elem)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _flatten(elem, names: Dict[str, str]) -> Dict[str, str]:
+    row = {_column(k): v.strip() for k, v in elem.attrib.items()}
+    history = ""
+    for child in elem:
+        nested = len(child) > 0
+        if nested and _is_history(child.tag):
+            history = _latest_status(child) or history
+            continue
+        name = names.get(child.tag)
+        if name is None:
+            name = names[child.tag] = _column(child.tag)
+        if not row.get(name):  # repeated tags: the first non-empty value wins
+            row[name] = _nested_text(child) if nested else (child.text or "").strip()
+    if history and not row.get("Status"):
+        row["Status"] = history
+    return row
+
+
+def iter_markups(raw: bytes, *, generic: bool = False) -> Iterator[Dict[str, str]]:
+    """
+    Flattened markups of an XML export, in document order. `generic` takes every child of
+    the root as a markup instead of looking for MARKUP_TAGS.
+    """
+    names: Dict[str, str] = {}  # tag -> column name
+    markup_tags: Dict[str, bool] = {}  # tag -> is a markup tag
+    container: Optional[Tuple[int, Any]] = None  # (depth, tag) of the markups' parent
+    current = None  # the markup being read
+    stack: List[Any] = []
+    for event, elem in _etree().iterparse(io.BytesIO(raw), events=("start", "end")):
+        if event == "start":
+            # Decided on the way in: a nested <Row> ends before the markup around it.
+            if current is None and stack:
+                if generic:
+                    is_markup = len(stack) == 1
+                else:
+                    is_markup = markup_tags.get(elem.tag)
+                    if is_markup is None:
+                        is_markup = markup_tags[elem.tag] = _local(elem.tag).lower() in MARKUP_TAGS
+                    parent = (len(stack), stack[-1].tag)
+                    if is_markup and container is None:
+                        container = parent
+                    is_markup = is_markup and parent == container
+                if is_markup:
+                    current = elem
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem is current:
+            yield _flatten(elem, names)
+            current = None
+        elif current is not None or len(stack) != 1:
+            continue
+        # Processed (or top-level non-markup) elements leave the tree.
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def _markups(raw: bytes, limit: Optional[int] = None) -> Iterator[Dict[str, str]]:
+    found = 0
+    for generic in (False, True):
+        for row in iter_markups(raw, generic=generic):
+            found += 1
+            yield row
+            if limit is not None and found >= limit:
+                return
+        if found:
+            return
+
+
+def read_xml_header(raw: bytes) -> List[str]:
+    """Column names of an XML export, from its first HEADER_SAMPLE markups."""
+    names: Dict[str, None] = {}
+    for row in _markups(raw, HEADER_SAMPLE):
+        names.update(dict.fromkeys(row))
+    return list(names)
+
+
+def _table(rows: Iterable[Dict[str, str]], encoding: str) -> CsvTable:
+    columns: Dict[str, List[str]] = {}
+    n = 0
+    for row in rows:
+        for name, value in row.items():
+            col = columns.get(name)
+            if col is None:
+                col = columns[name] = [""] * n
+            col.append(value)
+        n += 1
+        for col in columns.values():
+            if len(col) < n:
+                col.append("")
+    return CsvTable(columns=columns, num_rows=n, encoding=encoding, engine="xml")
+
+
+def iter_xml_tables(raw_bytes: bytes, batch_rows: int = XML_BATCH_ROWS) -> Iterator[CsvTable]:
+    """
+    An XML markup export as consecutive tables of up to `batch_rows` markups (header ->
+    cell text, "" when missing). Columns can differ between batches.
+    """
+    encoding = sniff_encoding(raw_bytes[:4096])[0]
+    batch: List[Dict[str, str]] = []
+    for row in _markups(raw_bytes):
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield _table(batch, encoding)
+            batch = []
+    if batch:
+        yield _table(batch, encoding)
+
+
+def scan_xml(
+    raw_bytes: bytes,
+    preview_rows: int = 10,
+    *,
+    keep_rows: int = 0,
+    batch_rows: int = XML_BATCH_ROWS,
+) -> Tuple[int, List[str], List[Dict[str, str]], List[CsvTable]]:
+    """
+    (markup count, every column name, first `preview_rows` markups, tables) in one
+    streaming pass. The tables are the iter_xml_tables() batches when the file has at
+    most `keep_rows` markups, so it needn't be parsed again; otherwise [].
+    """
+    with span("import.parse", bytes=len(raw_bytes), engine="xml", scan=True) as sp:
+        encoding = sniff_encoding(raw_bytes[:4096])[0]
+        names: Dict[str, None] = {}
+        preview: List[Dict[str, str]] = []
+        tables: List[CsvTable] = []
+        batch: List[Dict[str, str]] = []
+        n = 0
+        for row in _markups(raw_bytes):
+            names.update(dict.fromkeys(row))
+            if n < preview_rows:
+                preview.append(row)
+            n += 1
+            if n > keep_rows:
+                tables, batch = [], []
+                continue
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                tables.append(_table(batch, encoding))
+                batch = []
+        if batch:
+            tables.append(_table(batch, encoding))
+        sp.update(rows=n, kept=bool(tables))
+    return n, list(names), preview, tables
+
+
+def read_xml_table(raw_bytes: bytes) -> CsvTable:
+    """Parse a whole XML markup export into one table; imports stream it with iter_xml_tables() instead."""
+    with span("import.parse", bytes=len(raw_bytes), engine="xml") as sp:
+        table = _table(_markups(raw_bytes), sniff_encoding(raw_bytes[:4096])[0])
+        sp["rows"] = table.num_rows
+    return table
@@ -0,0 +1,63 @@
+# tests/conftest.py
+"""
+Shared fixtures. The app caches its engine per process (st.cache_resource), so the
+whole run uses one temporary SQLite database, configured here before anything from
+src/ is imported; tests that need rows create their own project.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="bluebeam-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'app.db')}"
+os.environ["SIMILARITY_DIR"] = os.path.join(_TMP, "similarity")
+os.environ["MAINTENANCE_SCHEDULER"] = "false"
+os.environ.pop("OPENAI_API_KEY", None)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from sqlalchemy.engine import make_url
+
+    from src.db import get_engine, init_db
+
+    # Secrets win over env vars in src.config; never run the tests against a real database.
+    if get_engine().url.database != make_url(os.environ["DATABASE_URL"]).database:
+        pytest.exit(f"The app resolves DATABASE_URL to {get_engine().url!r}, not the test database.")
+    init_db()
+    return get_engine()
+
+
+@pytest.fixture
+def project_id(engine) -> int:
+    from src.db import session_scope
+    from src.models import Project
+
+    project = Project(name="Test project")
+    with session_scope() as s:
+        s.add(project)
+    return project.id
+
+
+@pytest.fixture
+def milestone_id(project_id) -> int:
+    from src.db import session_scope
+    from src.models import Milestone
+
+    milestone = Milestone(project_id=project_id, name="SD")
+    with session_scope() as s:
+        s.add(milestone)
+    return milestone.id
+
+
+@pytest.fixture(scope="session")
+def pg_url(tmp_path_factory):
+    """URL of a throwaway PostgreSQL server; tests that use it are skipped without pgserver."""
+    pgserver = pytest.importorskip("pgserver")
+    pytest.importorskip("psycopg")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pg")), cleanup_mode="stop")
+    yield server.get_uri().replace("postgresql://", "postgresql+psycopg://", 1)
+    server.cleanup()
@@ -0,0 +1,159 @@
+# tests/test_api.py
+from __future__ import annotations
+
+import csv
+import http.client
+import io
+import json
+import threading
+
+import pytest
+
+from src import api
+from src.db import session_scope
+from src.exporters import EXPORT_COLUMNS
+from src.import_bluebeam import import_rows
+from src.models import Milestone
+
+
+@pytest.fixture(scope="module")
+def server(engine):
+    srv = api.make_server("127.0.0.1", 0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def request_(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+
+    def send(method, path, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        conn.request(method, path, body=data, headers=headers or {})
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    yield send
+    conn.close()
+
+
+@pytest.fixture
+def seeded(project_id):
+    rows = [
+        {"Page Label": f"A10{n}", "Subject": f"P{project_id}", "Comments": f"Api markup {n}", "Author": "Ann"}
+        for n in range(3)
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    return project_id
+
+
+def test_comments_etag_and_304(request_, seeded):
+    resp, body = request_("GET", f"/projects/{seeded}/comments?limit=2")
+    assert resp.status == 200
+    payload = json.loads(body)
+    assert len(payload["items"]) == 2 and payload["next_offset"] == 2
+    etag = resp.getheader("ETag")
+
+    resp, body = request_("GET", f"/projects/{seeded}/comments?limit=2", headers={"If-None-Match": etag})
+    assert (resp.status, body) == (304, b"")
+    # A different query is a different representation.
+    resp, _ = request_("GET", f"/projects/{seeded}/comments?limit=3", headers={"If-None-Match": etag})
+    assert resp.status == 200
+
+
+def test_bulk_update_changes_the_etag(request_, seeded):
+    resp, body = request_("GET", f"/projects/{seeded}/comments")
+    etag = resp.getheader("ETag")
+    ids = [item["id"] for item in json.loads(body)["items"]]
+
+    bulk = {"ids": ids[:2] + [10**9], "status": "Closed"}  # ids of other projects are ignored
+    resp, body = request_("POST", f"/projects/{seeded}/comments/bulk", bulk)
+    assert resp.status == 200 and json.loads(body)["updated"] == 2
+
+    resp, _ = request_("GET", f"/projects/{seeded}/comments", headers={"If-None-Match": etag})
+    assert resp.status == 200 and resp.getheader("ETag") != etag
+    since = json.loads(request_("GET", f"/projects/{seeded}/changes")[1])["version"] - 1
+    resp, body = request_("GET", f"/projects/{seeded}/changes?since={since}")
+    assert json.loads(body) == {"version": since + 1, "reload": False, "ids": sorted(ids[:2])}
+    resp, body = request_("GET", f"/projects/{seeded}/comments/count?group_by=status")
+    assert json.loads(body) == {"total": 3, "groups": {"Closed": 2, "Open": 1}}
+
+
+def test_bulk_rejects_bad_input(request_, seeded):
+    resp, body = request_("POST", f"/projects/{seeded}/comments/bulk", {"ids": [1], "colour": "red"})
+    assert resp.status == 400 and "colour" in json.loads(body)["error"]
+    resp, _ = request_("POST", f"/projects/{seeded}/comments/bulk", {"ids": "1"})
+    assert resp.status == 400
+
+
+def test_csv_export_streams_all_rows(request_, seeded):
+    resp, body = request_("GET", f"/projects/{seeded}/comments.csv")
+    assert resp.status == 200 and resp.getheader("Transfer-Encoding") == "chunked"
+    rows = list(csv.DictReader(io.StringIO(body.decode("utf-8"))))
+    assert sorted(r["Sheet"] for r in rows) == ["A100", "A101", "A102"]
+
+
+def test_unknown_routes_and_projects(request_):
+    resp, _ = request_("GET", "/nope")
+    assert resp.status == 404
+    resp, _ = request_("GET", "/projects/999999/comments")
+    assert resp.status == 404
+    resp, body = request_("GET", "/health")
+    assert json.loads(body) == {"ok": True}
+
+
+def test_token_required_when_configured(request_, monkeypatch):
+    monkeypatch.setenv("API_TOKEN", "s3cret")
+    resp, _ = request_("GET", "/health")
+    assert resp.status == 401
+    resp, _ = request_("GET", "/health", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status == 200
+
+
+def test_empty_csv_export_has_a_header(request_, project_id):
+    resp, body = request_("GET", f"/projects/{project_id}/comments.csv?status=Nothing")
+    assert resp.status == 200
+    assert body.decode("utf-8").splitlines() == [",".join(EXPORT_COLUMNS)]
+
+
+def test_milestone_writes_change_the_etag(request_, project_id):
+    resp, _ = request_("GET", f"/projects/{project_id}/milestones")
+    etag = resp.getheader("ETag")
+    with session_scope() as s:
+        s.add(Milestone(project_id=project_id, name="CD"))
+    resp, body = request_("GET", f"/projects/{project_id}/milestones", headers={"If-None-Match": etag})
+    assert resp.status == 200
+    assert [m["name"] for m in json.loads(body)["items"]] == ["CD"]
+
+
+def test_unknown_post_keeps_the_connection_usable(request_):
+    # The body is read even when there is no such route, so the next request parses.
+    resp, _ = request_("POST", "/nope", {"ids": [1, 2, 3], "status": "Closed"})
+    assert resp.status == 404
+    resp, body = request_("GET", "/health")
+    assert resp.status == 200 and json.loads(body) == {"ok": True}
+
+
+def test_internal_errors_are_not_shown_to_clients(request_, seeded, monkeypatch):
+    def broken(project_id, body):
+        raise RuntimeError("password=hunter2 in /srv/app.db")
+
+    monkeypatch.setattr(api, "_bulk", broken)
+    resp, body = request_("POST", f"/projects/{seeded}/comments/bulk", {"ids": [1], "status": "Closed"})
+    assert resp.status == 500
+    assert json.loads(body) == {"error": "internal server error"}
+    resp, _ = request_("GET", "/health")  # same connection
+    assert resp.status == 200
+
+
+def test_unauthorized_post_closes_the_connection(request_, seeded, monkeypatch):
+    monkeypatch.setenv("API_TOKEN", "s3cret")
+    resp, _ = request_("POST", f"/projects/{seeded}/comments/bulk", {"ids": [1], "status": "Closed"})
+    assert resp.status == 401 and resp.getheader("Connection") == "close"
+    # http.client reconnects after "Connection: close".
+    resp, _ = request_("GET", "/health", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status == 200
@@ -0,0 +1,68 @@
+# tests/test_archive.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlmodel import select, update
+
+from src.archive import archive_closed, archive_counts, archive_project, restore_project
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.models import Comment
+from src.queries import bulk_update, load_comments
+
+
+def _seed(project_id):
+    rows = [
+        {"Page Label": "A101", "Subject": f"P{project_id}", "Comments": "Old closed", "Date": "01/08/2020 09:15:00 AM"},
+        {"Page Label": "A102", "Subject": f"P{project_id}", "Comments": "Old open", "Date": "01/08/2020 09:15:00 AM"},
+        # An old markup closed just now stays hot: age counts from the close.
+        {"Page Label": "A103", "Subject": f"P{project_id}", "Comments": "New closed", "Date": "01/08/2020 09:15:00 AM"},
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    df = load_comments(project_id, None)
+    ids = dict(zip(df["comment_text"], df["id"].astype(int)))
+    bulk_update([ids["Old closed"], ids["New closed"]], status="Closed")
+    with session_scope() as s:
+        s.exec(
+            update(Comment)
+            .where(Comment.id == ids["Old closed"])
+            .values(status_changed_at=datetime.utcnow() - timedelta(days=60))
+        )
+    return rows, ids
+
+
+def test_only_old_closed_comments_go_cold(project_id):
+    rows, ids = _seed(project_id)
+    with session_scope() as s:
+        result = archive_closed(s, project_id=project_id, older_than_days=30)
+    assert (result.comments, result.items) == (1, 1)
+
+    assert sorted(load_comments(project_id, None)["comment_text"]) == ["New closed", "Old open"]
+    history = load_comments(project_id, None, history=True)
+    assert sorted(history["comment_text"]) == ["New closed", "Old closed", "Old open"]
+    with session_scope() as s:
+        assert archive_counts(s, project_id) == {"hot": 2, "cold": 1}
+
+    # The archived markup is still known to import dedupe.
+    with session_scope() as s:
+        again = import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    assert again.imported == 0
+
+
+def test_archive_and_restore_project(project_id):
+    _, ids = _seed(project_id)
+    with session_scope() as s:
+        archived = archive_project(s, project_id)
+    assert archived.comments == 3
+    assert load_comments(project_id, None).empty
+
+    with session_scope() as s:
+        restored = restore_project(s, project_id)
+    assert (restored.comments, restored.items) == (3, 3)
+    with session_scope() as s:
+        assert archive_counts(s, project_id) == {"hot": 3, "cold": 0}
+        # Same ids and working fields come back.
+        closed = s.exec(select(Comment.id).where(Comment.project_id == project_id).where(Comment.status == "Closed")).all()
+    assert sorted(closed) == sorted([ids["Old closed"], ids["New closed"]])
@@ -0,0 +1,55 @@
+# tests/test_bench.py
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from bench.load import LoadConfig, _error_kind, _parse_mix, run_load
+from bench.runner import compare, load_results, save_results
+from bench.synth import COLUMNS, SynthSpec, generate_markups_csv
+
+
+def test_synthetic_export_is_deterministic():
+    spec = SynthSpec(rows=200, sheets=20, authors=5, seed=7, duplicate_rate=0.1)
+    raw = generate_markups_csv(spec)
+    assert raw == generate_markups_csv(spec)
+    assert raw != generate_markups_csv(SynthSpec(rows=200, sheets=20, authors=5, seed=8))
+
+    rows = list(csv.reader(io.StringIO(raw.decode("utf-8"))))
+    assert rows[0] == COLUMNS and len(rows) == 201
+    assert len({tuple(r) for r in rows[1:]}) < 200  # the requested duplicates are there
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = {"scenarios": {"import": {"p50_ms": 100.0, "p95_ms": 150.0, "peak_mem_kb": 1000.0}}}
+    path = tmp_path / "baseline.json"
+    save_results(baseline, str(path))
+    assert load_results(str(path)) == baseline
+
+    current = {"scenarios": {"import": {"p50_ms": 125.0, "p95_ms": 160.0, "peak_mem_kb": 900.0}, "new": {"p50_ms": 1.0}}}
+    rows = {r["metric"]: r for r in compare(current, baseline)}
+    assert set(rows) == {"p50_ms", "p95_ms", "peak_mem_kb"}
+    assert rows["p50_ms"]["regression"] and rows["p50_ms"]["ratio"] == 1.25
+    assert not rows["p95_ms"]["regression"] and not rows["peak_mem_kb"]["regression"]
+
+
+def test_load_run_reports_each_action():
+    cfg = LoadConfig(sessions=2, duration=1.0, profiles=("wal",), rows=60, import_rows=20, bulk_rows=5, think_ms=5)
+    results = run_load(cfg)
+    assert results["meta"]["database"] == "sqlite"
+    ran = {name for name, r in results["scenarios"].items() if r["runs"]}
+    assert {"wal/dashboard", "wal/search"} <= ran
+    for r in results["scenarios"].values():
+        assert {"ops_per_s", "p95_ms", "error_rate", "lock_wait_ms"} <= set(r)
+
+
+def test_load_mix_and_error_kinds():
+    assert _parse_mix("dashboard=3,import") == (("dashboard", 3.0), ("import", 1.0))
+    with pytest.raises(argparse.ArgumentTypeError):
+        _parse_mix("dance=1")
+    assert _error_kind(OperationalError("UPDATE", {}, Exception("database is locked"))) == "locked"
+    assert _error_kind(ValueError("x")) == "ValueError"
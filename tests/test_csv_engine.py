@@ -0,0 +1,67 @@
+# tests/test_csv_engine.py
+from __future__ import annotations
+
+import codecs
+
+import pytest
+
+from src.csv_engine import available_engines, read_csv_table, sniff_encoding, to_utf8
+from src.import_bluebeam import extract_fields, extract_table
+
+TEXT = (
+    "Subject,Page Label,Author,Date,Status,Comments,ID\r\n"
+    "Cloud+,A101,Zoë,01/08/2024 09:15:00 AM,,\"Verify door swing, both leaves\",1\r\n"
+    "Note,A102,René,01/09/2024 14:30,Accepted,\"Two\r\nlines\",2\r\n"
+    "Note,A103,René,2024-01-10 07:05:00,,,3\r\n"
+)
+
+
+@pytest.mark.parametrize(
+    "raw, encoding",
+    [
+        (TEXT.encode("utf-8"), "utf-8"),
+        (codecs.BOM_UTF8 + TEXT.encode("utf-8"), "utf-8"),
+        (codecs.BOM_UTF16_LE + TEXT.encode("utf-16-le"), "utf-16-le"),
+        (TEXT.encode("utf-16-le"), "utf-16-le"),
+        (TEXT.encode("utf-16-be"), "utf-16-be"),
+        (codecs.BOM_UTF32_LE + TEXT.encode("utf-32-le"), "utf-32-le"),
+        (TEXT.encode("cp1252"), "cp1252"),
+    ],
+)
+def test_encodings_decode_to_the_same_text(raw, encoding):
+    data, detected = to_utf8(raw)
+    assert detected == encoding
+    assert data.decode("utf-8") == TEXT
+
+
+def test_bom_length_is_reported():
+    assert sniff_encoding(codecs.BOM_UTF8 + b"a,b") == ("utf-8", 3)
+    assert sniff_encoding(codecs.BOM_UTF16_BE + "a,b".encode("utf-16-be")) == ("utf-16-be", 2)
+
+
+@pytest.mark.parametrize("engine", available_engines())
+def test_engines_agree(engine):
+    table = read_csv_table(codecs.BOM_UTF8 + TEXT.encode("utf-8"), engine=engine)
+    assert table.engine == engine
+    assert table.num_rows == 3
+    rows = table.rows()
+    assert list(rows[0]) == ["Subject", "Page Label", "Author", "Date", "Status", "Comments", "ID"]
+    assert rows[0]["Comments"] == "Verify door swing, both leaves"
+    assert rows[1]["Comments"] == "Two\r\nlines"
+    # Cells stay text: empty cells are "", IDs are not turned into numbers.
+    assert rows[2]["Comments"] == "" and rows[2]["ID"] == "3"
+
+
+def test_ragged_rows_fall_back():
+    ragged = b"Subject,Page Label,Comments\r\nNote,A101\r\nNote,A102,Check\r\n"
+    table = read_csv_table(ragged)
+    assert table.rows() == [
+        {"Subject": "Note", "Page Label": "A101", "Comments": ""},
+        {"Subject": "Note", "Page Label": "A102", "Comments": "Check"},
+    ]
+
+
+@pytest.mark.parametrize("engine", available_engines())
+def test_extract_table_matches_extract_fields(engine):
+    table = read_csv_table(TEXT.encode("utf-8"), engine=engine)
+    assert extract_table(table) == [extract_fields(r) for r in table.rows()]
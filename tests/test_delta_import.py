@@ -0,0 +1,96 @@
+# tests/test_delta_import.py
+from __future__ import annotations
+
+from sqlmodel import select
+
+from src.archive import archive_project
+from src.db import session_scope
+from src.import_bluebeam import file_digest, find_identical_import, import_rows
+from src.models import Comment, CommentItem, comment_item_archive
+
+
+def _rows(project_id):
+    # Fingerprints dedupe across projects: keep each test's rows distinct.
+    return [
+        {"Page Label": "A101", "Subject": f"P{project_id}", "Comments": "Fix door swing", "Markup ID": "m1", "Status": "Open"},
+        {"Page Label": "A102", "Subject": f"P{project_id}", "Comments": "Check wall type", "Markup ID": "m2", "Status": "Open"},
+    ]
+
+
+def _import(project_id, rows, milestone_id=None, **kwargs):
+    with session_scope() as s:
+        return import_rows(
+            s, rows, project_id=project_id, milestone_id=milestone_id, discipline="A", default_tracked=False, **kwargs
+        )
+
+
+def _items(project_id):
+    with session_scope() as s:
+        items = s.exec(select(CommentItem).where(CommentItem.project_id == project_id)).all()
+        return {i.markup_id: i for i in items}
+
+
+def test_delta_reimport_classifies_rows(project_id):
+    first = _import(project_id, _rows(project_id))
+    assert (first.imported, first.skipped) == (2, 0)
+
+    same = _import(project_id, _rows(project_id), delta=True)
+    assert (same.imported, same.changed, same.unchanged, same.skipped) == (0, 0, 2, 2)
+
+    rows = _rows(project_id)
+    rows[0]["Status"] = "Accepted"
+    rows[1]["Comments"] = "Check wall type and rating"
+    rows.append({"Page Label": "A103", "Subject": f"P{project_id}", "Comments": "New cloud", "Markup ID": "m3", "Status": "Open"})
+    rows.append(dict(rows[0]))  # the same markup twice in one file
+    result = _import(project_id, rows, delta=True)
+    assert (result.imported, result.changed, result.unchanged) == (1, 2, 1)
+    assert result.text_changed == 1  # m2; m1 only changed status
+
+    items = _items(project_id)
+    assert set(items) == {"m1", "m2", "m3"}
+    assert items["m1"].status_raw == "Accepted"
+    assert items["m2"].comment_text == "Check wall type and rating"
+    with session_scope() as s:
+        assert len(s.exec(select(Comment).where(Comment.project_id == project_id)).all()) == 3
+
+
+def test_without_delta_an_edited_markup_is_a_new_item(project_id):
+    _import(project_id, _rows(project_id))
+    rows = _rows(project_id)
+    rows[0]["Status"] = "Accepted"  # not part of the fingerprint: still a duplicate
+    assert _import(project_id, rows).imported == 0
+    rows[0]["Comments"] = "Fix door swing and closer"
+    assert _import(project_id, rows).imported == 1
+    with session_scope() as s:
+        assert len(s.exec(select(CommentItem).where(CommentItem.project_id == project_id)).all()) == 3
+
+
+def test_identical_file_is_skipped_per_milestone(project_id, milestone_id):
+    digest = file_digest(b"same upload")
+    first = _import(project_id, _rows(project_id), file_sha256=digest)
+    again = _import(project_id, _rows(project_id), file_sha256=digest)
+    assert again.file_skipped and again.imported == 0 and again.batch_id == first.batch_id
+
+    with session_scope() as s:
+        assert find_identical_import(s, project_id, None, digest).id == first.batch_id
+        assert find_identical_import(s, project_id, milestone_id, digest) is None
+    # Another milestone is a different target: the file is read (its rows are duplicates).
+    other = _import(project_id, _rows(project_id), milestone_id=milestone_id, file_sha256=digest)
+    assert not other.file_skipped and other.skipped == 2
+
+
+def test_delta_updates_archived_markups_in_place(project_id):
+    _import(project_id, _rows(project_id))
+    with session_scope() as s:
+        archive_project(s, project_id)
+
+    rows = _rows(project_id)
+    rows[0]["Status"] = "Accepted"
+    result = _import(project_id, rows, delta=True)
+    assert (result.imported, result.changed, result.unchanged) == (0, 1, 1)
+
+    assert _items(project_id) == {}  # nothing came back as a new Open item
+    with session_scope() as s:
+        cold = comment_item_archive.c
+        stored = dict(s.execute(select(cold.markup_id, cold.status_raw).where(cold.project_id == project_id)).all())
+    assert stored == {"m1": "Accepted", "m2": "Open"}
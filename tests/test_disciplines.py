@@ -0,0 +1,80 @@
+# tests/test_disciplines.py
+from __future__ import annotations
+
+import pytest
+
+from src import disciplines
+from src.db import session_scope
+from src.disciplines import assign_disciplines, learn_prefixes, prefix_table, sheet_prefix
+from src.import_bluebeam import import_rows
+from src.queries import bulk_update, load_comments
+from src.versions import data_version
+
+
+@pytest.mark.parametrize(
+    "sheet, prefix",
+    [
+        ("E101 - LIGHTING PLAN", "E"),
+        ("fp-201", "FP"),
+        ("M-101", "M"),
+        ("1.01", "1"),
+        ("   ", ""),
+        ("", ""),
+    ],
+)
+def test_sheet_prefix(sheet, prefix):
+    assert sheet_prefix(sheet) == prefix
+
+
+def test_unknown_prefixes_learn_the_upload_discipline(project_id):
+    with session_scope() as s:
+        names = assign_disciplines(s, project_id, ["A101", "C201", "ID101", "", "ID102"], "INT")
+    assert names == ["A", "CIV", "INT", "INT", "INT"]
+
+    with session_scope() as s:
+        assert prefix_table(s, project_id) == {"ID": "INT"}
+        # Learned entries are not replaced by a later upload's pick.
+        assert assign_disciplines(s, project_id, ["ID103"], "A") == ["INT"]
+        assert assign_disciplines(s, project_id, ["ID103"], "A", learn=False) == ["INT"]
+
+
+def test_dashboard_correction_overrides_defaults(project_id):
+    rows = [
+        {"Page Label": f"E{n:03d}", "Subject": f"P{project_id}", "Comments": f"Fixture {n}"} for n in range(3)
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    df = load_comments(project_id, None)
+    assert set(df["discipline"]) == {"E"}
+
+    bulk_update([int(df["id"].iloc[0])], discipline="LV")
+    with session_scope() as s:
+        assert prefix_table(s, project_id) == {"E": "LV"}
+        assert assign_disciplines(s, project_id, ["E900"], "A") == ["LV"]
+    assert sorted(load_comments(project_id, None)["discipline"]) == ["E", "E", "LV"]
+
+
+def test_rolled_back_prefixes_never_reach_the_cache(project_id):
+    with pytest.raises(RuntimeError):
+        with session_scope() as s:
+            assign_disciplines(s, project_id, ["ID101"], "INT")
+            # The learning transaction sees its own rows...
+            assert prefix_table(s, project_id) == {"ID": "INT"}
+            raise RuntimeError("import failed")
+    # ...nobody else does, before or after the rollback.
+    with session_scope() as s:
+        assert prefix_table(s, project_id) == {}
+        assert assign_disciplines(s, project_id, ["ID101"], "A", learn=False) == ["A"]
+
+
+def test_cached_table_follows_the_data_version(project_id):
+    with session_scope() as s:
+        assert prefix_table(s, project_id) == {}
+    version = disciplines._cache[project_id][0]
+
+    # Committed by "another process": this one's cache is never told directly.
+    with session_scope() as s:
+        learn_prefixes(s, project_id, {"LV": "LV"}, source="user")
+    with session_scope() as s:
+        assert data_version(s, project_id) > version
+        assert prefix_table(s, project_id) == {"LV": "LV"}
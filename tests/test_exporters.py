@@ -0,0 +1,83 @@
+# tests/test_exporters.py
+from __future__ import annotations
+
+import datetime as dt
+
+import pytest
+
+from src.db import session_scope
+from src.exporters import build_consultant_package
+from src.import_bluebeam import import_rows
+from src.queries import bulk_update, load_comments, load_package_items
+
+
+def _seed(project_id):
+    rows = [
+        {"Page Label": sheet, "Subject": f"P{project_id}", "Comments": text, "Author": "Ann"}
+        for sheet, text in [("A102", "Wall type"), ("A101", "Door swing"), ("S201", "Beam depth"), ("A101", "Hardware")]
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    df = load_comments(project_id, None)
+    ids = dict(zip(df["comment_text"], df["id"].astype(int)))
+    bulk_update([ids["Beam depth"], ids["Wall type"]], owner="GC")
+    return ids
+
+
+def _body(text):
+    # Drop the "Generated:" footer, which carries a timestamp.
+    return text.rsplit("Generated:", 1)[0]
+
+
+def test_default_package_groups_by_sheet(project_id):
+    _seed(project_id)
+    text = build_consultant_package(load_package_items(project_id), header="Please respond.")
+    assert text.startswith("Please respond.\n\nSheet: A101\n  1. ")
+    assert text.index("Sheet: A102") < text.index("Sheet: S201")
+    assert text.count("Sheet: A101") == 1
+    assert f"(P{project_id} | Reviewer: Ann)" in text
+
+
+def test_sql_order_matches_python_order(project_id):
+    _seed(project_id)
+    group_by = ("owner", "sheet")
+    presorted = load_package_items(project_id, group_by=group_by)
+    sql = build_consultant_package(presorted, group_by=group_by, presorted=True)
+    python = build_consultant_package(list(reversed(presorted)), group_by=group_by)
+    assert _body(sql) == _body(python)
+
+    lines = [line for line in sql.splitlines() if line.lstrip().startswith(("Owner: ", "Sheet: "))]
+    assert lines == ["Owner: (unassigned)", "  Sheet: A101", "Owner: GC", "  Sheet: A102", "  Sheet: S201"]
+
+
+def test_unknown_grouping_and_empty_package(project_id):
+    with pytest.raises(ValueError):
+        load_package_items(project_id, group_by=["colour"])
+    with pytest.raises(ValueError):
+        build_consultant_package([], group_by=["colour"])
+    assert build_consultant_package([]) == "(No items match your filters.)"
+
+
+def test_undated_rows_come_last_and_empty_sheets_are_labelled(project_id):
+    ids = _seed(project_id)
+    with session_scope() as s:
+        import_rows(
+            s,
+            [{"Page Label": "", "Subject": f"P{project_id}", "Comments": "General note"}],
+            project_id=project_id,
+            milestone_id=None,
+            discipline="A",
+            default_tracked=True,
+        )
+    bulk_update([ids["Hardware"]], due_date=dt.date(2024, 3, 1))
+
+    group_by = ("due_date",)
+    presorted = load_package_items(project_id, group_by=group_by)
+    sql = build_consultant_package(presorted, group_by=group_by, presorted=True)
+    python = build_consultant_package(list(reversed(presorted)), group_by=group_by)
+    assert _body(sql) == _body(python)
+    assert sql.index("Due: 2024-03-01\n") < sql.index("Due: (no due date)")
+
+    by_sheet = build_consultant_package(load_package_items(project_id))
+    assert by_sheet.index("Sheet: (no sheet)") < by_sheet.index("Sheet: A101")
+    assert "None" not in by_sheet
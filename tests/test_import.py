@@ -0,0 +1,119 @@
+# tests/test_import.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlmodel import select
+
+from src.db import session_scope
+from src import import_bluebeam
+from src.import_bluebeam import (
+    import_files,
+    import_rows,
+    make_row_hash,
+    parse_bluebeam_datetime,
+    parse_uploads,
+    read_csv_rows,
+)
+from src.instrument import clear_spans, process_spans
+from src.models import Comment, CommentItem
+from src.queries import load_comments
+
+CSV = (
+    "Subject,Page Label,Author,Date,Status,Comments,ID\r\n"
+    "Cloud+,A101,Reviewer 01,01/08/2024 09:15:00 AM,,Verify door swing,0001\r\n"
+    "Note,A102,Reviewer 02,01/09/2024 14:30,Accepted,Provide wall type,0002\r\n"
+    "Note,A102,Reviewer 02,01/09/2024 14:30,Accepted,Provide wall type,0002\r\n"
+)
+
+
+def _import(project_id, rows, **kwargs):
+    with session_scope() as s:
+        return import_rows(
+            s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True, **kwargs
+        )
+
+
+def _tagged(project_id):
+    # Fingerprints dedupe across projects: keep each test's rows distinct.
+    return [{**r, "Subject": f"{r['Subject']} P{project_id}"} for r in read_csv_rows(CSV.encode("utf-8"))]
+
+
+def test_import_skips_repeats_within_and_across_files(project_id):
+    rows = _tagged(project_id)
+    first = _import(project_id, rows, source_filename="markups.csv")
+    assert (first.rows, first.imported, first.skipped) == (3, 2, 1)
+    again = _import(project_id, rows)
+    assert (again.imported, again.skipped) == (0, 3)
+
+    with session_scope() as s:
+        items = s.exec(select(CommentItem).where(CommentItem.project_id == project_id)).all()
+        comments = s.exec(select(Comment).where(Comment.project_id == project_id)).all()
+    assert sorted(i.markup_id for i in items) == ["0001", "0002"]
+    assert sorted(c.comment_item_id for c in comments) == sorted(i.id for i in items)
+    assert all(c.tracked and c.status == "Open" for c in comments)
+    assert {i.status_raw for i in items} == {None, "Accepted"}
+
+
+def test_bluebeam_dates():
+    assert parse_bluebeam_datetime("01/08/2024 09:15:00 AM") == datetime(2024, 1, 8, 9, 15)
+    assert parse_bluebeam_datetime("01/09/2024 14:30") == datetime(2024, 1, 9, 14, 30)
+    assert parse_bluebeam_datetime("2024-01-10 07:05:00") == datetime(2024, 1, 10, 7, 5)
+    assert parse_bluebeam_datetime("") is None
+    assert parse_bluebeam_datetime("not a date") is None
+
+
+def test_row_hash_is_stable_and_never_blank():
+    row = {"Page Label": "A101", "Author": "R", "Comments": "x"}
+    assert make_row_hash(row) == make_row_hash(dict(reversed(list(row.items()))))
+    assert make_row_hash({"Layer": "1"}) != make_row_hash({"Layer": "2"})
+
+
+def _upload(project_id, *lines):
+    header = CSV.split("\r\n", 1)[0]
+    return "\r\n".join([header, *lines, ""]).replace("P?", f"P{project_id}").encode("utf-8")
+
+
+def test_import_files_one_batch_per_file(project_id):
+    door = "Note,A101,R1,01/08/2024 09:15:00 AM,,Door P?,1"
+    wall = "Note,A102,R1,01/08/2024 09:15:00 AM,,Wall P?,2"
+    duct = "Note,M101,R2,01/08/2024 09:15:00 AM,,Duct P?,3"
+    a = _upload(project_id, door, wall)
+    b = _upload(project_id, wall, duct)
+    parsed = parse_uploads([("a.csv", a), ("b.csv", b), ("a-copy.csv", a)])
+    assert [p.name for p in parsed] == ["a.csv", "b.csv", "a-copy.csv"]
+    parsed[1].discipline = "M"
+
+    with session_scope() as s:
+        results = import_files(
+            s, parsed, project_id=project_id, milestone_id=None, discipline="A", default_tracked=False
+        )
+    # The row repeated across files is stored once; the repeated upload is skipped whole.
+    assert [(r.source_filename, r.imported, r.skipped, r.file_skipped) for r in results] == [
+        ("a.csv", 2, 0, False),
+        ("b.csv", 1, 1, False),
+        ("a-copy.csv", 0, 2, True),
+    ]
+    assert results[2].batch_id == results[0].batch_id
+    df = load_comments(project_id, None)
+    assert sorted(zip(df["sheet"], df["discipline"])) == [("A101", "A"), ("A102", "A"), ("M101", "M")]
+
+
+def test_parse_uploads_in_pool_matches_inline(project_id, monkeypatch):
+    files = [
+        (f"{n}.csv", _upload(project_id, f"Note,A{n},R1,01/08/2024 09:15:00 AM,,Sheet {n} P?,{n}"))
+        for n in range(3)
+    ]
+    inline = [import_bluebeam.parse_upload(name, raw) for name, raw in files]
+
+    monkeypatch.setenv("IMPORT_WORKERS", "2")
+    clear_spans()
+    try:
+        pooled = parse_uploads(files)
+    finally:
+        import_bluebeam._reset_pool()
+    assert pooled == inline
+
+    # The workers' spans are recorded here, tagged as such.
+    worker = [s["name"] for s in process_spans() if s.get("worker")]
+    assert worker.count("import.parse") == 3 and worker.count("import.fingerprint") == 3
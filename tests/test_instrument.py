@@ -0,0 +1,60 @@
+# tests/test_instrument.py
+from __future__ import annotations
+
+import json
+
+import pytest
+from sqlmodel import select
+
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.instrument import clear_spans, export_spans, process_spans, span
+from src.models import Project
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    clear_spans()
+    yield
+    clear_spans()
+
+
+def _names():
+    return [s["name"] for s in process_spans()]
+
+
+def test_span_records_attrs_and_failures():
+    with span("unit.ok", rows=1) as sp:
+        sp["bytes"] = 10
+    with pytest.raises(RuntimeError):
+        with span("unit.fail"):
+            raise RuntimeError("boom")
+
+    ok, failed = process_spans()
+    assert (ok["name"], ok["rows"], ok["bytes"]) == ("unit.ok", 1, 10)
+    assert failed["name"] == "unit.fail" and failed["ms"] >= 0
+
+
+def test_sessions_and_sql_are_timed(engine):
+    with session_scope() as s:
+        s.exec(select(Project)).all()
+    sql = [s for s in process_spans() if s["name"] == "sql"]
+    assert sql and sql[-1]["op"] == "SELECT"
+    assert "db.session" in _names()
+
+
+def test_import_stages_are_timed(project_id):
+    rows = [{"Page Label": "A101", "Subject": f"P{project_id}", "Comments": "Check grid"}]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=False)
+    assert {"import.fingerprint", "import.dedupe", "import.insert"} <= set(_names())
+
+
+def test_export_spans_appends_json_lines(tmp_path):
+    with span("unit.export", n=1):
+        pass
+    path = tmp_path / "metrics" / "spans.jsonl"
+    assert export_spans(str(path), process_spans()) == 1
+    assert export_spans(str(path), process_spans()) == 1
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["unit.export", "unit.export"]
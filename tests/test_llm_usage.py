@@ -0,0 +1,73 @@
+# tests/test_llm_usage.py
+from __future__ import annotations
+
+import pytest
+
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.llm import triage_comment_cached
+from src.llm_usage import TriageBudget, estimate_cost, note_call, run_budget, triage_usage
+from src.queries import apply_triage, load_comments
+
+
+def _seed(project_id, n=4):
+    rows = [{"Page Label": f"A10{i}", "Subject": f"P{project_id}", "Comments": f"Triage me {i}"} for i in range(n)]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=False)
+    return sorted(int(i) for i in load_comments(project_id, None)["id"])
+
+
+def fake_triage(**kwargs):
+    note_call(model="gpt-4o-mini", cache_hit=False, prompt_tokens=300, completion_tokens=50, retries=1)
+    return {"track": True, "tag": "COORD", "risk": "LOW", "required_response": "Confirm."}
+
+
+def test_calls_are_logged_with_cost(project_id):
+    ids = _seed(project_id)
+    assert apply_triage(ids, "SD", fake_triage) == 4
+
+    usage = triage_usage("model", project_id=project_id)
+    row = usage.iloc[0].to_dict()
+    assert (row["model"], row["calls"], row["prompt_tokens"], row["completion_tokens"]) == ("gpt-4o-mini", 4, 1200, 200)
+    assert row["retries"] == 4 and row["errors"] == 0 and row["cache_hit_rate"] == 0
+    assert row["est_cost_usd"] == pytest.approx((1200 * 0.15 + 200 * 0.60) / 1e6)
+
+
+def test_budget_stops_before_exceeding(project_id):
+    ids = _seed(project_id)
+    budget = TriageBudget(max_tokens=800)
+    assert apply_triage(ids, "SD", fake_triage, budget=budget) == 2
+    assert (budget.used, budget.stopped, budget.skipped) == (700, True, 2)
+    assert set(load_comments(project_id, None)["tag"]) == {"COORD", ""}
+
+
+def test_failed_run_still_logs_its_calls(project_id):
+    ids = _seed(project_id, n=2)
+
+    def failing(**kwargs):
+        note_call(model="gpt-4o-mini", prompt_tokens=100, completion_tokens=0)
+        raise RuntimeError("rate limited")
+
+    with pytest.raises(RuntimeError):
+        apply_triage(ids, "SD", failing)
+    usage = triage_usage("project", project_id=project_id).iloc[0]
+    assert (usage["calls"], usage["errors"], usage["prompt_tokens"]) == (1, 1, 100)
+
+
+def test_prices(monkeypatch):
+    assert estimate_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == pytest.approx(0.15)
+    assert estimate_cost("mystery-model", 10, 10) is None
+    monkeypatch.setenv("LLM_PRICES", '{"mystery-model": [1, 2]}')
+    assert estimate_cost("mystery-model", 1_000_000, 1_000_000) == pytest.approx(3.0)
+
+    monkeypatch.setenv("TRIAGE_TOKEN_BUDGET", "0")
+    assert run_budget() is None
+    assert run_budget(500).max_tokens == 500
+
+
+def test_calls_without_a_key_are_not_cache_hits(project_id):
+    ids = _seed(project_id, n=2)
+    apply_triage(ids, "SD", triage_comment_cached)
+    apply_triage(ids, "SD", triage_comment_cached)
+    row = triage_usage("model", project_id=project_id).iloc[0]
+    assert (row["calls"], row["cache_hit_rate"], row["prompt_tokens"]) == (4, 0, 0)
@@ -0,0 +1,56 @@
+# tests/test_lookups.py
+from __future__ import annotations
+
+import pytest
+from sqlmodel import select
+
+from src import lookups
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.models import Author, Project
+from src.queries import load_comments
+
+
+def test_intern_names_reuses_ids(engine):
+    with session_scope() as s:
+        first = lookups.intern_names(s, "author", ["Lookup Ann", "Lookup Bob", None])
+    with session_scope() as s:
+        again = lookups.intern_names(s, "author", ["Lookup Bob", "Lookup Ann", ""])
+        assert lookups.lookup_id(s, "author", "Lookup Ann") == first["Lookup Ann"]
+        assert lookups.lookup_id(s, "author", "Lookup Nobody") is None
+    assert again == first
+    assert set(first) == {"Lookup Ann", "Lookup Bob", ""}
+
+
+def test_rolled_back_names_are_not_cached(engine):
+    with pytest.raises(RuntimeError):
+        with session_scope() as s:
+            lookups.intern_names(s, "author", ["Lookup Ghost"])
+            raise RuntimeError("abort import")
+
+    assert "Lookup Ghost" not in lookups._cache["author"]
+    with session_scope() as s:
+        assert s.exec(select(Author).where(Author.name == "Lookup Ghost")).first() is None
+        assert lookups.lookup_id(s, "author", "Lookup Ghost") is None
+
+
+def test_committed_names_are_promoted(engine):
+    with session_scope() as s:
+        ids = lookups.intern_names(s, "sheet", ["LK101"])
+        s.add(Project(name="Lookup promotion"))
+        assert "LK101" not in lookups._cache["sheet"]
+    assert lookups._cache["sheet"]["LK101"] == ids["LK101"]
+
+
+def test_comment_view_returns_names(project_id):
+    rows = [
+        {"Page Label": "LK201", "Author": "Lookup Cy", "Subject": "Cloud", "Comments": f"Lookup view {project_id}",
+         "Date": "01/02/2024 09:00:00 AM"},
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="LK",
+                    default_tracked=True, source_filename="lk.csv")
+
+    df = load_comments(project_id, None, discipline="LK")
+    assert df[["sheet", "author", "subject", "discipline"]].values.tolist() == [["LK201", "Lookup Cy", "Cloud", "LK"]]
+    assert load_comments(project_id, None, discipline="Nope").empty
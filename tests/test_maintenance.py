@@ -0,0 +1,117 @@
+# tests/test_maintenance.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from src import maintenance
+from src.instrument import clear_spans, process_spans
+from src.maintenance import database_report, due_tasks, last_run, run_task
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    """A separate SQLite file with ~25% free pages and auto_vacuum=NONE."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'scratch.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE blob (id INTEGER PRIMARY KEY, data TEXT)")
+        for i in range(400):
+            conn.exec_driver_sql("INSERT INTO blob (data) VALUES (?)", (("x" * 2000),))
+        conn.exec_driver_sql("DELETE FROM blob WHERE id > 300")
+    yield engine
+    engine.dispose()
+
+
+def test_vacuum_converts_then_runs_incrementally(scratch, monkeypatch):
+    # The full rebuild locks the file: only on request (the Database page) or by setting.
+    flagged = maintenance._vacuum(scratch)
+    assert flagged["action"] == "none" and flagged["needs_full_vacuum"]
+    monkeypatch.setenv("MAINTENANCE_FULL_VACUUM", "true")
+    assert maintenance._full_vacuum_allowed()
+    monkeypatch.delenv("MAINTENANCE_FULL_VACUUM")
+
+    first = run_task(scratch, "vacuum", allow_full=True)["detail"]
+    assert first["action"] == "vacuum (auto_vacuum -> incremental)"
+    assert first["reclaimed_bytes"] > 0
+    with scratch.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+        conn.exec_driver_sql("DELETE FROM blob WHERE id > 150")
+        conn.commit()
+
+    second = maintenance._vacuum(scratch)
+    assert second["action"] == "incremental_vacuum" and second["reclaimed_bytes"] > 0
+    assert maintenance._vacuum(scratch)["action"] == "none"
+
+
+def test_tasks_record_their_outcome(engine, scratch, monkeypatch):
+    outcome = run_task(scratch, "integrity")
+    assert outcome["ok"] and outcome["detail"]["problems"] == []
+    assert last_run("integrity") == outcome
+
+    # Task errors are stored, not raised.
+    broken = create_engine("sqlite:////nonexistent/dir/x.db")
+    failed = run_task(broken, "analyze")
+    assert not failed["ok"] and "error" in failed["detail"]
+
+    # Nor are errors storing the outcome.
+    def locked(key, value):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(maintenance, "set_setting", locked)
+    outcome = run_task(scratch, "integrity")
+    assert outcome["ok"] and outcome["store_error"] == "RuntimeError: database is locked"
+
+
+def test_scheduler_survives_failing_checks(engine, monkeypatch):
+    class Stop(BaseException):
+        pass
+
+    calls = []
+
+    def due():
+        calls.append("due")
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return ["analyze"]
+
+    def run(engine, name):
+        calls.append(name)
+        raise RuntimeError("boom")
+
+    def sleep(seconds):
+        if len(calls) >= 3:
+            raise Stop
+
+    monkeypatch.setenv("MAINTENANCE_IDLE_S", "0")
+    monkeypatch.setattr(maintenance, "due_tasks", due)
+    monkeypatch.setattr(maintenance, "run_task", run)
+    monkeypatch.setattr(maintenance.time, "sleep", sleep)
+    monkeypatch.setattr(maintenance._local, "active", False, raising=False)
+    clear_spans()
+    with pytest.raises(Stop):
+        maintenance._scheduler_loop(engine)
+    assert calls == ["due", "due", "analyze"]
+    errors = [s["error"] for s in process_spans() if s["name"] == "maintenance.scheduler"]
+    assert errors == ["RuntimeError: database is locked", "RuntimeError: boom"]
+
+
+def test_due_tasks_most_overdue_first(engine, monkeypatch):
+    for name in maintenance.TASKS:
+        run_task(engine, name)
+    later = datetime.utcnow() + timedelta(hours=30)
+    assert set(due_tasks(later)) == {"analyze", "vacuum", "prune"}
+    assert due_tasks(datetime.utcnow()) == []
+
+    monkeypatch.setenv("MAINTENANCE_VACUUM_HOURS", "0")  # disabled
+    monkeypatch.setenv("MAINTENANCE_PRUNE_HOURS", "12")
+    assert due_tasks(later)[0] == "prune"
+    assert "vacuum" not in due_tasks(later)
+
+
+def test_size_report(engine, project_id):
+    report = database_report(engine)
+    assert report["summary"]["backend"] == "sqlite"
+    tables = {o["name"]: o for o in report["objects"] if o["type"] == "table"}
+    assert "comment" in tables and tables["project"]["rows"] >= 1
@@ -0,0 +1,84 @@
+# tests/test_mappings.py
+from __future__ import annotations
+
+import pytest
+from sqlmodel import select
+
+from src import mappings
+from src.db import session_scope
+from src.import_bluebeam import header_signature, infer_plan, parse_upload
+from src.models import ColumnMapping
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    mappings._cache.clear()
+    yield
+    mappings._cache.clear()
+
+
+def test_infer_plan_exact_then_fuzzy():
+    plan = infer_plan(["Page Label", "Sheet", "author ", "Comments", "Date", "ID"])
+    # Exact aliases keep extract_fields() order; "author " only matches loosely.
+    assert plan["sheet"] == ["Page Label", "Sheet"]
+    assert plan["author"] == ["author "]
+    assert plan["comment_text"] == ["Comments"]
+    assert plan["status_raw"] == []
+
+
+def test_header_signature_ignores_order():
+    assert header_signature(["a", "b"]) == header_signature(["b", "a", "a"])
+    assert header_signature(["a", "b"]) != header_signature(["a", "c"])
+
+
+def test_plan_is_stored_on_first_sight(engine):
+    headers = ["Page Label", "Author", "Comments", "Mapping test 1"]
+    with session_scope() as s:
+        stored = mappings.plan_for(s, headers)
+    assert stored.source == "inferred"
+
+    mappings._cache.clear()
+    with session_scope() as s:
+        again = mappings.plan_for(s, list(reversed(headers)))
+        rows = s.exec(select(ColumnMapping).where(ColumnMapping.header_hash == stored.header_hash)).all()
+    assert again == stored
+    assert len(rows) == 1
+
+
+def test_plan_cache_is_bounded(engine, monkeypatch):
+    monkeypatch.setattr(mappings, "CACHE_ENTRIES", 3)
+    layouts = [["Page Label", "Comments", f"Mapping test LRU {n}"] for n in range(5)]
+    with session_scope() as s:
+        for headers in layouts[:3]:
+            mappings.plan_for(s, headers)
+        mappings.plan_for(s, layouts[0])  # most recently used again
+        for headers in layouts[3:]:
+            mappings.plan_for(s, headers)
+    assert list(mappings._cache) == [header_signature(h) for h in (layouts[0], layouts[3], layouts[4])]
+
+
+def test_user_plan_replaces_and_reset_reinfers(engine):
+    headers = ["Page Label", "Author", "Comments", "Notes", "Mapping test 2"]
+    with session_scope() as s:
+        inferred = mappings.plan_for(s, headers)
+    with session_scope() as s:
+        mappings.save_plan(s, headers, {"comment_text": ["Notes", "Comments", "Not a column"]})
+    with session_scope() as s:
+        user = mappings.plan_for(s, headers)
+    assert user.source == "user"
+    assert user.plan["comment_text"] == ["Notes", "Comments"]
+    assert user.plan["sheet"] == []
+
+    with session_scope() as s:
+        mappings.reset_plan(s, headers)
+    with session_scope() as s:
+        assert mappings.plan_for(s, headers) == inferred
+
+
+def test_parse_upload_uses_the_plan():
+    raw = b"Page Label,Comments,Notes\r\nA101,from comments,from notes\r\n"
+    assert parse_upload("f.csv", raw).fields[0]["comment_text"] == "from comments"
+    plan = {**infer_plan(["Page Label", "Comments", "Notes"]), "comment_text": ["Notes"]}
+    parsed = parse_upload("f.csv", raw, plan)
+    assert parsed.fields[0]["comment_text"] == "from notes"
+    assert parsed.header_hash == header_signature(["Page Label", "Comments", "Notes"])
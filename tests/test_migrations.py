@@ -0,0 +1,123 @@
+# tests/test_migrations.py
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlmodel import create_engine
+
+from src.migrations import SCHEMA_VERSION, ensure_schema
+
+
+@pytest.fixture
+def fresh_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _version(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT version FROM schema_info WHERE id = 1")).scalar()
+
+
+def test_new_database_is_stamped_with_latest_version(fresh_engine):
+    assert ensure_schema(fresh_engine) == -1
+    assert _version(fresh_engine) == SCHEMA_VERSION
+    # Up to date: the second call only reads the version.
+    assert ensure_schema(fresh_engine) == SCHEMA_VERSION
+
+
+def test_unversioned_database_is_upgraded(fresh_engine):
+    # A file created before schema_info existed: it has tables but no version.
+    with fresh_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE project (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL)"))
+        conn.execute(text("INSERT INTO project (id, name) VALUES (1, 'Old')"))
+
+    assert ensure_schema(fresh_engine) == 0
+    assert _version(fresh_engine) == SCHEMA_VERSION
+    assert inspect(fresh_engine).has_table("comment")
+    with fresh_engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM project")).scalar() == "Old"
+
+
+def test_upgrade_from_version_1_adds_file_hash(fresh_engine):
+    ensure_schema(fresh_engine)
+    with fresh_engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_import_batch_file_sha256"))
+        conn.execute(text("DROP INDEX ix_comment_item_project_markup"))
+        conn.execute(text("ALTER TABLE import_batch DROP COLUMN file_sha256"))
+        conn.execute(
+            text(
+                "INSERT INTO import_batch (project_id, source_filename, discipline, imported_at, row_count) "
+                "VALUES (1, 'old.csv', 'A', '2024-01-01', 3)"
+            )
+        )
+        conn.execute(text("UPDATE schema_info SET version = 1"))
+
+    assert ensure_schema(fresh_engine) == 1
+    insp = inspect(fresh_engine)
+    assert "file_sha256" in {c["name"] for c in insp.get_columns("import_batch")}
+    assert "ix_comment_item_project_markup" in {ix["name"] for ix in insp.get_indexes("comment_item")}
+    with fresh_engine.connect() as conn:
+        assert conn.execute(text("SELECT file_sha256 FROM import_batch")).scalar() == ""
+
+
+# The tables version 2 code created that later versions reshape (the others are unchanged
+# or created by create_all).
+_V2_TABLES = """
+CREATE TABLE project (
+    id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL, client VARCHAR, location VARCHAR,
+    is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL
+);
+CREATE TABLE import_batch (
+    id INTEGER NOT NULL PRIMARY KEY, project_id INTEGER NOT NULL, milestone_id INTEGER,
+    source_filename VARCHAR NOT NULL, discipline VARCHAR NOT NULL, file_sha256 VARCHAR NOT NULL,
+    imported_at DATETIME NOT NULL, row_count INTEGER NOT NULL
+);
+CREATE TABLE comment_item (
+    id INTEGER NOT NULL PRIMARY KEY, import_batch_id INTEGER NOT NULL, project_id INTEGER NOT NULL,
+    milestone_id INTEGER, discipline VARCHAR NOT NULL, sheet VARCHAR NOT NULL, subject VARCHAR NOT NULL,
+    author VARCHAR NOT NULL, created_at DATETIME NOT NULL, comment_text VARCHAR NOT NULL,
+    page_index INTEGER, markup_id VARCHAR, status_raw VARCHAR, source_row_hash VARCHAR NOT NULL
+);
+CREATE TABLE comment (
+    id INTEGER NOT NULL PRIMARY KEY, project_id INTEGER NOT NULL, milestone_id INTEGER,
+    discipline VARCHAR NOT NULL, sheet VARCHAR NOT NULL, subject VARCHAR NOT NULL, author VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL, comment_text VARCHAR NOT NULL, status VARCHAR NOT NULL,
+    tracked BOOLEAN NOT NULL, owner VARCHAR NOT NULL, due_date DATE, tag VARCHAR NOT NULL,
+    risk VARCHAR NOT NULL, required_response VARCHAR NOT NULL
+);
+CREATE TABLE schema_info (id INTEGER NOT NULL PRIMARY KEY, version INTEGER NOT NULL, applied_at DATETIME NOT NULL);
+INSERT INTO schema_info VALUES (1, 2, '2024-01-01 00:00:00');
+INSERT INTO project VALUES (1, 'Old', NULL, NULL, 1, '2024-01-01 00:00:00');
+INSERT INTO import_batch VALUES (1, 1, NULL, 'old.csv', 'A', '', '2024-01-01 00:00:00', 2);
+INSERT INTO comment_item VALUES
+    (1, 1, 1, NULL, 'A', 'A101', 'Note', 'Ann', '2024-01-02 09:00:00', 'Fix door swing', NULL, 'm1', NULL, 'h1'),
+    (2, 1, 1, NULL, 'A', 'A102', 'Note', 'Bob', '2024-01-02 09:05:00', 'Check wall type', NULL, 'm2', NULL, 'h2');
+INSERT INTO comment VALUES
+    (1, 1, NULL, 'A', 'A102', 'Note', 'Bob', '2024-01-02 09:05:00', 'Check wall type', 'Closed', 1, 'GC', NULL, '', '', ''),
+    (2, 1, NULL, 'A', 'A101', 'Note', 'Ann', '2024-01-02 09:00:00', 'Fix door swing', 'Open', 0, '', NULL, '', '', ''),
+    (3, 1, NULL, 'S', 'S201', 'Note', 'Cy', '2024-01-03 10:00:00', 'Typed in by hand', 'Open', 0, '', NULL, '', '', '');
+"""
+
+
+def test_upgrade_from_version_2(fresh_engine):
+    with fresh_engine.begin() as conn:
+        for statement in _V2_TABLES.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+
+    assert ensure_schema(fresh_engine) == 2
+    assert _version(fresh_engine) == SCHEMA_VERSION
+    assert "comment_text" not in {c["name"] for c in inspect(fresh_engine).get_columns("comment")}
+
+    with fresh_engine.connect() as conn:
+        linked = dict(
+            conn.execute(
+                text("SELECT c.id, i.comment_text FROM comment c JOIN comment_item i ON i.id = c.comment_item_id")
+            ).all()
+        )
+        backfill = conn.execute(text("SELECT source_filename FROM import_batch WHERE id <> 1")).scalars().all()
+    # Pairs are matched on their raw fields; the comment without an item gets one.
+    assert linked == {1: "Check wall type", 2: "Fix door swing", 3: "Typed in by hand"}
+    assert backfill == ["(backfill)"]
@@ -0,0 +1,93 @@
+# tests/test_package_batch.py
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from src import package_batch
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.package_batch import write_package_zip
+from src.queries import bulk_update, load_comments
+
+
+def _seed(project_id):
+    rows = [
+        {"Page Label": sheet, "Subject": f"P{project_id}", "Comments": f"Batch {sheet}"}
+        for sheet in ("A101", "A102", "S201", "M301", "M302", "M303")
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    df = load_comments(project_id, None)
+    bulk_update([int(i) for i in df[df["sheet"].str.startswith("M")]["id"]], owner="MEP / Eng")
+
+
+def _zip(project_id, **kwargs):
+    buf = io.BytesIO()
+    manifest = write_package_zip(buf, project_id, header="Please respond.", **kwargs)
+    with zipfile.ZipFile(io.BytesIO(buf.getvalue())) as zf:
+        files = {name: zf.read(name) for name in zf.namelist()}
+    return manifest, files
+
+
+def test_zip_per_discipline(project_id, monkeypatch):
+    monkeypatch.setenv("PACKAGE_WORKERS", "1")
+    _seed(project_id)
+    manifest, files = _zip(project_id)
+
+    assert [(p["name"], p["items"]) for p in manifest["packages"]] == [("A", 2), ("M", 3), ("S", 1)]
+    assert manifest["total_items"] == 6
+    assert json.loads(files["manifest.json"])["packages"] == manifest["packages"]
+    assert sorted(files) == ["A.csv", "A.txt", "M.csv", "M.txt", "S.csv", "S.txt", "manifest.json"]
+    assert files["M.txt"].decode("utf-8").startswith("Please respond.\n\nSheet: M301\n")
+
+
+def test_pool_renders_the_same_files(project_id, monkeypatch):
+    _seed(project_id)
+    monkeypatch.setenv("PACKAGE_WORKERS", "1")
+    _, inline = _zip(project_id, partition_by="owner")
+    monkeypatch.setenv("PACKAGE_WORKERS", "2")
+    try:
+        manifest, pooled = _zip(project_id, partition_by="owner")
+    finally:
+        package_batch._reset_pool()
+
+    # Owner names become safe file names.
+    assert [p["files"][0] for p in manifest["packages"]] == ["unassigned.txt", "MEP_Eng.txt"]
+
+    def strip_footer(files):
+        return {n: d.split(b"Generated:")[0] for n, d in files.items() if n != "manifest.json"}
+
+    assert strip_footer(pooled) == strip_footer(inline)
+
+
+def test_unknown_partition(project_id):
+    with pytest.raises(ValueError):
+        write_package_zip(io.BytesIO(), project_id, partition_by="sheet")
+
+
+def test_partitions_are_written_while_rows_are_read(project_id, monkeypatch):
+    monkeypatch.setenv("PACKAGE_WORKERS", "1")
+    _seed(project_id)
+    rendered = []
+    real_iter, real_render = package_batch.iter_package_items, package_batch.render_partition
+
+    def iter_rows(*args, **kwargs):
+        for it in real_iter(*args, **kwargs):
+            rendered.append(("row", it.discipline))
+            yield it
+
+    def render(items, *args):
+        rendered.append(("render", items[0].discipline))
+        return real_render(items, *args)
+
+    monkeypatch.setattr(package_batch, "iter_package_items", iter_rows)
+    monkeypatch.setattr(package_batch, "render_partition", render)
+    _zip(project_id)
+
+    # A partition is rendered once the next one starts, not after the last row.
+    assert rendered.index(("render", "A")) == rendered.index(("row", "M")) + 1
+    assert rendered.index(("render", "M")) == rendered.index(("row", "S")) + 1
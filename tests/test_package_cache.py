@@ -0,0 +1,75 @@
+# tests/test_package_cache.py
+from __future__ import annotations
+
+import pytest
+
+from src import package_cache
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.package_cache import get_artifact, package_artifacts, package_cache_stats, put_artifact
+from src.queries import bulk_update, load_comments
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    package_cache.clear_package_cache()
+    yield
+    package_cache.clear_package_cache()
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Counts package row loads (a miss in any format loads the rows once)."""
+    calls = []
+    real = package_cache.load_package_items
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(package_cache, "load_package_items", counting)
+    return calls
+
+
+def _seed(project_id):
+    rows = [{"Page Label": f"A10{n}", "Subject": f"P{project_id}", "Comments": f"Package {n}"} for n in range(3)]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    return [int(i) for i in load_comments(project_id, None)["id"]]
+
+
+def test_hits_until_the_data_changes(project_id, loads):
+    ids = _seed(project_id)
+    first = package_artifacts(project_id, header="Please respond.")
+    assert first["txt"].rows == 3 and first["csv"].data.startswith(b"ID,")
+    assert package_artifacts(project_id, header="Please respond.")["txt"].data == first["txt"].data
+    assert len(loads) == 1
+
+    # A header edit only re-renders the text; the CSV is still a hit.
+    package_artifacts(project_id, header="Updated.", formats=("csv",))
+    assert len(loads) == 1
+    assert package_artifacts(project_id, header="Updated.")["txt"].data.startswith(b"Updated.")
+    assert len(loads) == 2
+
+    bulk_update(ids[:1], status="Closed")
+    assert package_artifacts(project_id, status="Open", header="Updated.")["txt"].rows == 2
+    assert len(loads) == 3
+
+
+def test_large_artifacts_spill_to_disk(monkeypatch):
+    monkeypatch.setenv("PACKAGE_SPILL_KB", "1")
+    put_artifact("small", b"x" * 100, 1)
+    put_artifact("large", b"y" * 4096, 2)
+    assert package_cache_stats() == {"entries": 2, "memory_bytes": 100, "disk_bytes": 4096}
+    assert get_artifact("large").data == b"y" * 4096
+
+
+def test_memory_limit_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setenv("PACKAGE_CACHE_MB", "1")
+    chunk = b"z" * (400 * 1024)
+    put_artifact("a", chunk, 1)
+    put_artifact("b", chunk, 1)
+    get_artifact("a")
+    put_artifact("c", chunk, 1)
+    assert get_artifact("b") is None
+    assert get_artifact("a") is not None and get_artifact("c") is not None
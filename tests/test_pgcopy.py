@@ -0,0 +1,104 @@
+# tests/test_pgcopy.py
+from __future__ import annotations
+
+import pytest
+from sqlmodel import Session, create_engine, func, select
+
+from src import disciplines, lookups
+from src.db import _pool_options
+from src.import_bluebeam import import_rows
+from src.migrations import ensure_schema
+from src.models import Comment, CommentItem, Project
+from src.pgcopy import copy_import, copy_supported
+
+
+@pytest.fixture
+def pg_engine(pg_url, monkeypatch):
+    # The name -> id caches belong to the app database; give this one its own.
+    monkeypatch.setattr(lookups, "_cache", {kind: {} for kind in lookups.LOOKUP_MODELS})
+    monkeypatch.setattr(disciplines, "_cache", {})
+    engine = create_engine(pg_url)
+    ensure_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def _project(engine) -> int:
+    with Session(engine, expire_on_commit=False) as s:
+        project = Project(name="COPY test")
+        s.add(project)
+        s.commit()
+        return project.id
+
+
+def _rows(project_id, n):
+    return [
+        {"Page Label": f"A{i:03d}", "Subject": f"P{project_id}", "Comments": f"Markup {i}", "ID": str(i)}
+        for i in range(n)
+    ]
+
+
+def _import(engine, project_id, rows):
+    with Session(engine) as s:
+        result = import_rows(
+            s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True
+        )
+        s.commit()
+        return result
+
+
+def _stored(engine, project_id):
+    with Session(engine) as s:
+        items = s.exec(select(func.count()).where(CommentItem.project_id == project_id)).one()
+        comments = s.exec(
+            select(func.count()).where(Comment.project_id == project_id).where(Comment.tracked == True)  # noqa: E712
+        ).one()
+    return items, comments
+
+
+def test_copy_path_imports_and_dedupes(pg_engine):
+    with Session(pg_engine) as s:
+        assert copy_supported(s)
+    project_id = _project(pg_engine)
+    rows = _rows(project_id, 50)
+
+    first = _import(pg_engine, project_id, rows + rows[:5])
+    assert (first.imported, first.skipped) == (50, 5)
+    assert _stored(pg_engine, project_id) == (50, 50)
+
+    again = _import(pg_engine, project_id, rows)
+    assert (again.imported, again.skipped) == (0, 50)
+
+
+def test_copy_path_matches_orm_path(pg_engine, monkeypatch):
+    copy_project = _project(pg_engine)
+    copied = _import(pg_engine, copy_project, _rows(copy_project, 20))
+
+    monkeypatch.setenv("PG_COPY_IMPORT", "false")
+    with Session(pg_engine) as s:
+        assert not copy_supported(s)
+    orm_project = _project(pg_engine)
+    inserted = _import(pg_engine, orm_project, _rows(orm_project, 20))
+
+    assert (copied.imported, copied.skipped) == (inserted.imported, inserted.skipped) == (20, 0)
+    assert _stored(pg_engine, copy_project) == _stored(pg_engine, orm_project) == (20, 20)
+
+
+def test_merge_skips_rows_stored_since_dedupe(pg_engine):
+    project_id = _project(pg_engine)
+    _import(pg_engine, project_id, _rows(project_id, 3))
+    with Session(pg_engine) as s:
+        stored = s.exec(select(CommentItem).where(CommentItem.project_id == project_id)).all()
+        staged = [item.model_dump(exclude={"id"}) for item in stored]
+        staged.append(dict(staged[0], source_row_hash="not-stored-yet"))
+        assert copy_import(s, staged, tracked=False) == {stored[0].import_batch_id: 1}
+        s.rollback()
+
+
+def test_pool_options_from_settings(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "not a number")
+    options = _pool_options()
+    assert options["pool_size"] == 3
+    assert options["pool_recycle"] == 1800
+    assert options["pool_pre_ping"] is True
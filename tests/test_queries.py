@@ -0,0 +1,118 @@
+# tests/test_queries.py
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlmodel import select
+
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.models import Comment
+from src.queries import (
+    CATEGORY_COLUMNS,
+    PREVIEW_CHARS,
+    apply_triage,
+    bulk_update,
+    load_comments,
+    load_full_text,
+    load_package_items,
+    package_filter_options,
+    refresh_comments,
+)
+
+
+def _seed(project_id, milestone_id=None):
+    rows = [
+        {"Page Label": "A101", "Subject": f"P{project_id}", "Comments": "Verify door swing", "Author": "Ann"},
+        {"Page Label": "S201", "Subject": f"P{project_id}", "Comments": "Check beam depth", "Author": "Bob"},
+        {"Page Label": "S202", "Subject": f"P{project_id}", "Comments": "Add column grid", "Author": "Bob"},
+    ]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=milestone_id, discipline="S", default_tracked=False)
+    with session_scope() as s:
+        return sorted(s.exec(select(Comment.id).where(Comment.project_id == project_id)).all())
+
+
+def test_load_comments_filters(project_id, milestone_id):
+    ids = _seed(project_id, milestone_id)
+    df = load_comments(project_id, milestone_id)
+    assert sorted(df["id"]) == ids
+    assert not df["select"].any()
+
+    assert list(load_comments(project_id, milestone_id, search="beam")["sheet"]) == ["S201"]
+    assert len(load_comments(project_id, milestone_id, search="bob")) == 2  # author, case-insensitive
+    assert load_comments(project_id, milestone_id, tracked_filter="Tracked").empty
+
+
+def test_bulk_update_and_package_filters(project_id):
+    ids = _seed(project_id)
+    assert bulk_update(ids[:2], status="Needs Response", owner="Structural", tracked=True, due_date=dt.date(2024, 3, 1)) == 2
+
+    df = load_comments(project_id, None, status="Needs Response")
+    assert sorted(df["id"]) == ids[:2]
+    assert set(df["owner"]) == {"Structural"} and set(df["due_date"]) == {"2024-03-01"}
+
+    # A101 gets its sheet prefix's discipline, not the upload's "S".
+    assert package_filter_options(project_id, None) == {"discipline": ["A", "S"], "status": ["Needs Response", "Open"]}
+    items = load_package_items(project_id, status="Needs Response", tracked_only=True)
+    assert sorted(c.id for c in items) == ids[:2]
+
+
+def test_apply_triage_saves_results(project_id):
+    ids = _seed(project_id)
+    seen = []
+
+    def fake_triage(**kwargs):
+        seen.append(kwargs)
+        return {"track": True, "tag": "COORD", "risk": "HIGH", "required_response": "Confirm."}
+
+    assert apply_triage(ids[:1], "SD", fake_triage) == 1
+    assert seen[0]["comment_text"] == "Verify door swing" and seen[0]["milestone"] == "SD"
+    with session_scope() as s:
+        c = s.get(Comment, ids[0])
+    assert (c.tracked, c.tag, c.risk, c.required_response) == (True, "COORD", "HIGH", "Confirm.")
+
+
+def test_dashboard_frame_is_lean(project_id):
+    long_text = " ".join(["Coordinate the duct route with the beam pockets."] * 10)
+    rows = [{"Page Label": "M101", "Subject": f"P{project_id}", "Comments": long_text, "Author": "Cy"}]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="M", default_tracked=True)
+
+    df = load_comments(project_id, None)
+    assert all(df[name].dtype == "category" for name in CATEGORY_COLUMNS)
+    assert str(df["created_at"].dtype).startswith("datetime64")
+    preview = df["comment_text"].iloc[0]
+    assert len(preview) == PREVIEW_CHARS and preview.endswith("…")
+
+    comment_id = int(df["id"].iloc[0])
+    assert load_full_text([comment_id])[comment_id]["comment_text"] == long_text
+    assert load_full_text([]) == {}
+
+
+def test_refresh_comments_patches_changed_rows(project_id):
+    ids = _seed(project_id)
+    df = load_comments(project_id, None, status="Open")
+    assert refresh_comments(df, project_id, None, status="Open") is df
+
+    bulk_update(ids[:1], status="Closed")
+    bulk_update(ids[1:2], owner="Structural")
+    fresh = refresh_comments(df, project_id, None, status="Open")
+    # The closed comment no longer matches the filter; the other edit is patched in.
+    assert sorted(fresh["id"]) == ids[1:]
+    assert dict(zip(fresh["id"], fresh["owner"]))[ids[1]] == "Structural"
+    assert fresh.attrs["data_version"] > df.attrs["data_version"]
+    assert fresh["owner"].dtype == "category"
+    reloaded = load_comments(project_id, None, status="Open")
+    assert sorted(reloaded["id"]) == sorted(fresh["id"])
+
+
+def test_refresh_comments_from_an_empty_frame(project_id):
+    ids = _seed(project_id)
+    df = load_comments(project_id, None, status="Closed")
+    assert df.empty and df["owner"].dtype == "category"
+
+    bulk_update(ids[:1], status="Closed")
+    fresh = refresh_comments(df, project_id, None, status="Closed")
+    assert list(fresh["id"]) == ids[:1]
+    assert fresh["status"].dtype == "category" and fresh["id"].dtype == "int64"
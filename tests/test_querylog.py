@@ -0,0 +1,66 @@
+# tests/test_querylog.py
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src import querylog
+
+
+@pytest.fixture(autouse=True)
+def clean_log():
+    threshold = querylog.get_threshold_ms()
+    querylog.reset_query_log()
+    yield
+    querylog.set_threshold_ms(threshold)
+    querylog.reset_query_log()
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'q.db'}")
+    querylog.install_query_log(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name VARCHAR)"))
+    querylog.reset_query_log()
+    yield engine
+    engine.dispose()
+
+
+def test_normalize_collapses_literals_and_in_lists():
+    a = querylog.normalize_statement("SELECT *  FROM t\n WHERE id IN (?, ?, ?) AND name = 'x' AND n > 10")
+    b = querylog.normalize_statement("SELECT * FROM t WHERE id IN (?, ?) AND name = 'it''s' AND n > 2.5")
+    assert a == b == "SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?"
+    assert querylog.normalize_statement("SELECT * FROM t WHERE id IN (:id_1, :id_2)") == "SELECT * FROM t WHERE id IN (...)"
+
+
+def test_statements_are_aggregated_by_shape(sqlite_engine):
+    querylog.set_threshold_ms(10_000)
+    with sqlite_engine.connect() as conn:
+        for n in range(3):
+            conn.execute(text(f"SELECT * FROM t WHERE id IN ({', '.join(['1'] * (n + 2))})"))
+    stats = {s["statement"]: s for s in querylog.statement_stats()}
+    assert stats["SELECT * FROM t WHERE id IN (...)"]["calls"] == 3
+    assert not querylog.slow_queries()
+
+
+def test_slow_statements_carry_params_and_plan(sqlite_engine):
+    querylog.set_threshold_ms(0)
+    with sqlite_engine.connect() as conn:
+        conn.execute(text("SELECT name FROM t WHERE id = :id"), {"id": 7})
+    slow = querylog.slow_queries()[0]
+    assert slow["statement"].startswith("SELECT name FROM t")
+    assert "7" in slow["params"]
+    assert "SEARCH t" in slow["plan"] or "USING INTEGER PRIMARY KEY" in slow["plan"]
+
+
+def test_failed_explain_does_not_abort_postgres_transaction(pg_url):
+    engine = create_engine(pg_url)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT 1"))
+            plan = querylog._explain(conn, "SELECT no_such_column", None, False)
+            assert plan.startswith("(EXPLAIN failed")
+            assert conn.execute(text("SELECT 2")).scalar() == 2
+    finally:
+        engine.dispose()
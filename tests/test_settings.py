@@ -0,0 +1,50 @@
+# tests/test_settings.py
+from __future__ import annotations
+
+import pytest
+
+from src import settings
+from src.db import session_scope
+from src.models import AppSetting
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(engine):
+    settings.invalidate_settings_cache()
+    yield
+    settings.invalidate_settings_cache()
+
+
+def _write_behind_cache(key: str, value: str) -> None:
+    # What another worker process does: the row changes, this process's cache doesn't.
+    with session_scope() as s:
+        s.merge(AppSetting(key=key, value=value))
+
+
+def test_unchanged_values_are_not_written():
+    assert settings.set_settings({"theme": "dark", "page_size": "50"}) is True
+    assert settings.set_settings({"theme": "dark", "page_size": "50"}) is False
+    assert settings.set_settings({"theme": "dark", "page_size": "100"}) is True
+    snapshot = settings.get_settings()
+    assert (snapshot["theme"], snapshot["page_size"]) == ("dark", "100")
+    assert settings.get_setting("missing", "default") == "default"
+
+
+def test_reads_are_served_from_the_cache():
+    settings.set_setting("owner", "Architect")
+    _write_behind_cache("owner", "Civil")
+    assert settings.get_setting("owner") == "Architect"
+    settings.invalidate_settings_cache()
+    assert settings.get_setting("owner") == "Civil"
+
+
+def test_version_stamp_reloads_other_workers_changes(monkeypatch):
+    settings.set_setting("discipline", "A")
+    monkeypatch.setattr(settings, "VERSION_CHECK_INTERVAL", 0.0)
+
+    # A write without a new stamp is invisible; a new stamp triggers a reload.
+    _write_behind_cache("discipline", "S")
+    assert settings.get_setting("discipline") == "A"
+    _write_behind_cache(settings.VERSION_KEY, "from-another-worker")
+    assert settings.get_setting("discipline") == "S"
+    assert settings.VERSION_KEY not in settings.get_settings()
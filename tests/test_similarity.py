@@ -0,0 +1,108 @@
+# tests/test_similarity.py
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src import similarity
+from src.archive import archive_project, restore_project
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.models import Milestone
+from src.queries import bulk_update, load_comments
+from src.similarity import (
+    apply_carry_forward,
+    carry_forward_suggestions,
+    load_index,
+    rebuild_index,
+    similar_comments,
+    update_index,
+)
+
+TEXTS = [
+    "Provide fire rating for the corridor wall at grid 4",
+    "Confirm duct routing clears the beam at level 2",
+    "Add missing door hardware schedule",
+]
+
+
+def _import(project_id, milestone_id, texts, tag):
+    rows = [{"Page Label": "A101", "Subject": f"{tag} P{project_id}", "Comments": t} for t in texts]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=milestone_id, discipline="A", default_tracked=True)
+    df = load_comments(project_id, milestone_id)
+    return dict(zip(df["comment_text"], df["id"].astype(int)))
+
+
+def _milestone(project_id, name):
+    milestone = Milestone(project_id=project_id, name=name)
+    with session_scope() as s:
+        s.add(milestone)
+    return milestone.id
+
+
+def test_related_comments(project_id, milestone_id):
+    ids = _import(project_id, milestone_id, TEXTS, "SD")
+    assert len(update_index(project_id)) == 3
+
+    hits = similar_comments(project_id, text="fire rating of corridor walls", k=2)
+    assert hits[0]["comment_id"] == ids[TEXTS[0]]
+    related = similar_comments(project_id, comment_id=ids[TEXTS[1]], min_score=0.0)
+    assert ids[TEXTS[1]] not in {h["comment_id"] for h in related}
+
+    # New comments are appended to the saved index.
+    _import(project_id, milestone_id, ["Coordinate sprinkler heads with the ceiling grid"], "SD")
+    assert len(update_index(project_id)) == 4
+    assert len(load_index(project_id)) == 4
+
+
+def test_carry_forward_fills_only_empty_fields(project_id, milestone_id):
+    earlier = _import(project_id, milestone_id, TEXTS, "SD")
+    bulk_update([earlier[TEXTS[0]]], owner="Architect", tag="CODE")
+
+    dd = _milestone(project_id, "DD")
+    later = _import(project_id, dd, [TEXTS[0] + ".", "Unrelated note about parking striping"], "DD")
+    suggestions = carry_forward_suggestions(project_id, dd)
+    assert [(s["comment_id"], s["source_id"], s["owner"]) for s in suggestions] == [
+        (later[TEXTS[0] + "."], earlier[TEXTS[0]], "Architect")
+    ]
+
+    bulk_update([later[TEXTS[0] + "."]], owner="GC")  # filled in meanwhile: kept
+    assert apply_carry_forward(suggestions) == 1
+    df = load_comments(project_id, dd)
+    row = df[df["id"] == later[TEXTS[0] + "."]].iloc[0]
+    assert (row["owner"], row["tag"]) == ("GC", "CODE")
+
+
+def test_carry_forward_ignores_later_milestones(project_id, milestone_id):
+    _import(project_id, milestone_id, TEXTS[:1], "SD")
+    dd = _milestone(project_id, "DD")
+    later = _import(project_id, dd, TEXTS[:1], "DD")
+    bulk_update([later[TEXTS[0]]], owner="Architect")
+
+    # DD was created after SD, so its answers are not carried back.
+    assert carry_forward_suggestions(project_id, milestone_id) == []
+    assert carry_forward_suggestions(project_id, 10**9) == []  # unknown milestone
+
+
+def test_concurrent_saves_use_their_own_temp_files(project_id, milestone_id):
+    _import(project_id, milestone_id, TEXTS, "SD")
+    index = update_index(project_id)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: similarity._save_index(project_id, index), range(32)))
+    assert len(load_index(project_id)) == 3
+    assert not [n for n in os.listdir(similarity.index_dir()) if n.endswith(".tmp")]
+
+
+def test_restored_comments_are_found_after_a_rebuild(project_id, milestone_id):
+    ids = _import(project_id, milestone_id, TEXTS, "SD")
+    with session_scope() as s:
+        archive_project(s, project_id)
+    assert len(rebuild_index(project_id)) == 0
+
+    with session_scope() as s:
+        restore_project(s, project_id)
+    # Same ids as before, below the last indexed one: appending alone would miss them.
+    assert len(rebuild_index(project_id)) == 3
+    hits = similar_comments(project_id, text="fire rating of corridor walls", k=1)
+    assert hits[0]["comment_id"] == ids[TEXTS[0]]
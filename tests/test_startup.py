@@ -0,0 +1,27 @@
+# tests/test_startup.py
+from __future__ import annotations
+
+import subprocess
+import sys
+
+from src.startup import lazy_import, module_available, startup_report, timed_step
+
+
+def test_timed_step_is_reported():
+    with timed_step("unit test step"):
+        pass
+    steps = [r for r in startup_report() if r["step"] == "unit test step"]
+    assert steps and steps[-1]["ms"] >= 0
+
+
+def test_lazy_import():
+    assert module_available("json")
+    assert not module_available("no_such_module_here")
+    assert lazy_import("no_such_module_here") is None
+    assert lazy_import("json") is sys.modules["json"]
+
+
+def test_llm_module_does_not_import_openai():
+    code = "import sys, src.llm; print('openai' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
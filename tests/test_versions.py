@@ -0,0 +1,65 @@
+# tests/test_versions.py
+from __future__ import annotations
+
+import pytest
+from sqlmodel import select
+
+from src.db import session_scope
+from src.import_bluebeam import import_rows
+from src.models import Comment
+from src.queries import bulk_update
+from src.versions import changes_since, data_version, data_versions
+
+
+def _version(project_id):
+    with session_scope() as s:
+        return data_version(s, project_id)
+
+
+def _seed(project_id):
+    rows = [{"Page Label": "A101", "Subject": f"P{project_id}", "Comments": "Version test"}]
+    with session_scope() as s:
+        import_rows(s, rows, project_id=project_id, milestone_id=None, discipline="A", default_tracked=True)
+    with session_scope() as s:
+        return s.exec(select(Comment.id).where(Comment.project_id == project_id)).one()
+
+
+def test_committed_writes_bump_the_version(project_id):
+    start = _version(project_id)
+    comment_id = _seed(project_id)
+    after_import = _version(project_id)
+    assert after_import == start + 1
+
+    bulk_update([comment_id], status="Closed")
+    assert _version(project_id) == after_import + 1
+    with session_scope() as s:
+        assert data_versions(s, [project_id, 10**9]) == {project_id: after_import + 1}
+
+
+def test_rollback_and_reads_keep_the_version(project_id):
+    comment_id = _seed(project_id)
+    start = _version(project_id)
+
+    with pytest.raises(RuntimeError):
+        with session_scope() as s:
+            s.get(Comment, comment_id).status = "Closed"
+            s.flush()
+            raise RuntimeError("abort")
+    with session_scope() as s:
+        s.get(Comment, comment_id)
+    assert _version(project_id) == start
+    assert _version(10**9) is None
+
+
+def test_change_feed(project_id):
+    comment_id = _seed(project_id)
+    with session_scope() as s:
+        after_import = data_version(s, project_id)
+        # Imports touch the whole project: readers from before it must reload.
+        assert changes_since(s, project_id, after_import - 1) == (after_import, None)
+        assert changes_since(s, project_id, after_import) == (after_import, set())
+
+    bulk_update([comment_id], owner="GC")
+    with session_scope() as s:
+        assert changes_since(s, project_id, after_import) == (after_import + 1, {comment_id})
+        assert changes_since(s, 10**9, 0) == (None, None)
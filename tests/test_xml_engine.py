@@ -0,0 +1,132 @@
+# tests/test_xml_engine.py
+from __future__ import annotations
+
+from bench.synth import SynthSpec, generate_rows, rows_to_csv, rows_to_xml
+from src import import_bluebeam
+from src.csv_engine import read_csv_table
+from src.db import session_scope
+from src.import_bluebeam import extract_table, import_files, parse_upload
+from src.xml_engine import is_xml, iter_xml_tables, read_xml_header, read_xml_table, scan_xml
+
+XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<MarkupSummary>
+  <Markup ID="m1">
+    <Page_Label>A101</Page_Label>
+    <Comments>Verify &amp; confirm</Comments>
+    <Status></Status>
+    <History>
+      <Status>Accepted</Status>
+      <Status>Completed</Status>
+    </History>
+  </Markup>
+  <Markup ID="m2">
+    <Page_Label>A102</Page_Label>
+    <Comments>Second</Comments>
+    <Page_Index>4</Page_Index>
+  </Markup>
+</MarkupSummary>
+"""
+
+
+def test_markups_flatten_to_columns():
+    assert is_xml(b"\xef\xbb\xbf  " + XML) and not is_xml(b"Subject,Comments\r\n")
+    table = read_xml_table(XML)
+    assert table.engine == "xml" and table.num_rows == 2
+    assert table.rows() == [
+        {"ID": "m1", "Page Label": "A101", "Comments": "Verify & confirm", "Status": "Completed", "Page Index": ""},
+        {"ID": "m2", "Page Label": "A102", "Comments": "Second", "Status": "", "Page Index": "4"},
+    ]
+    assert read_xml_header(XML) == ["ID", "Page Label", "Comments", "Status", "Page Index"]
+    assert [f["page_index"] for f in extract_table(table)] == [None, 4]
+
+
+def test_other_element_names_fall_back_to_root_children():
+    raw = b"<Export><Item><Page_Label>S201</Page_Label><Comments>Beam</Comments></Item></Export>"
+    assert read_xml_table(raw).rows() == [{"Page Label": "S201", "Comments": "Beam"}]
+
+
+def test_xml_and_csv_exports_fingerprint_alike(project_id):
+    rows = generate_rows(SynthSpec(rows=40, seed=project_id + 1000))
+    xml_fields = extract_table(read_xml_table(rows_to_xml(rows)))
+    csv_fields = extract_table(read_csv_table(rows_to_csv(rows)))
+    assert [f["source_row_hash"] for f in xml_fields] == [f["source_row_hash"] for f in csv_fields]
+
+    with session_scope() as s:
+        first, second = import_files(
+            s,
+            [parse_upload("m.xml", rows_to_xml(rows)), parse_upload("m.csv", rows_to_csv(rows))],
+            project_id=project_id,
+            milestone_id=None,
+            discipline="A",
+            default_tracked=True,
+        )
+    assert first.imported > 0 and second.imported == 0
+
+
+def test_rich_text_comments_keep_one_line_per_paragraph():
+    raw = (
+        b"<MarkupSummary><Markup><Page_Label>A101</Page_Label>"
+        b"<Comments><p>Check <b>wall</b> type</p><p>See detail 4</p></Comments>"
+        b"</Markup></MarkupSummary>"
+    )
+    assert read_xml_table(raw).rows() == [{"Page Label": "A101", "Comments": "Check wall type\nSee detail 4"}]
+
+
+def test_xml_is_streamed_in_batches():
+    rows = generate_rows(SynthSpec(rows=25, seed=7))
+    raw = rows_to_xml(rows)
+    tables = list(iter_xml_tables(raw, batch_rows=10))
+    assert [t.num_rows for t in tables] == [10, 10, 5]
+
+    count, columns, preview, kept = scan_xml(raw, preview_rows=3, keep_rows=25, batch_rows=10)
+    assert count == 25 and len(preview) == 3
+    assert preview == read_xml_table(raw).rows(3)
+    assert set(columns) == set(read_xml_header(raw))
+    assert kept == tables
+    assert scan_xml(raw, keep_rows=24)[3] == []
+
+
+def test_the_preview_parse_is_reused_on_import(monkeypatch):
+    raw = rows_to_xml(generate_rows(SynthSpec(rows=25, seed=7)))
+    expected = [f["source_row_hash"] for f in extract_table(read_xml_table(raw))]
+
+    parsed = parse_upload("m.xml", raw)
+    assert parsed.rows == 25 and parsed.fields == [] and not parsed.source
+
+    def parse_again(*args, **kwargs):
+        raise AssertionError("parsed twice")
+
+    monkeypatch.setattr(import_bluebeam, "iter_xml_tables", parse_again)
+    batches = list(parsed.field_batches(rows=10))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert [f["source_row_hash"] for b in batches for f in b] == expected
+    monkeypatch.undo()
+
+    # Too large to keep: read again, batch by batch, on import.
+    monkeypatch.setattr(import_bluebeam, "XML_KEEP_ROWS", 10)
+    large = parse_upload("m.xml", raw)
+    assert large.tables == [] and large.source == raw
+    assert [f["source_row_hash"] for b in large.field_batches(rows=10) for f in b] == expected
+
+
+def test_rows_nested_in_a_markup_are_not_markups():
+    raw = b"""<Rows>
+      <Row><Page_Label>A101</Page_Label><Comments>Top</Comments>
+        <Replies><Row><Comments>Nested reply</Comments></Row></Replies>
+        <History><Row Status="Accepted"/></History>
+      </Row>
+      <Row><Page_Label>A102</Page_Label><Comments>Second</Comments></Row>
+    </Rows>"""
+    rows = read_xml_table(raw).rows()
+    assert [(r["Page Label"], r["Comments"], r["Status"]) for r in rows] == [
+        ("A101", "Top", "Accepted"),
+        ("A102", "Second", ""),
+    ]
+    assert rows[0]["Replies"] == "Nested reply"
+
+    # Markups grouped under repeated containers (e.g. one per page) are all found.
+    pages = (
+        b"<Doc><Page><Markup><Comments>One</Comments></Markup></Page>"
+        b"<Page><Markup><Comments>Two</Comments></Markup></Page></Doc>"
+    )
+    assert [r["Comments"] for r in read_xml_table(pages).rows()] == ["One", "Two"]